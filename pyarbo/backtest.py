@@ -0,0 +1,310 @@
+'''
+Neste .py script está implementado o backtesting das previsões do modelo do Yang.
+
+Para cada origem de previsão, os dados são truncados na origem, o modelo é fitado aos casos
+acumulados dos `fit_days` dias anteriores e projetado `horizon` dias à frente. A previsão é
+comparada com os casos diários observados usando:
+    * mae: erro absoluto médio da previsão pontual;
+    * crps: continuous ranked probability score do ensemble;
+    * coverage: fração dos dias observados dentro do intervalo de previsão;
+    * peak_error: diferença (em dias) entre o dia do pico previsto e o observado.
+
+O ensemble é gerado sorteando os parâmetros e aplicando ruído de Poisson nos casos diários.
+O modelo depende de b e beta apenas pelo produto b*beta, então a covariância do lmfit para
+(b, beta, c) é singular (com variâncias da ordem de 1e16) e não serve para o sorteio: os
+parâmetros são sorteados em (b*beta, c), com a covariância calculada pelo jacobiano dos
+resíduos nesses parâmetros. Se essa covariância também for mal condicionada, o ensemble usa
+apenas o ruído de Poisson em torno da previsão pontual. Na janela de previsão é usada a
+temperatura observada.
+
+Origens em que o fitting falha (erros de FIT_ERRORS) são registradas no log e aparecem na
+tabela com a coluna `error`; `summarize` as descarta e informa quantas foram.
+
+As origens são divididas em blocos contíguos executados em paralelo; dentro de cada bloco o
+fitting de uma origem começa a partir dos parâmetros fitados na origem anterior.
+'''
+import logging
+import numpy as np
+import pandas as pd
+from panel import load_panel
+from parallel import map_jobs, blocks
+from edo_model_yang import solve_model
+from fitting import PARAM_FIXED, N_FOZ, initial_conditions, fit_model
+
+SCORES = ['mae', 'crps', 'coverage', 'peak_error']
+
+# erros esperados de um fitting (integração que falha, covariância singular, overflow)
+FIT_ERRORS = (ValueError, ArithmeticError, np.linalg.LinAlgError)
+
+# condição máxima da covariância de (b*beta, c) usada no sorteio do ensemble
+MAX_COND = 1e12
+
+logger = logging.getLogger(__name__)
+
+
+def prepare_series(panel = None, window = 7):
+    '''
+    Retorna as datas, os casos notificados diários (média móvel dos `window` dias anteriores,
+    sem usar dados futuros) e a temperatura média diária.
+
+    :params panel: Panel or None. Se None, usa `load_panel()`.
+    :params window: int. Tamanho da média móvel.
+
+    :returns: tuple. (datas, casos, temperatura)
+    '''
+    if panel is None:
+        panel = load_panel()
+
+    cases = pd.Series(np.asarray(panel['notified'])).fillna(0)
+    cases = cases.rolling(window, min_periods = 1).mean().to_numpy()
+
+    # dias sem dado de clima recebem a temperatura do dia anterior
+    temp = pd.Series(np.asarray(panel['temp_mean-celsius'])).ffill().bfill().round(1).to_numpy()
+
+    return panel.dates, cases, temp
+
+
+def crps_ensemble(samples, obs):
+    '''
+    CRPS de um ensemble para cada dia.
+
+    :params samples: array. Array com dimensão (n_membros, n_dias).
+    :params obs: array. Valores observados com dimensão (n_dias,).
+
+    :returns: array com dimensão (n_dias,).
+    '''
+    samples = np.sort(samples, axis = 0)
+    m = samples.shape[0]
+
+    term1 = np.abs(samples - obs).mean(axis = 0)
+
+    # E|X - X'| calculado a partir das amostras ordenadas
+    w = 2*np.arange(1, m + 1) - m - 1
+    term2 = (w[:, None]*samples).sum(axis = 0)/(m*m)
+
+    return term1 - term2
+
+
+def score_forecast(samples, point, obs, level = 0.9):
+    '''
+    Calcula as métricas de `SCORES` para uma previsão.
+
+    :params samples: array. Ensemble de casos diários (n_membros, horizonte).
+    :params point: array. Previsão pontual de casos diários.
+    :params obs: array. Casos diários observados.
+    :params level: float. Nível do intervalo de previsão.
+
+    :returns: dict.
+    '''
+    lower, upper = np.quantile(samples, [(1 - level)/2, (1 + level)/2], axis = 0)
+
+    return {'mae': np.abs(point - obs).mean(),
+            'crps': crps_ensemble(samples, obs).mean(),
+            'coverage': ((obs >= lower) & (obs <= upper)).mean(),
+            'peak_error': int(np.argmax(point)) - int(np.argmax(obs))}
+
+
+def _daily(cum, start):
+
+    return np.diff(cum, prepend = start, axis = -1)
+
+
+def _identifiable_covar(mean, t, data, y0, temp, fixed, chisqr, rel_step = 1e-3):
+    # covariância de (b*beta, c) pelo jacobiano dos resíduos (diferenças finitas), ou None
+    # se ela não for finita, positiva e bem condicionada
+    def model(lam, c):
+        return solve_model(t, y0, (lam, 1.0), PARAM_FIXED, temp, c, fixed, outputs = ['cases'])[0]
+
+    base = model(*mean)
+    J = np.empty((len(data), len(mean)))
+
+    for k in range(len(mean)):
+        h = rel_step*abs(mean[k])
+        p = mean.copy()
+        p[k] += h
+        J[:, k] = (model(*p) - base)/h
+
+    dof = max(len(data) - len(mean), 1)
+
+    try:
+        covar = (chisqr/dof)*np.linalg.inv(J.T @ J)
+    except np.linalg.LinAlgError:
+        return None
+
+    if not np.all(np.isfinite(covar)) or np.any(np.linalg.eigvalsh(covar) <= 0):
+        return None
+
+    if np.linalg.cond(covar) > MAX_COND:
+        return None
+
+    return covar
+
+
+def forecast_samples(i, cases, temp, fit_days, horizon, fixed, y0, params = None,
+                     n_samples = 100, seed = 0):
+    '''
+    Fita o modelo com os `fit_days` dias anteriores à posição `i` e projeta os próximos
+    `horizon` dias. Apenas temp precisa cobrir a janela de previsão.
+
+    :returns: tuple. (previsão pontual dos casos diários (horizon,), ensemble (n_samples,
+              horizon), lmfit.MinimizerResult do fitting)
+    '''
+    t_fit = np.arange(0, fit_days)
+    t_all = np.arange(0, fit_days + horizon)
+
+    data = np.cumsum(cases[i - fit_days:i])
+
+    T = temp[i - fit_days:i + horizon]
+
+    y0 = list(y0)
+    y0[6] = max(data[0], 1)
+
+    out = fit_model(t_fit, data, y0, temp = T, fixed = fixed, params = params)
+    pars = out.params.valuesdict()
+
+    # o modelo só depende de b*beta, então (b*beta, 1) é equivalente a (b, beta)
+    def project(lam, c):
+        cum = solve_model(t_all, y0, (lam, 1.0), PARAM_FIXED, T, c, fixed, outputs = ['cases'])[0]
+        return _daily(cum[fit_days:], cum[fit_days - 1])
+
+    mean = np.array([pars['b']*pars['beta'], pars['c']])
+    point = project(*mean)
+
+    rng = np.random.default_rng(seed + i)
+    covar = _identifiable_covar(mean, t_fit, data, y0, T, fixed, out.chisqr)
+
+    if covar is not None:
+        p = out.params
+        lo = [p['b'].min*p['beta'].min, p['c'].min]
+        hi = [p['b'].max*p['beta'].max, p['c'].max]
+        draws = np.clip(rng.multivariate_normal(mean, covar, size = n_samples), lo, hi)
+        members = np.array([project(*d) for d in draws])
+    else:
+        members = np.tile(point, (n_samples, 1))
+
+    samples = rng.poisson(np.clip(members, 0, None))
+
+    return point, samples, out
+
+
+def forecast_origin(i, cases, temp, fit_days, horizon, fixed, y0, params = None,
+                    n_samples = 100, seed = 0):
+    '''
+    Fita o modelo com os dados anteriores à posição `i` e gera a previsão dos próximos
+    `horizon` dias (ver `forecast_samples`), comparando com os casos observados.
+
+    :returns: tuple. (dict com as métricas e os parâmetros fitados, lm.Parameters fitados)
+    '''
+    point, samples, out = forecast_samples(i, cases, temp, fit_days, horizon, fixed, y0,
+                                           params = params, n_samples = n_samples, seed = seed)
+
+    res = score_forecast(samples, point, cases[i:i + horizon])
+    res.update(out.params.valuesdict(), nfev = out.nfev, success = out.success)
+
+    return res, out.params
+
+
+def _run_block(block, cases, temp, fit_days, horizon, fixed, y0, n_samples, warm_start,
+               state = None):
+
+    rows = []
+    params = None
+
+    for i in block:
+        try:
+            if state is not None:
+                dates, df_we, N, method = state
+                y0 = initial_conditions(N, start_date = dates[i - fit_days], df_we = df_we,
+                                        method = method)
+
+            res, fitted = forecast_origin(i, cases, temp, fit_days, horizon, fixed, y0,
+                                          params = params, n_samples = n_samples)
+        except FIT_ERRORS as e:
+            logger.warning('backtest: o fitting da origem %d falhou: %r', i, e)
+            res, fitted = {'error': repr(e)}, None
+
+        res['origin'] = i
+        rows.append(res)
+
+        if warm_start and fitted is not None:
+            params = fitted
+
+    return rows
+
+
+def backtest(start_date, end_date, step = 7, fit_days = 175, horizon = 28, fixed = True,
+             N = N_FOZ, workers = None, n_samples = 100, warm_start = True, panel = None,
+             state_method = None, path = None):
+    '''
+    Executa o backtesting para todas as origens entre start_date e end_date.
+
+    :params start_date: string. Primeira origem, no formato %Y-%m-%d.
+    :params end_date: string. Última origem, no formato %Y-%m-%d.
+    :params step: int. Número de dias entre duas origens.
+    :params fit_days: int. Número de dias usados no fitting.
+    :params horizon: int. Número de dias previstos.
+    :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos.
+    :params N: int. População humana.
+    :params workers: int or None. Número de processos. Se 1, executa no processo atual.
+    :params n_samples: int. Número de membros do ensemble.
+    :params warm_start: boolean. Se True, cada fitting parte dos parâmetros da origem anterior.
+    :params panel: Panel or None. Dados usados. Se None, usa `load_panel()`.
+    :params state_method: string or None. Se None, todas as origens partem das condições
+                          iniciais de `initial_conditions(N)`. Se 'warmup' ou 'periodic',
+                          os mosquitos são aquecidos até o início de cada janela de fitting
+                          (ver `initial_state.py`), usando o cache de estados iniciais.
+    :params path: string or None. Se fornecido, a tabela é salva em csv nesse caminho.
+
+    :returns: pd.DataFrame com uma linha por origem. Se nenhuma origem tiver fit_days dias
+              de dados antes e horizon dias depois, levanta ValueError.
+    '''
+    if panel is None:
+        panel = load_panel()
+
+    dates, cases, temp = prepare_series(panel)
+
+    origins = pd.date_range(start_date, end_date, freq = f'{step}D')
+    pos = dates.get_indexer(origins)
+    pos = pos[(pos >= fit_days) & (pos + horizon <= len(dates))]
+
+    if len(pos) == 0:
+        raise ValueError(f'nenhuma origem entre {start_date} e {end_date} tem {fit_days} dias de '
+                         f'dados antes e {horizon} dias depois ({dates[0].date()} a {dates[-1].date()}).')
+
+    y0 = initial_conditions(N)
+
+    state = None
+    if state_method is not None:
+        state = (dates, panel.to_frame('weather'), N, state_method)
+
+    args = (cases, temp, fit_days, horizon, fixed, y0, n_samples, warm_start, state)
+
+    jobs = [pos[block] for block in blocks(len(pos), workers)]
+    rows = [row for block in map_jobs(_run_block, jobs, workers, *args) for row in block]
+
+    df = pd.DataFrame(rows)
+    df.insert(0, 'origin', dates[df.pop('origin').to_numpy()])
+    df['fixed'] = fixed
+
+    if path is not None:
+        df.to_csv(path, index = False, float_format = '%.6g')
+
+    return df
+
+
+def summarize(df):
+    '''
+    Resume a tabela do backtesting com a média das métricas (peak_error em valor absoluto)
+    nas origens sem erro, e o número de origens usadas (`n_origins`) e descartadas por erro
+    no fitting (`n_failed`). Se todas falharem, as médias são NaN.
+    '''
+    failed = df['error'].notna() if 'error' in df else pd.Series(False, index = df.index)
+
+    res = df.loc[~failed].reindex(columns = SCORES).astype(float)
+    res['peak_error'] = res['peak_error'].abs()
+
+    summary = res.mean()
+    summary['n_origins'] = int((~failed).sum())
+    summary['n_failed'] = int(failed.sum())
+
+    return summary
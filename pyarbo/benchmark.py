@@ -0,0 +1,489 @@
+'''
+Neste .py script está o conjunto de benchmarks dos trechos mais custosos do pacote: o lado
+direito do sistema (`system_odes`), a integração (`solve_model`) em janelas de 175 dias e de
+vários anos, com parâmetros fixos e dependentes da temperatura, a capacidade suporte do Yang
+no arquivo de clima completo, a leitura e correção dos dados de clima, o fitting da
+temporada de 2010 com o lm.minimize, a conversão de datas em semanas epidemiológicas e a
+agregação de uma lista de casos do tamanho das do SINAN por semana epidemiológica.
+
+Todos os dados são lidos dos arquivos locais da pasta data. Cada execução é acrescentada
+(uma linha JSON) ao arquivo de histórico, junto com o commit e as versões das bibliotecas,
+de forma que regressões e ganhos de desempenho fiquem visíveis (ver `history` e `compare`).
+
+O tempo de importação dos módulos usados pelos processos de trabalho e pela linha de comando
+é medido em processos novos e comparado com IMPORT_BUDGET (ver `import_report`).
+
+Uso:
+    python benchmark.py                      # todos os benchmarks
+    python benchmark.py solve_model_175_fixed fit_2010_fixed --repeat 3
+    python benchmark.py --list
+    python benchmark.py --imports            # tempo de importação (sai com erro se estourar)
+'''
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import numpy as np
+import pandas as pd
+import scipy
+from get_data import DATA_DIR, CACHE_DIR, get_dengue_data, get_weather_data, fill_nan_weather, parse_date
+from edo_model_yang import system_odes, solve_model, sup_cap_yang
+from fitting import PARAM_FIXED, initial_conditions, fit_model
+from epiweek import to_epiweek, aggregate_epiweek
+from fast_model import solve_fast
+from periodic import forcing
+import instrumentation
+
+HISTORY = os.path.join(CACHE_DIR, 'benchmarks.jsonl')
+
+WEATHER_FILE = os.path.join(DATA_DIR, 'weather-2010_2022.csv')
+DENGUE_FILE = os.path.join(DATA_DIR, 'dengue_cases-2010_2022.csv')
+
+# dados lidos uma única vez por execução
+_DATA = {}
+
+# tempo máximo (s) de importação de cada módulo em um processo novo, sem contar o numpy
+IMPORT_BUDGET = {'instrumentation': 0.02, 'edo_model_yang': 0.05, 'fitting': 0.05,
+                 'fast_model': 0.05}
+
+# bibliotecas e tabelas que os módulos de IMPORT_BUDGET só devem carregar no primeiro uso
+LAZY_MODULES = ['matplotlib', 'pandas', 'scipy', 'lmfit', 'parameters', 'numba', 'jax']
+
+
+def _weather():
+
+    if 'weather' not in _DATA:
+        _DATA['weather'] = get_weather_data(WEATHER_FILE)
+
+    return _DATA['weather']
+
+
+def _temp(start_date, days):
+    # temperatura média diária a partir de start_date, sem dias ausentes ou repetidos e
+    # arredondada para as chaves dos dicionários de parameters.py
+    df = _weather()
+    df = df[~df.index.duplicated()].reindex(pd.date_range(start_date, periods = days)).ffill()
+
+    return np.round(df['temp_mean-celsius'].to_numpy(), 1)
+
+
+def _season_2010():
+    # mesma janela do notebook fitting_models.ipynb
+    if 'dengue' not in _DATA:
+        _DATA['dengue'] = get_dengue_data(path = DENGUE_FILE)
+
+    df = _DATA['dengue']
+    data = df.loc[(df.index >= '2010-01-08') & (df.index <= '2010-06-30')].acum_notified.to_numpy()
+
+    return np.arange(len(data)), data, _temp('2010-01-08', len(data))
+
+
+def bench_system_odes(fixed):
+
+    temp = _temp('2010-01-01', 30)
+    y0 = initial_conditions()
+
+    return lambda: system_odes(10.5, y0, (0.5, 0.5), PARAM_FIXED, temp, 1, fixed)
+
+
+def bench_solve_model(days, fixed):
+
+    t = np.arange(days)
+    temp = _temp('2010-01-01', days)
+    y0 = initial_conditions()
+
+    return lambda: solve_model(t, y0, (0.5, 0.5), PARAM_FIXED, temp, 1, fixed)
+
+
+def bench_solve_forcing(days, fixed, mode):
+
+    t = np.arange(days)
+    temp = _temp('2010-01-01', days)
+    y0 = initial_conditions()
+
+    return lambda: solve_model(t, y0, (0.5, 0.5), PARAM_FIXED, temp, 1, fixed, forcing = mode)
+
+
+def bench_solve_backend(days, fixed, backend):
+
+    t = np.arange(days)
+    temp = _temp('2010-01-01', days)
+    y0 = initial_conditions()
+
+    # levanta ImportError (e o benchmark é pulado) se o backend não estiver instalado
+    solve_model(t[:2], y0, (0.5, 0.5), PARAM_FIXED, temp, 1, fixed, backend = backend)
+
+    return lambda: solve_model(t, y0, (0.5, 0.5), PARAM_FIXED, temp, 1, fixed, backend = backend)
+
+
+def bench_solve_compiled(days, fixed, method):
+
+    from compiled import solve_compiled
+
+    t = np.arange(days)
+    temp = _temp('2010-01-01', days)
+    y0 = initial_conditions()
+
+    return lambda: solve_compiled(t, y0, (0.5, 0.5), PARAM_FIXED, temp, 1, fixed, method = method)
+
+
+def bench_solve_fast(days, members, fixed):
+
+    t = np.arange(days)
+    temp = _temp('2010-01-01', days)
+    y0 = initial_conditions()
+    fits = np.full((members, 2), 0.5)
+
+    return lambda: solve_fast(t, y0, fits, PARAM_FIXED, temp, 1, fixed)
+
+
+def forcing_report(start_date = '2010-01-08', days = 174, y0 = None):
+    '''
+    Compara os modos de forçante de `solve_model` ('step', 'segments' e 'linear', e o backend
+    'numba' se o Numba estiver instalado) com parâmetros fixos e dependentes da temperatura,
+    com capacidade suporte constante e do Yang.
+
+    :returns: pd.DataFrame com `nfev`, passos aceitos (`steps`), rejeitados (`rejected`),
+              tempo (`seconds`) e a maior diferença dos casos acumulados em relação ao modo
+              'step' (`max_diff`).
+    '''
+    from compiled import HAS_NUMBA
+
+    t = np.arange(days)
+    temp = _temp(start_date, days)
+    end = pd.Timestamp(start_date) + pd.Timedelta(days = days - 1)
+    cap_yang = forcing(_weather(), start_date, end)[1]
+
+    if y0 is None:
+        y0 = initial_conditions()
+
+    modes = [('step', 'scipy'), ('segments', 'scipy'), ('linear', 'scipy')]
+    if HAS_NUMBA:
+        modes.append(('segments', 'numba'))
+
+        # compila antes de medir
+        solve_model(t[:2], y0, (0.5, 0.5), PARAM_FIXED, temp, 1, True, backend = 'numba')
+
+    rows = []
+
+    for fixed in [True, False]:
+        for cap_name, cap in [('constant', 1), ('yang', cap_yang)]:
+            ref = None
+
+            for mode, backend in modes:
+                with instrumentation.instrumented():
+                    t0 = time.perf_counter()
+                    cases = solve_model(t, y0, (0.5, 0.5), PARAM_FIXED, temp, cap, fixed,
+                                        outputs = ['cases'], forcing = mode, backend = backend)[0]
+                    seconds = time.perf_counter() - t0
+
+                rec = [r for r in instrumentation.records() if r['type'] == 'solver'][0]
+                ref = cases if ref is None else ref
+
+                rows.append({'fixed': fixed, 'cap': cap_name, 'forcing': mode, 'backend': backend,
+                             'nfev': rec['nfev'], 'steps': rec['steps'], 'rejected': rec['rejected'],
+                             'seconds': seconds, 'max_diff': float(np.max(np.abs(cases - ref)))})
+
+    return pd.DataFrame(rows)
+
+
+def bench_sup_cap_yang():
+
+    df = _weather().reset_index(drop = True)
+
+    return lambda: sup_cap_yang(df)
+
+
+def bench_get_weather_data():
+
+    return lambda: get_weather_data(WEATHER_FILE)
+
+
+def bench_fill_nan_weather():
+
+    # os mesmos passos de get_weather_data antes da correção
+    raw = pd.read_csv(WEATHER_FILE)
+    raw['date'] = pd.to_datetime(raw['date'].apply(parse_date))
+    raw = raw.set_index('date').sort_index().apply(pd.to_numeric, errors = 'coerce')
+
+    return lambda: fill_nan_weather(raw.copy())
+
+
+def bench_fit_2010(fixed, backend = 'scipy'):
+
+    t, data, temp = _season_2010()
+    y0 = initial_conditions()
+
+    if backend != 'scipy':
+        solve_model(t[:2], y0, (0.5, 0.5), PARAM_FIXED, temp, 1, fixed, backend = backend)
+
+    return lambda: fit_model(t, data, y0, temp = temp, fixed = fixed, backend = backend)
+
+
+def bench_jax_loss_grad(n_knots):
+
+    import jax_model
+
+    t, data, _ = _season_2010()
+    weather = jax_model.weather_arrays(_weather(), '2010-01-08', str(np.datetime64('2010-01-08') + len(t) - 1))
+    basis = jax_model.knot_basis(len(t), n_knots)
+
+    loss, value_and_grad = jax_model.make_loss(data, weather, initial_conditions(), basis)
+    theta = {'bb': np.full(n_knots, 0.4), **jax_model.CAP_DEFAULT}
+
+    # a primeira chamada compila a função
+    value_and_grad(theta)[0].block_until_ready()
+
+    return lambda: value_and_grad(theta)[0].block_until_ready()
+
+
+def bench_epiweek(n):
+
+    rng = np.random.default_rng(0)
+    dates = np.datetime64('2000-01-01') + rng.integers(0, 365*30, n).astype('timedelta64[D]')
+
+    return lambda: to_epiweek(dates)
+
+
+def bench_aggregate_epiweek(n):
+
+    # lista de casos ordenada pela data, com uma coluna indicadora por categoria
+    rng = np.random.default_rng(0)
+    dates = np.sort(np.datetime64('2000-01-01') + rng.integers(0, 365*30, n).astype('timedelta64[D]'))
+    values = np.eye(3)[rng.integers(0, 3, n)]
+
+    return lambda: aggregate_epiweek(values, dates)
+
+
+# nome: (função que prepara o benchmark, chamadas por medida, número de medidas)
+BENCHMARKS = {
+    'system_odes_fixed': (lambda: bench_system_odes(True), 10000, 5),
+    'system_odes_temp': (lambda: bench_system_odes(False), 10000, 5),
+    'solve_model_175_fixed': (lambda: bench_solve_model(175, True), 1, 5),
+    'solve_model_175_temp': (lambda: bench_solve_model(175, False), 1, 5),
+    'solve_model_175_temp_segments': (lambda: bench_solve_forcing(175, False, 'segments'), 1, 5),
+    'solve_model_175_temp_linear': (lambda: bench_solve_forcing(175, False, 'linear'), 1, 5),
+    'solve_model_175_fixed_numba': (lambda: bench_solve_backend(175, True, 'numba'), 1, 5),
+    'solve_model_175_temp_numba': (lambda: bench_solve_backend(175, False, 'numba'), 1, 5),
+    'solve_compiled_175_temp_rosenbrock': (lambda: bench_solve_compiled(175, False, 'rosenbrock'), 1, 5),
+    'solve_compiled_175_temp_rk45': (lambda: bench_solve_compiled(175, False, 'rk45'), 1, 5),
+    'solve_fast_175_temp_x1': (lambda: bench_solve_fast(175, 1, False), 1, 5),
+    'solve_fast_175_temp_x1000': (lambda: bench_solve_fast(175, 1000, False), 1, 5),
+    'solve_model_3y_fixed': (lambda: bench_solve_model(3*365, True), 1, 3),
+    'solve_model_3y_temp': (lambda: bench_solve_model(3*365, False), 1, 3),
+    'sup_cap_yang_full': (bench_sup_cap_yang, 1, 3),
+    'get_weather_data_local': (bench_get_weather_data, 1, 3),
+    'fill_nan_weather': (bench_fill_nan_weather, 1, 3),
+    'fit_2010_fixed': (lambda: bench_fit_2010(True), 1, 1),
+    'fit_2010_temp': (lambda: bench_fit_2010(False), 1, 1),
+    'fit_2010_fixed_numba': (lambda: bench_fit_2010(True, 'numba'), 1, 3),
+    'fit_2010_temp_numba': (lambda: bench_fit_2010(False, 'numba'), 1, 3),
+    'jax_loss_grad_2010_20_knots': (lambda: bench_jax_loss_grad(20), 10, 5),
+    'epiweek_5M': (lambda: bench_epiweek(5_000_000), 1, 3),
+    'aggregate_epiweek_5M': (lambda: bench_aggregate_epiweek(5_000_000), 1, 3),
+}
+
+
+def measure(func, number = 1, repeat = 5):
+    '''
+    Mede o tempo de func.
+
+    :params func: callable. Função sem argumentos.
+    :params number: int. Número de chamadas em cada medida.
+    :params repeat: int. Número de medidas.
+
+    :returns: dict com `min`, `median`, `mean` e `std` do tempo por chamada (em segundos),
+              `number` e `repeat`.
+    '''
+    times = np.zeros(repeat)
+
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func()
+        times[i] = (time.perf_counter() - t0)/number
+
+    return {'min': times.min(), 'median': float(np.median(times)), 'mean': times.mean(),
+            'std': times.std(), 'number': number, 'repeat': repeat}
+
+
+def _commit():
+
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output = True,
+                              text = True, cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def run_benchmarks(names = None, repeat = None, path = HISTORY, verbose = True):
+    '''
+    Executa os benchmarks e acrescenta o resultado ao histórico.
+
+    :params names: list or None. Nomes de BENCHMARKS. Se None, executa todos.
+    :params repeat: int or None. Número de medidas. Se None, usa o padrão de cada benchmark.
+    :params path: string or None. Arquivo de histórico (JSON lines). Se None, não salva.
+    :params verbose: boolean. Se True, imprime cada resultado.
+
+    :returns: dict com os metadados da execução e `results` (um dict por benchmark).
+    '''
+    if names is None:
+        names = list(BENCHMARKS)
+
+    record = {'timestamp': pd.Timestamp.now().isoformat(timespec = 'seconds'),
+              'commit': _commit(), 'python': platform.python_version(),
+              'numpy': np.__version__, 'scipy': scipy.__version__, 'pandas': pd.__version__,
+              'machine': platform.machine(), 'processor': platform.processor(),
+              'cpus': os.cpu_count(), 'results': {}}
+
+    for name in names:
+        setup, number, n = BENCHMARKS[name]
+
+        try:
+            func = setup()
+        except ImportError as e:
+            # backends opcionais que não estão instalados
+            if verbose:
+                print(f'{name:<26} pulado ({e})', flush = True)
+            continue
+
+        res = measure(func, number, repeat or n)
+        record['results'][name] = {key: float(v) if isinstance(v, (float, np.floating)) else v
+                                   for key, v in res.items()}
+
+        if verbose:
+            print(f"{name:<26} {res['min']:.6g} s (mediana {res['median']:.6g} s)", flush = True)
+
+    if path is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok = True)
+
+        with open(path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    return record
+
+
+def import_time(module, repeat = 5):
+    '''
+    Mede o tempo de importação de module em processos novos do Python. O numpy é importado
+    antes da medida, de forma que o tempo é apenas o do módulo e das suas dependências.
+
+    :returns: dict com `seconds` (menor tempo entre as repetições) e `loaded` (módulos de
+              LAZY_MODULES carregados pela importação).
+    '''
+    code = ('import sys, time, numpy; t0 = time.perf_counter(); '
+            f'import {module}; print(time.perf_counter() - t0); '
+            f'print(",".join(m for m in {LAZY_MODULES!r} if m in sys.modules))')
+
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], capture_output = True, text = True, check = True,
+                             cwd = os.path.dirname(os.path.abspath(__file__))).stdout.split('\n')
+        times.append(float(out[0]))
+
+    return {'seconds': min(times), 'loaded': [m for m in out[1].split(',') if m]}
+
+
+def import_report(budget = IMPORT_BUDGET, repeat = 5):
+    '''
+    Mede o tempo de importação de cada módulo de budget e compara com o limite.
+
+    :returns: pd.DataFrame com `module`, `seconds`, `budget`, `loaded` (bibliotecas pesadas
+              carregadas na importação) e `ok` (dentro do limite e sem bibliotecas pesadas).
+    '''
+    rows = []
+
+    for module, limit in budget.items():
+        res = import_time(module, repeat)
+        rows.append({'module': module, 'seconds': res['seconds'], 'budget': limit,
+                     'loaded': ','.join(res['loaded']),
+                     'ok': res['seconds'] <= limit and not res['loaded']})
+
+    return pd.DataFrame(rows)
+
+
+def history(path = HISTORY):
+    '''
+    Lê o histórico de execuções.
+
+    :returns: pd.DataFrame com uma linha por execução e benchmark, com as colunas `timestamp`,
+              `commit`, `benchmark`, `min`, `median`, `mean`, `std`, `number` e `repeat`.
+    '''
+    rows = []
+
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            for name, res in record['results'].items():
+                rows.append({'timestamp': record['timestamp'], 'commit': record['commit'],
+                             'benchmark': name, **res})
+
+    return pd.DataFrame(rows)
+
+
+def compare(path = HISTORY, baseline = None):
+    '''
+    Compara a última execução de cada benchmark com uma execução anterior.
+
+    :params baseline: string or None. Commit usado como referência. Se None, usa a execução
+                      anterior de cada benchmark.
+
+    :returns: pd.DataFrame com o tempo mínimo atual, o de referência e a razão entre eles
+              (razão > 1 indica regressão).
+    '''
+    df = history(path)
+    rows = []
+
+    for name, g in df.groupby('benchmark', sort = False):
+        current = g.iloc[-1]
+
+        if baseline is None:
+            ref = g.iloc[-2] if len(g) > 1 else None
+        else:
+            ref = g[g.commit == baseline]
+            ref = ref.iloc[-1] if len(ref) else None
+
+        rows.append({'benchmark': name, 'commit': current.commit, 'min': current['min'],
+                     'baseline_commit': None if ref is None else ref.commit,
+                     'baseline_min': np.nan if ref is None else ref['min'],
+                     'ratio': np.nan if ref is None else current['min']/ref['min']})
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description = 'Benchmarks do pyarbo.')
+    parser.add_argument('names', nargs = '*', help = 'benchmarks a executar (padrão: todos)')
+    parser.add_argument('--repeat', type = int, default = None, help = 'número de medidas')
+    parser.add_argument('--history', default = HISTORY, help = 'arquivo de histórico')
+    parser.add_argument('--no-save', action = 'store_true', help = 'não salva no histórico')
+    parser.add_argument('--baseline', default = None, help = 'commit de referência')
+    parser.add_argument('--list', action = 'store_true', help = 'lista os benchmarks')
+    parser.add_argument('--forcing-report', action = 'store_true',
+                        help = 'compara os modos de forçante de solve_model')
+    parser.add_argument('--imports', action = 'store_true',
+                        help = 'mede o tempo de importação dos módulos (ver IMPORT_BUDGET)')
+
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(BENCHMARKS))
+        sys.exit(0)
+
+    if args.forcing_report:
+        print(forcing_report().to_string(index = False))
+        sys.exit(0)
+
+    if args.imports:
+        report = import_report(repeat = args.repeat or 5)
+        print(report.to_string(index = False))
+        sys.exit(0 if report.ok.all() else 1)
+
+    run_benchmarks(args.names or None, args.repeat, None if args.no_save else args.history)
+
+    if not args.no_save:
+        print(compare(args.history, args.baseline).to_string(index = False))
@@ -0,0 +1,457 @@
+'''
+Neste .py script está a linha de comando do pyarbo, usada para rodar simulações, fittings,
+varreduras de parâmetros, previsões e a ingestão das listas de casos sem os notebooks (por
+exemplo pelo cron ou por um sistema de filas do cluster).
+
+Uso:
+    python cli.py simulate config.json --output resultados/sim --workers 8
+    python cli.py fit config.toml --output resultados/fit --set fixed=true
+    python cli.py sweep config.json --output resultados/sweep
+    python cli.py forecast --output resultados/forecast --set 'origins=["2022-03-01"]'
+    python cli.py ingest ingest.json --output resultados/casos --workers 4
+
+Com o pacote instalado (pip install -e ., ver pyproject.toml), `python cli.py` pode ser
+substituído pelo comando `pyarbo`.
+
+Cada subcomando lê um arquivo de configuração (.json ou .toml), cujas chaves substituem os
+valores padrão de DEFAULTS (comuns a todos os subcomandos) e de COMMANDS[subcomando]; cada
+`--set chave=valor` substitui uma chave do arquivo (o valor é lido como JSON e, se não for
+um JSON válido, como texto). Chaves desconhecidas são um erro. Os dados de clima e de casos
+são lidos dos arquivos locais de `data_dir` (ver `panel.SOURCES`).
+
+Os resultados são salvos no diretório de saída como tabelas Parquet (ou csv com
+`--format csv`), junto com um arquivo meta.json com o subcomando, a configuração completa,
+o commit, as versões das bibliotecas, o tempo de execução e as tabelas geradas.
+
+Tabelas de cada subcomando:
+    * simulate: `members` (b, beta de cada membro) e `trajectories` (membro, data e saídas);
+    * fit: `fits` (parâmetros fitados por temporada) e `curves` (dados e modelo por dia);
+    * sweep: `sweep` (uma linha por ponto da grade, com casos finais e pico);
+    * forecast: `forecast` (previsão pontual e quantis por origem e dia) e `params`;
+    * ingest: `cases` (casos diários por município e categoria).
+'''
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import itertools
+import subprocess
+import numpy as np
+import pandas as pd
+from get_data import DATA_DIR, get_weather_data, get_dengue_data
+from edo_model_yang import solve_model
+from fitting import PARAM_FIXED, N_FOZ, initial_conditions, fit_model
+from pipeline import clean_weather, capacity, schedule, initial
+from parallel import map_jobs, blocks
+from panel import SOURCES
+
+FORMATS = ['parquet', 'csv']
+
+# configuração comum a todos os subcomandos
+DEFAULTS = {'data_dir': DATA_DIR, 'fixed': False, 'N': N_FOZ, 'Hi0': 2, 'ratio': 2, 'cap': 'yang',
+            'k': 7, 'cap_params': {}, 'state_method': None, 'backend': 'scipy'}
+
+# configuração de cada subcomando. cap pode ser 'yang' (sup_cap_yang com o clima
+# observado, com os parâmetros k e cap_params), um número (capacidade constante em
+# unidades de 10**D) ou, no fit, None (a capacidade constante `c` também é fitada).
+# state_method pode ser None, 'warmup' ou 'periodic' (ver initial_state.py). A janela de
+# clima e as condições iniciais são calculadas pelas etapas do pipeline (ver pipeline.py).
+COMMANDS = {
+    'simulate': {'start_date': '2010-01-08', 'end_date': '2010-06-30', 'members': [[0.5, 0.5]],
+                 'outputs': ['cases', 'incidence', 'mosquitoes'], 'every': 1},
+    'fit': {'seasons': [{'start_date': '2010-01-08', 'end_date': '2010-06-30'}], 'cap': None},
+    'sweep': {'start_date': '2010-01-08', 'end_date': '2010-06-30',
+              'grid': {'b': [0.25, 0.5, 0.75], 'beta': [0.25, 0.5, 0.75]}, 'method': 'solve_model'},
+    'forecast': {'origins': None, 'fit_days': 175, 'horizon': 28, 'n_samples': 100,
+                 'quantiles': [0.05, 0.25, 0.5, 0.75, 0.95], 'seed': 0, 'fixed': True},
+    'ingest': {'paths': [], 'start_date': '2010-01-01', 'end_date': '2022-12-31',
+               'municipalities': None, 'chunksize': 500_000, 'date_col': 'dt_sin_pri',
+               'mun_col': 'id_mn_resi', 'date_format': None},
+}
+
+# parâmetros que podem variar na grade do sweep
+GRID_NAMES = ['b', 'beta', 'c']
+
+
+def load_config(path = None, command = 'simulate', overrides = ()):
+    '''
+    Lê a configuração de um subcomando.
+
+    :params path: string or None. Arquivo .json ou .toml.
+    :params command: string. Nome do subcomando (chave de COMMANDS).
+    :params overrides: list. Itens `chave=valor` que substituem as chaves do arquivo.
+
+    :returns: dict com todas as chaves de DEFAULTS e de COMMANDS[command].
+    '''
+    user = {}
+
+    if path is not None:
+        if path.endswith('.toml'):
+            import tomllib
+            with open(path, 'rb') as f:
+                user = tomllib.load(f)
+        else:
+            with open(path) as f:
+                user = json.load(f)
+
+    for item in overrides:
+        key, _, value = item.partition('=')
+        try:
+            user[key] = json.loads(value)
+        except json.JSONDecodeError:
+            user[key] = value
+
+    config = {**DEFAULTS, **COMMANDS[command]}
+
+    unknown = sorted(set(user) - set(config))
+    if unknown:
+        raise ValueError(f'chaves desconhecidas para {command}: {unknown}')
+
+    config.update(user)
+
+    return config
+
+
+def _weather(config):
+
+    return get_weather_data(os.path.join(config['data_dir'], SOURCES['weather']))
+
+
+def _setup(config, df_we, start_date, end_date):
+    # dias, datas, temperatura, capacidade suporte e condições iniciais de uma janela,
+    # calculados pelas mesmas etapas do pipeline (clean, capacity, schedule e initial)
+    config = dict(config, start_date = start_date, end_date = end_date)
+
+    df = clean_weather(config, df_we)
+    temp = df['temp_mean-celsius'].to_numpy()[config['k']:]
+    y0 = initial(config, df_we, schedule(config, df))
+
+    return np.arange(len(temp)), df.index[config['k']:], temp, capacity(config, df), y0
+
+
+def _simulate_block(block, members, t, y0, temp, cap, config):
+
+    out = np.empty((len(block), len(config['outputs']), len(t[::config['every']])))
+
+    for j, i in enumerate(block):
+        solve_model(t, y0, tuple(members[i]), PARAM_FIXED, temp, cap, config['fixed'],
+                    outputs = config['outputs'], every = config['every'], out = out[j],
+                    backend = config['backend'])
+
+    return out
+
+
+def simulate(config, workers = None):
+    '''
+    Simula o modelo para cada membro (b, beta) de `members` entre start_date e end_date.
+
+    :returns: dict com as tabelas `members` e `trajectories`.
+    '''
+    df_we = _weather(config)
+    t, dates, temp, cap, y0 = _setup(config, df_we, config['start_date'], config['end_date'])
+
+    members = np.atleast_2d(np.asarray(config['members'], dtype = float))
+    res = np.concatenate(map_jobs(_simulate_block, blocks(len(members), workers), workers,
+                              members, t, y0, temp, cap, config))
+
+    saved = dates[::config['every']]
+    m = len(members)
+
+    traj = pd.DataFrame({'member': np.repeat(np.arange(m), len(saved)), 'date': np.tile(saved, m)})
+    for k, name in enumerate(config['outputs']):
+        traj[name] = res[:, k].ravel()
+
+    return {'members': pd.DataFrame({'member': np.arange(m), 'b': members[:, 0], 'beta': members[:, 1]}),
+            'trajectories': traj}
+
+
+def _fit_season(job, config, df_we, df_cases):
+
+    i, season = job
+    t, dates, temp, cap, y0 = _setup(config, df_we, season['start_date'], season['end_date'])
+
+    data = np.cumsum(df_cases.notified.reindex(dates).fillna(0).to_numpy())
+
+    out = fit_model(t, data, y0, temp = temp, cap = cap, fixed = config['fixed'],
+                    backend = config['backend'])
+    pars = out.params.valuesdict()
+
+    model = solve_model(t, y0, (pars['b'], pars['beta']), PARAM_FIXED, temp, pars.get('c', cap),
+                        config['fixed'], outputs = ['cases'], backend = config['backend'])[0]
+
+    row = {'season': i, 'start_date': season['start_date'], 'end_date': season['end_date'],
+           'b': pars['b'], 'beta': pars['beta'], 'c': pars.get('c', np.nan),
+           'chisqr': out.chisqr, 'nfev': out.nfev, 'success': out.success}
+
+    curve = pd.DataFrame({'season': i, 'date': dates, 'data': data, 'model': model})
+
+    return row, curve
+
+
+def fit(config, workers = None):
+    '''
+    Fita b, beta (e c, se cap for None) aos casos notificados acumulados de cada temporada
+    de `seasons` (uma lista de dicts com start_date e end_date), em paralelo.
+
+    :returns: dict com as tabelas `fits` e `curves`.
+    '''
+    df_we = _weather(config)
+    df_cases = get_dengue_data(path = os.path.join(config['data_dir'], SOURCES['dengue']))
+
+    res = map_jobs(_fit_season, list(enumerate(config['seasons'])), workers, config, df_we, df_cases)
+
+    return {'fits': pd.DataFrame([row for row, _ in res]),
+            'curves': pd.concat([curve for _, curve in res], ignore_index = True)}
+
+
+def _sweep_block(block, grid, t, y0, temp, cap, config):
+
+    rows = grid[block]
+
+    if config['method'] == 'fast':
+        from fast_model import solve_fast
+
+        caps = np.stack([np.broadcast_to(cap if np.isnan(c) else c, t.shape) for c in rows[:, 2]])
+        y = solve_fast(t, y0, rows[:, :2], PARAM_FIXED, temp, caps, config['fixed'],
+                       outputs = ('cases', 'incidence'))
+    else:
+        y = np.stack([solve_model(t, y0, (b, beta), PARAM_FIXED, temp, cap if np.isnan(c) else c,
+                                  config['fixed'], outputs = ['cases', 'incidence'],
+                                  backend = config['backend'])
+                      for b, beta, c in rows])
+
+    return np.column_stack([y[:, 0, -1], np.argmax(y[:, 1], axis = 1), y[:, 1].max(axis = 1)])
+
+
+def sweep(config, workers = None):
+    '''
+    Simula todas as combinações dos valores de `grid` (um dict com listas de valores para
+    b, beta e, opcionalmente, c) e resume cada simulação. `method` pode ser 'solve_model' ou
+    'fast' (integração com passo fixo de fast_model.py).
+
+    :returns: dict com a tabela `sweep`.
+    '''
+    unknown = sorted(set(config['grid']) - set(GRID_NAMES))
+    if unknown:
+        raise ValueError(f'a grade só pode conter {GRID_NAMES}, não {unknown}.')
+
+    df_we = _weather(config)
+    t, dates, temp, cap, y0 = _setup(config, df_we, config['start_date'], config['end_date'])
+
+    values = [config['grid'].get(name, [np.nan]) for name in GRID_NAMES]
+    grid = np.array(list(itertools.product(*values)), dtype = float)
+
+    res = np.concatenate(map_jobs(_sweep_block, blocks(len(grid), workers), workers,
+                              grid, t, y0, temp, cap, config))
+
+    df = pd.DataFrame(grid, columns = GRID_NAMES)
+    df['final_cases'] = res[:, 0]
+    df['attack_rate'] = res[:, 0]/config['N']
+    df['peak_day'] = res[:, 1].astype(int)
+    df['peak_date'] = dates[df['peak_day'].to_numpy()]
+    df['peak_incidence'] = res[:, 2]
+
+    return {'sweep': df}
+
+
+def _forecast_origin(i, cases, temp, y0, config):
+
+    from backtest import forecast_samples
+
+    point, samples, out = forecast_samples(i, cases, temp, config['fit_days'], config['horizon'],
+                                           config['fixed'], y0, n_samples = config['n_samples'],
+                                           seed = config['seed'])
+
+    return point, np.quantile(samples, config['quantiles'], axis = 0), out.params.valuesdict(), out.nfev, out.success
+
+
+def forecast(config, workers = None):
+    '''
+    Fita o modelo aos `fit_days` dias anteriores a cada data de `origins` e prevê os casos
+    diários dos `horizon` dias seguintes, como no backtesting (ver `backtest.forecast_samples`).
+    Se origins for None, usa o dia seguinte ao último dia com dados de casos. Nos dias
+    depois do fim dos dados de clima é usada a temperatura do mesmo dia do ano anterior.
+
+    :returns: dict com as tabelas `forecast` e `params`.
+    '''
+    from panel import load_panel
+    from backtest import prepare_series
+
+    panel = load_panel(data_dir = config['data_dir'])
+    dates, cases, temp = prepare_series(panel)
+
+    observed = np.flatnonzero(panel.mask('dengue'))
+    n_obs = observed[-1] + 1
+
+    if config['origins'] is None:
+        origins = [dates[n_obs - 1] + pd.Timedelta(days = 1)]
+    else:
+        origins = [pd.Timestamp(d) for d in config['origins']]
+
+    pos = [(d - dates[0]).days for d in origins]
+    if min(pos) < config['fit_days'] or max(pos) > n_obs:
+        raise ValueError('cada origem precisa de fit_days dias de casos antes dela.')
+
+    # temperatura do ano anterior nos dias sem dados de clima
+    last = max(pos) + config['horizon']
+    temp = np.concatenate([temp, np.zeros(max(0, last - len(temp)))])
+    for j in range(len(dates), last):
+        temp[j] = temp[j - 365]
+
+    y0 = initial_conditions(config['N'])
+    res = map_jobs(_forecast_origin, pos, workers, cases[:n_obs], temp, y0, config)
+
+    frames, params = [], []
+    for origin, i, (point, q, pars, nfev, success) in zip(origins, pos, res):
+        horizon = np.arange(config['horizon'])
+        obs = np.full(len(horizon), np.nan)
+        n = max(0, min(len(horizon), n_obs - i))
+        obs[:n] = cases[i:i + n]
+
+        df = pd.DataFrame({'origin': origin, 'date': origin + pd.to_timedelta(horizon, unit = 'D'),
+                           'day': horizon + 1, 'point': point, 'observed': obs})
+        for level, values in zip(config['quantiles'], q):
+            df[f'q{level:g}'] = values
+
+        frames.append(df)
+        params.append({'origin': origin, **pars, 'nfev': nfev, 'success': success})
+
+    return {'forecast': pd.concat(frames, ignore_index = True), 'params': pd.DataFrame(params)}
+
+
+def _ingest_file(path, config):
+
+    from ingest import ingest_dengue_cases
+
+    return ingest_dengue_cases(path, config['start_date'], config['end_date'],
+                               municipalities = config['municipalities'],
+                               chunksize = config['chunksize'], date_col = config['date_col'],
+                               mun_col = config['mun_col'], date_format = config['date_format'])
+
+
+def ingest(config, workers = None):
+    '''
+    Lê as listas de casos do SINAN de `paths` (um arquivo por processo) e soma as contagens
+    diárias por município e categoria (ver ingest.py).
+
+    :returns: dict com a tabela `cases`.
+    '''
+    from ingest import daily_frame
+
+    if not config['paths']:
+        raise ValueError('paths deve conter pelo menos um arquivo.')
+
+    counts = sum(map_jobs(_ingest_file, list(config['paths']), workers, config))
+    codes = config['municipalities'] or [None]
+
+    frames = []
+    for m, code in enumerate(codes):
+        df = daily_frame(counts, config['start_date'], mun = m).reset_index()
+        df.insert(0, 'municipality', code)
+        frames.append(df)
+
+    return {'cases': pd.concat(frames, ignore_index = True)}
+
+
+RUNNERS = {'simulate': simulate, 'fit': fit, 'sweep': sweep, 'forecast': forecast, 'ingest': ingest}
+
+
+def _commit():
+
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output = True,
+                              text = True, cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def write_results(tables, output, fmt = 'parquet', meta = None):
+    '''
+    Salva as tabelas de um subcomando e o meta.json no diretório output.
+
+    :params tables: dict. {nome: pd.DataFrame}.
+    :params fmt: string. Um de FORMATS.
+    :params meta: dict or None. Metadados da execução.
+
+    :returns: dict com os metadados salvos.
+    '''
+    if fmt not in FORMATS:
+        raise ValueError(f'fmt deve ser um de {FORMATS}.')
+
+    os.makedirs(output, exist_ok = True)
+    meta = dict(meta or {}, tables = {})
+
+    for name, df in tables.items():
+        file = f'{name}.{fmt}'
+
+        if fmt == 'parquet':
+            df.to_parquet(os.path.join(output, file), index = False)
+        else:
+            df.to_csv(os.path.join(output, file), index = False)
+
+        meta['tables'][name] = {'file': file, 'rows': len(df), 'columns': list(df.columns)}
+
+    with open(os.path.join(output, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent = 2, default = str)
+
+    return meta
+
+
+def run(command, config, output, workers = None, fmt = 'parquet', argv = None):
+    '''
+    Executa um subcomando e salva os resultados (ver `write_results`).
+
+    :params command: string. Chave de RUNNERS.
+    :params config: dict. Configuração completa (ver `load_config`).
+    :params output: string. Diretório de saída.
+    :params workers: int or None. Número de processos. Se 1, executa no processo atual.
+
+    :returns: dict com os metadados da execução.
+    '''
+    started = pd.Timestamp.now().isoformat(timespec = 'seconds')
+    t0 = time.perf_counter()
+
+    tables = RUNNERS[command](config, workers)
+
+    import scipy
+
+    meta = {'command': command, 'config': config, 'argv': argv, 'started': started,
+            'seconds': time.perf_counter() - t0, 'workers': workers or os.cpu_count(),
+            'commit': _commit(), 'python': platform.python_version(), 'numpy': np.__version__,
+            'scipy': scipy.__version__, 'pandas': pd.__version__, 'machine': platform.node()}
+
+    return write_results(tables, output, fmt, meta)
+
+
+def main(argv = None):
+
+    parser = argparse.ArgumentParser(prog = 'pyarbo', description = 'Linha de comando do pyarbo.')
+    sub = parser.add_subparsers(dest = 'command', required = True)
+
+    for name, runner in RUNNERS.items():
+        p = sub.add_parser(name, help = runner.__doc__.strip().split('\n')[0])
+        p.add_argument('config', nargs = '?', default = None, help = 'arquivo .json ou .toml')
+        p.add_argument('--output', '-o', required = True, help = 'diretório de saída')
+        p.add_argument('--workers', '-w', type = int, default = None,
+                       help = 'número de processos (padrão: todos os núcleos)')
+        p.add_argument('--format', choices = FORMATS, default = 'parquet', help = 'formato das tabelas')
+        p.add_argument('--set', action = 'append', default = [], metavar = 'CHAVE=VALOR',
+                       help = 'substitui uma chave da configuração')
+
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config, args.command, args.set)
+    meta = run(args.command, config, args.output, args.workers, args.format,
+               argv = sys.argv[1:] if argv is None else list(argv))
+
+    for name, info in meta['tables'].items():
+        print(f"{name}: {info['rows']} linhas em {os.path.join(args.output, info['file'])}")
+
+    print(f"{args.command} concluído em {meta['seconds']:.1f} s")
+
+
+if __name__ == '__main__':
+
+    main()
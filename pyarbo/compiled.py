@@ -0,0 +1,271 @@
+'''
+Neste .py script está o backend compilado do modelo do Yang, usado por
+`solve_model(..., backend = 'numba')`.
+
+As forçantes diárias (b, beta, C_A, C_M, capacidade suporte e parâmetros entomológicos) são
+reunidas em uma tabela (n_dias, len(TABLE_ROWS)). O lado direito e o jacobiano analítico
+(`model_rhs` e `model_jacobian` de edo_model_yang.py) e os integradores trabalham apenas
+com arrays de float64, sem listas nem dicts, de forma que podem ser compilados pelo Numba
+(`numba.njit`). Dois integradores de passo adaptativo estão disponíveis:
+
+    * 'rk45': Dormand-Prince 5(4), o mesmo par de Runge-Kutta usado pelo solve_ivp;
+    * 'rosenbrock': Rosenbrock 2(3) de Shampine (o método do ode23s do MATLAB), que usa o
+      jacobiano e é estável quando a capacidade suporte deixa o sistema rígido. É o padrão.
+
+Os passos nunca atravessam a virada de um dia nem um instante de saída, e dentro de um passo
+a forçante é a do dia em que o passo começa (como forcing = 'segments' em `solve_model`).
+
+O Numba é opcional. Sem ele, as mesmas funções rodam como Python puro (útil apenas para
+conferir os resultados) e `solve_model(..., backend = 'numba')` levanta ImportError.
+'''
+import numbers
+import numpy as np
+from edo_model_yang import onto_params, model_rhs, model_jacobian, ONTO_NAMES, ONTO_FIXED, RATE_ROWS
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        # sem o Numba as funções ficam em Python puro
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+METHODS = ['rosenbrock', 'rk45']
+
+# colunas da tabela de forçantes (a capacidade suporte já multiplicada por 10**D), uma linha
+# por dia no formato de `model_rhs`
+TABLE_ROWS = RATE_ROWS
+
+# coeficientes do Dormand-Prince 5(4) (os mesmos de scipy.integrate.RK45)
+DP_C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1])
+DP_A = np.array([[0, 0, 0, 0, 0],
+                 [1/5, 0, 0, 0, 0],
+                 [3/40, 9/40, 0, 0, 0],
+                 [44/45, -56/15, 32/9, 0, 0],
+                 [19372/6561, -25360/2187, 64448/6561, -212/729, 0],
+                 [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656]])
+DP_B = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84])
+DP_E = np.array([-71/57600, 0, 71/16695, -71/1920, 17253/339200, -22/525, 1/40])
+
+
+def forcing_table(t, param_fit, param_fixed, temp, cap, fixed):
+    '''
+    Monta a tabela de forçantes diárias usada pelo backend compilado.
+
+    Os parâmetros são os mesmos de `solve_model`.
+
+    :returns: tuple. (tabela (n_dias, len(TABLE_ROWS)), constantes [MU_H, THETA_H, ALPHA_H, K])
+    '''
+    MU_H, THETA_H, ALPHA_H, K, C_A, C_M, D = param_fixed
+
+    n = max(int(np.ceil(t[-1])), 1)
+
+    if fixed:
+        pars = dict(zip(ONTO_NAMES, ONTO_FIXED))
+    else:
+        pars = temp if isinstance(temp, dict) else onto_params(temp)
+
+    cap = cap if isinstance(cap, numbers.Number) else np.asarray(cap, dtype = float)
+    values = [param_fit[0], param_fit[1], C_A, C_M, (10**D)*cap] + [pars[name] for name in ONTO_NAMES]
+
+    table = np.empty((n, len(TABLE_ROWS)))
+
+    for i, v in enumerate(values):
+        if isinstance(v, numbers.Number) or np.ndim(v) == 0:
+            table[:, i] = v
+        else:
+            # séries mais curtas que a integração repetem o último valor
+            v = np.asarray(v, dtype = float)[:n]
+            table[:len(v), i] = v
+            table[len(v):, i] = v[-1]
+
+    return table, np.array([MU_H, THETA_H, ALPHA_H, K], dtype = float)
+
+
+# lado direito e jacobiano analítico do modelo (ver `model_rhs` e `model_jacobian`),
+# compilados pelo Numba
+rhs = njit(cache = True)(model_rhs)
+jacobian = njit(cache = True)(model_jacobian)
+
+
+@njit(cache = True)
+def _error_norm(err, y, y_new, rtol, atol):
+    # norma RMS do erro local, como no solve_ivp
+    s = 0.0
+    for i in range(len(err)):
+        scale = atol + rtol*max(abs(y[i]), abs(y_new[i]))
+        s += (err[i]/scale)**2
+
+    return np.sqrt(s/len(err))
+
+
+@njit(cache = True)
+def _dopri_step(y, f0, h, p, consts, rtol, atol, k, y_new, f_new):
+    # um passo do Dormand-Prince; k[0] deve conter f0. Retorna a norma do erro.
+    k[0, :] = f0
+
+    for s in range(1, 6):
+        y_new[:] = y
+        for r in range(s):
+            y_new += h*DP_A[s, r]*k[r]
+        rhs(y_new, p, consts, k[s])
+
+    y_new[:] = y
+    for s in range(6):
+        y_new += h*DP_B[s]*k[s]
+
+    rhs(y_new, p, consts, f_new)
+    k[6, :] = f_new
+
+    err = np.zeros(len(y))
+    for s in range(7):
+        err += h*DP_E[s]*k[s]
+
+    return _error_norm(err, y, y_new, rtol, atol)
+
+
+@njit(cache = True)
+def _rosenbrock_step(y, f0, h, p, consts, rtol, atol, J, y_new, f_new):
+    # um passo do Rosenbrock 2(3) de Shampine (ode23s) para o sistema autônomo do dia.
+    # Retorna a norma do erro.
+    n = len(y)
+    gamma = 1/(2 + np.sqrt(2.0))
+    e32 = 6 + np.sqrt(2.0)
+
+    jacobian(y, p, consts, J)
+    Winv = np.linalg.inv(np.eye(n) - h*gamma*J)
+
+    k1 = Winv @ f0
+    f1 = np.empty(n)
+    rhs(y + 0.5*h*k1, p, consts, f1)
+    k2 = Winv @ (f1 - k1) + k1
+
+    y_new[:] = y + h*k2
+    rhs(y_new, p, consts, f_new)
+    k3 = Winv @ (f_new - e32*(k2 - f1) - 2*(k1 - f0))
+
+    err = (h/6)*(k1 - 2*k2 + k3)
+
+    return _error_norm(err, y, y_new, rtol, atol)
+
+
+@njit(cache = True)
+def integrate(method, t_eval, y0, table, consts, rtol, atol, first_step, max_steps, Y):
+    '''
+    Integra o modelo de t_eval[0] até t_eval[-1], escrevendo o estado de cada instante de
+    t_eval nas colunas de Y (8, len(t_eval)).
+
+    :params method: int. 0 para 'rosenbrock' e 1 para 'rk45' (índice em METHODS).
+    :params table: array. Tabela de forçantes (ver `forcing_table`).
+
+    :returns: tuple. (status, nfev, njev, passos aceitos, passos rejeitados). status é 0 se a
+              integração chegou ao fim e -1 se o passo ficou pequeno demais ou max_steps foi
+              atingido.
+    '''
+    n = len(y0)
+    order = 2.0 if method == 0 else 4.0
+
+    y = y0.copy()
+    y_new = np.empty(n)
+    f0 = np.empty(n)
+    f_new = np.empty(n)
+    k = np.empty((7, n))
+    J = np.empty((n, n))
+
+    Y[:, 0] = y
+    t = t_eval[0]
+    h = first_step
+    j = 1
+
+    nfev = 0
+    njev = 0
+    steps = 0
+    rejected = 0
+    day_f0 = -1
+
+    while j < len(t_eval):
+        day = min(int(np.floor(t)), table.shape[0] - 1)
+        p = table[day]
+
+        # f0 é reaproveitado do fim do passo anterior se o dia não mudou
+        if day != day_f0:
+            rhs(y, p, consts, f0)
+            nfev += 1
+            day_f0 = day
+
+        t_stop = min(t_eval[j], np.floor(t) + 1.0)
+        h_try = min(h, t_stop - t)
+
+        if method == 0:
+            err = _rosenbrock_step(y, f0, h_try, p, consts, rtol, atol, J, y_new, f_new)
+            nfev += 2
+            njev += 1
+        else:
+            err = _dopri_step(y, f0, h_try, p, consts, rtol, atol, k, y_new, f_new)
+            nfev += 6
+
+        if err <= 1.0:
+            steps += 1
+            factor = 5.0 if err == 0 else min(5.0, 0.9*err**(-1/(order + 1)))
+
+            # um passo encurtado pela virada do dia não reduz o passo seguinte
+            h = max(h, h_try*factor) if h_try < h else h_try*factor
+
+            t = t + h_try
+            y[:] = y_new
+            f0[:] = f_new
+
+            if t_stop - t <= 1e-12*max(1.0, abs(t)):
+                t = t_stop
+                if t_stop == t_eval[j]:
+                    Y[:, j] = y
+                    j += 1
+        else:
+            rejected += 1
+            h = h_try*max(0.2, 0.9*err**(-1/(order + 1)))
+
+        if h < 1e-12 or steps + rejected > max_steps or not np.isfinite(err):
+            return -1, nfev, njev, steps, rejected
+
+    return 0, nfev, njev, steps, rejected
+
+
+def solve_compiled(t, y0, param_fit, param_fixed, temp, cap, fixed, method = 'rosenbrock',
+                   every = 1, rtol = 1e-3, atol = 1e-6, first_step = 1e-3, max_steps = 1000000):
+    '''
+    Resolve o modelo com o backend compilado.
+
+    :params method: string. Um de METHODS.
+    :params rtol, atol: tolerâncias relativa e absoluta (os padrões do solve_ivp).
+    :params first_step: float. Tamanho do primeiro passo em dias.
+    :params max_steps: int. Número máximo de tentativas de passo.
+
+    Os demais parâmetros são os mesmos de `solve_model`.
+
+    :returns: OptimizeResult com `t`, `y`, `nfev`, `njev`, `nlu`, `steps`, `rejected`,
+              `method`, `status`, `success` e `message`, como o resultado do solve_ivp.
+    '''
+    from scipy.optimize import OptimizeResult
+
+    if method not in METHODS:
+        raise ValueError(f'method deve ser um de {METHODS}.')
+
+    t_eval = np.asarray(t[::every], dtype = float)
+    table, consts = forcing_table(t, param_fit, param_fixed, temp, cap, fixed)
+
+    Y = np.zeros((len(y0), len(t_eval)))
+    status, nfev, njev, steps, rejected = integrate(METHODS.index(method), t_eval,
+                                                    np.asarray(y0, dtype = float), table, consts,
+                                                    rtol, atol, first_step, max_steps, Y)
+
+    message = ('The solver successfully reached the end of the integration interval.' if status == 0
+               else 'Integration step failed.')
+
+    return OptimizeResult(t = t_eval, y = Y, nfev = nfev, njev = njev,
+                          nlu = njev if method == 'rosenbrock' else 0, steps = steps,
+                          rejected = rejected, method = method, status = status, success = status == 0,
+                          message = message, t_events = None, y_events = None)
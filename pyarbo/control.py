@@ -0,0 +1,219 @@
+'''
+Neste .py script estão as funções para avaliar e otimizar campanhas de controle vetorial:
+
+    * larvicida: esforço de controle na fase aquática (C_A);
+    * fumacê: esforço de controle na fase terrestre (C_M).
+
+Uma estratégia é definida pelo dia de início, pela duração (em dias) e pela intensidade de
+cada campanha (ver STRATEGY). Os esforços diários são montados em arrays e passados em
+param_fixed para `system_odes`. O custo de uma campanha é intensidade*duração*custo unitário
+e, se o custo total passar do orçamento, as intensidades são reduzidas proporcionalmente.
+
+As estratégias candidatas são avaliadas em paralelo (`evaluate_strategies`) e a busca pela
+estratégia que minimiza os casos acumulados é feita por evolução diferencial
+(`optimize_control`), que retorna também as estatísticas de convergência e tempo.
+'''
+import os
+import time
+import numpy as np
+import pandas as pd
+from scipy.optimize import differential_evolution
+from parallel import map_jobs, blocks
+from events import solve_summary
+from fitting import PARAM_FIXED
+
+STRATEGY = ['start_a', 'duration_a', 'intensity_a', 'start_m', 'duration_m', 'intensity_m']
+
+
+def campaign_schedule(n_days, start, duration, intensity):
+    '''
+    Retorna o esforço diário de uma campanha.
+
+    :params n_days: int. Número de dias da simulação.
+    :params start: float. Dia de início (arredondado para o dia mais próximo).
+    :params duration: float. Duração em dias (arredondada).
+    :params intensity: float. Esforço de controle diário durante a campanha - day^-1.
+
+    :returns: array.
+    '''
+    out = np.zeros(n_days)
+
+    first = max(int(round(start)), 0)
+    last = min(int(round(start)) + int(round(duration)), n_days)
+
+    out[first:last] = intensity
+
+    return out
+
+
+def strategy_cost(strategy, cost_a = 1.0, cost_m = 1.0):
+    '''
+    Custo de uma estratégia: soma de intensidade*duração*custo unitário das campanhas.
+
+    :params strategy: dict or array. Valores de STRATEGY.
+    :params cost_a: float. Custo por unidade de esforço-dia do larvicida.
+    :params cost_m: float. Custo por unidade de esforço-dia do fumacê.
+    '''
+    s = _as_dict(strategy)
+
+    return (cost_a*s['intensity_a']*round(s['duration_a'])
+            + cost_m*s['intensity_m']*round(s['duration_m']))
+
+
+def apply_budget(strategy, budget = None, cost_a = 1.0, cost_m = 1.0):
+    '''
+    Reduz as intensidades proporcionalmente para que o custo não passe do orçamento.
+
+    :params strategy: dict or array. Valores de STRATEGY.
+    :params budget: float or None. Orçamento. Se None, a estratégia não é alterada.
+
+    :returns: dict.
+    '''
+    s = _as_dict(strategy)
+    cost = strategy_cost(s, cost_a, cost_m)
+
+    if budget is not None and cost > budget:
+        s['intensity_a'] *= budget/cost
+        s['intensity_m'] *= budget/cost
+
+    return s
+
+
+def _as_dict(strategy):
+
+    if isinstance(strategy, dict):
+        return dict(strategy)
+
+    return dict(zip(STRATEGY, np.asarray(strategy, dtype = float).tolist()))
+
+
+def control_param_fixed(strategy, n_days, param_fixed = PARAM_FIXED):
+    '''
+    Retorna param_fixed com C_A e C_M substituídos pelos esforços diários da estratégia.
+    '''
+    s = _as_dict(strategy)
+
+    c_a = param_fixed[4] + campaign_schedule(n_days, s['start_a'], s['duration_a'], s['intensity_a'])
+    c_m = param_fixed[5] + campaign_schedule(n_days, s['start_m'], s['duration_m'], s['intensity_m'])
+
+    return param_fixed[:4] + (c_a, c_m) + param_fixed[6:]
+
+
+def evaluate_strategy(strategy, t, y0, param_fit, temp = None, cap = 1, fixed = True,
+                      budget = None, cost_a = 1.0, cost_m = 1.0, param_fixed = PARAM_FIXED):
+    '''
+    Simula o modelo com uma estratégia de controle.
+
+    :params strategy: dict or array. Valores de STRATEGY.
+    :params t: array. Intervalo de tempo, [0, 1, 2, ..., n - 1].
+    :params y0: list. Condições iniciais.
+    :params param_fit: tuple. (b, beta).
+    :params temp: array or None. Temperaturas usadas se fixed for False.
+    :params cap: float or array. Capacidade suporte.
+    :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos.
+    :params budget: float or None. Orçamento (ver `apply_budget`).
+
+    :returns: dict com a estratégia (após o orçamento), `cost`, `final_cases`, `peak_day` e
+              `peak_incidence`.
+    '''
+    s = apply_budget(strategy, budget, cost_a, cost_m)
+
+    summary = solve_summary(t, y0, param_fit, control_param_fixed(s, len(t), param_fixed),
+                            temp, cap, fixed)
+
+    s['cost'] = strategy_cost(s, cost_a, cost_m)
+
+    for name in ['final_cases', 'peak_day', 'peak_incidence']:
+        s[name] = float(summary[name])
+
+    return s
+
+
+def _evaluate_block(block, *args):
+
+    return [evaluate_strategy(strategy, *args) for strategy in block]
+
+
+def evaluate_strategies(strategies, t, y0, param_fit, temp = None, cap = 1, fixed = True,
+                        budget = None, cost_a = 1.0, cost_m = 1.0, param_fixed = PARAM_FIXED,
+                        workers = None):
+    '''
+    Avalia um conjunto de estratégias em paralelo.
+
+    :params strategies: array (n_estratégias, 6) or list of dict. Valores de STRATEGY.
+    :params workers: int or None. Número de processos. Se 1, executa no processo atual.
+
+    Os demais parâmetros são os mesmos de `evaluate_strategy`.
+
+    :returns: pd.DataFrame com uma linha por estratégia.
+    '''
+    strategies = [_as_dict(s) for s in strategies]
+    args = (t, y0, param_fit, temp, cap, fixed, budget, cost_a, cost_m, param_fixed)
+
+    jobs = [[strategies[i] for i in block] for block in blocks(len(strategies), workers)]
+    rows = [row for block in map_jobs(_evaluate_block, jobs, workers, *args) for row in block]
+
+    return pd.DataFrame(rows)
+
+
+def _objective(x, *args):
+
+    return evaluate_strategy(x, *args)['final_cases']
+
+
+def optimize_control(t, y0, param_fit, temp = None, cap = 1, fixed = True, budget = 10.0,
+                     cost_a = 1.0, cost_m = 1.0, max_duration = 90, max_intensity = 0.5,
+                     bounds = None, param_fixed = PARAM_FIXED, workers = None, maxiter = 30,
+                     popsize = 10, tol = 1e-3, seed = 0):
+    '''
+    Procura a estratégia que minimiza os casos acumulados no fim da simulação, respeitando o
+    orçamento, por evolução diferencial (scipy.optimize.differential_evolution). Os dias de
+    início e as durações são tratados como inteiros.
+
+    :params budget: float. Orçamento.
+    :params max_duration: int. Duração máxima de cada campanha.
+    :params max_intensity: float. Intensidade máxima de cada campanha.
+    :params bounds: list or None. Limites de cada valor de STRATEGY. Se None, são usados
+                    [0, n - 1] para o início, [0, max_duration] e [0, max_intensity].
+    :params workers: int or None. Número de processos usados para avaliar cada geração.
+    :params maxiter: int. Número máximo de gerações.
+    :params popsize: int. Multiplicador do tamanho da população (popsize*6 estratégias).
+    :params tol: float. Tolerância relativa de convergência da população.
+    :params seed: int. Semente.
+
+    Os demais parâmetros são os mesmos de `evaluate_strategy`.
+
+    :returns: dict com `strategy` (melhor estratégia após o orçamento), `final_cases`,
+              `baseline_cases` (sem controle), `reduction` (fração de casos evitados),
+              `cost`, `nfev`, `nit`, `success`, `message`, `runtime` (segundos) e `history`
+              (melhor valor da função objetivo em cada geração).
+    '''
+    t0 = time.perf_counter()
+
+    if workers is None:
+        workers = os.cpu_count()
+
+    if bounds is None:
+        bounds = [(0, len(t) - 1), (0, max_duration), (0, max_intensity)]*2
+
+    args = (t, y0, param_fit, temp, cap, fixed, budget, cost_a, cost_m, param_fixed)
+
+    history = []
+
+    def callback(intermediate_result):
+        history.append(float(intermediate_result.fun))
+
+    res = differential_evolution(_objective, bounds, args = args, maxiter = maxiter,
+                                 popsize = popsize, tol = tol, seed = seed,
+                                 integrality = [True, True, False]*2, callback = callback,
+                                 workers = workers, updating = 'immediate' if workers == 1 else 'deferred',
+                                 polish = False)
+
+    best = evaluate_strategy(res.x, *args)
+    baseline = solve_summary(t, y0, param_fit, param_fixed, temp, cap, fixed)['final_cases']
+
+    return {'strategy': {name: best[name] for name in STRATEGY},
+            'final_cases': best['final_cases'], 'baseline_cases': float(baseline),
+            'reduction': 1 - best['final_cases']/float(baseline), 'cost': best['cost'],
+            'nfev': res.nfev, 'nit': res.nit, 'success': res.success, 'message': res.message,
+            'runtime': time.perf_counter() - t0, 'history': history}
@@ -1,10 +1,11 @@
 import numbers
+import functools
 import numpy as np 
-import pandas as pd 
-import matplotlib.pyplot as plt 
-from scipy.integrate import solve_ivp
-from get_data import get_weather_data 
-from parameters import dict_d, dict_mu_a, dict_mu_m, dict_gamma_m, dict_theta_m
+import instrumentation
+
+# pandas, scipy, matplotlib, get_data e as tabelas de parameters.py só são importados no
+# primeiro uso (dentro das funções e em `parameter_tables`), para que os processos de
+# trabalho e a linha de comando que só integram o modelo iniciem rápido.
 
 # Os parâmetros abaixo são constantes e não serão fitados, por essa razão são definidos com letra maiúscula 
 MU_H = 1/(365*76)    #human mortality rate - day^-1
@@ -15,6 +16,84 @@ THETA_H = 0.027   #intrinsic incubation rate - day^-1
 ALPHA_H = 0.1 #recovering rate - day^-1
 D = 4; 
 
+# compartimentos do modelo, na ordem do vetor de estado, e saídas derivadas de solve_model
+COMPARTMENTS = ['A', 'Ms', 'Me', 'Mi', 'Hs', 'He', 'Hi', 'Hr']
+DERIVED = ['cases', 'incidence', 'mosquitoes', 'humans']
+
+# valores usados quando fixed = True, na ordem das colunas de ONTO_TABLE
+ONTO_NAMES = ['d', 'theta_m', 'gamma_m', 'mu_a', 'mu_m']
+ONTO_FIXED = [5.6, 0.11, 0.095, 0.24, 0.055]
+
+# primeira temperatura de ONTO_TABLE em décimos de °C
+ONTO_T0 = -18
+
+# forçantes de um dia, na ordem usada por `model_rhs` e `model_jacobian` (a capacidade
+# suporte já multiplicada por 10**D)
+RATE_ROWS = ['b', 'beta', 'c_a', 'c_m', 'cap'] + ONTO_NAMES
+
+
+# dicionários de parameters.py, preenchido por `parameter_tables` no primeiro uso
+_DICTS = {}
+
+
+@functools.lru_cache(maxsize = None)
+def parameter_tables():
+    '''
+    Carrega as tabelas de parameters.py no primeiro uso.
+
+    :returns: tuple. (dict com os dicionários {temperatura: valor} de cada nome de ONTO_NAMES,
+              ONTO_TABLE). ONTO_TABLE tem uma linha para cada temperatura entre -1.8 e
+              41.7 °C com passo de 0.1 °C e uma coluna para cada nome de ONTO_NAMES.
+    '''
+    import parameters
+
+    dicts = {'d': parameters.dict_d, 'theta_m': parameters.dict_theta_m,
+             'gamma_m': parameters.dict_gamma_m, 'mu_a': parameters.dict_mu_a,
+             'mu_m': parameters.dict_mu_m}
+
+    table = np.array([list(dicts[name].values()) for name in ONTO_NAMES]).T
+
+    _DICTS.update(dicts)
+
+    return dicts, table
+
+
+def __getattr__(name):
+    # ONTO_TABLE e os dicionários de parameters.py continuam acessíveis como atributos do
+    # módulo, mas só são carregados no primeiro acesso
+    if name == 'ONTO_TABLE':
+        return parameter_tables()[1]
+
+    if name.startswith('dict_') and name[5:] in ONTO_NAMES:
+        return parameter_tables()[0][name[5:]]
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def onto_params(temp, fixed = False):
+    '''
+    Versão vetorizada das funções d, theta_m, gamma_m, mu_a e mu_m: retorna os parâmetros
+    entomológicos para todas as temperaturas de um array de uma só vez. As temperaturas são
+    arredondadas para 0.1 °C e as que estão fora da tabela recebem o valor do extremo mais
+    próximo (os parâmetros são constantes nos extremos).
+
+    :params temp: float or array. Temperaturas em °C, de qualquer dimensão.
+    :params fixed: boolean. Se True, retorna os valores fixos com a dimensão de temp.
+
+    :returns: dict. Um array para cada nome de ONTO_NAMES, com a dimensão de temp.
+    '''
+    temp = np.asarray(temp, dtype = float)
+
+    if fixed:
+        return {name: np.full(temp.shape, value) for name, value in zip(ONTO_NAMES, ONTO_FIXED)}
+
+    table = parameter_tables()[1]
+
+    idx = np.clip(np.rint(temp*10).astype(int) - ONTO_T0, 0, table.shape[0] - 1)
+
+    values = table[idx]
+
+    return {name: values[..., i] for i, name in enumerate(ONTO_NAMES)}
+
 def C0(Ms,k,delta,gamma_m, mu_m, mu_a, c_m = 0, c_a = 0):
     '''
     Essa função determina o valor inicial de C0 baseado no ponto de equilíbrio livre de 
@@ -77,6 +156,7 @@ def R_m(k,delta,gamma_m, mu_m, mu_a, c_m = 0, c_a = 0):
 
     return Rm
 
+@instrumentation.timed('capacity')
 def sup_cap_yang(df, k=7,w1=0.5, C0=5,C1=30,C2 =0.1):
     '''
     Função que realiza o cálculo da capacidade suporte variando de acordo com os dados 
@@ -118,6 +198,33 @@ def sup_cap_yang(df, k=7,w1=0.5, C0=5,C1=30,C2 =0.1):
     return C 
 
 
+@instrumentation.timed('capacity')
+def sup_cap_yang_array(W, T_min, T_max, k=7, w1=0.5, C0=5, C1=30, C2=0.1):
+    '''
+    Versão vetorizada de `sup_cap_yang` para arrays com os dias no último eixo (por exemplo
+    um cenário de clima por linha).
+
+    :params W: array. Chuva diária [mm].
+    :params T_min: array. Temperatura mínima diária.
+    :params T_max: array. Temperatura usada como máxima em `sup_cap_yang` (a média diária).
+
+    Os demais parâmetros são os mesmos de `sup_cap_yang`.
+
+    :returns: array com n - k dias no último eixo (o dia k é o primeiro).
+    '''
+    W = np.asarray(W, dtype = float)
+    T = w1*(np.asarray(T_max, dtype = float) + np.asarray(T_min, dtype = float))
+
+    n = W.shape[-1]
+
+    W_m = np.zeros(W.shape[:-1] + (n - k,))
+
+    for i in range(1, k + 1):
+        W_m += W[..., k - i:n - i]/T[..., k - i:n - i]**i
+
+    return C2 + (C0*(W[..., k:] + W_m))/(C1 + W[..., k:] + W_m)
+
+
 def C(t, D, cap_t):
     '''
     Função que retorna um valor para a capacidade suporte.
@@ -138,6 +245,24 @@ def C(t, D, cap_t):
     return cap
 
 
+def daily_value(t, par):
+    '''
+    Função que retorna o valor de um parâmetro no instante t. O parâmetro pode ser constante
+    ou uma série com um valor por dia (por exemplo b*beta variando no tempo, ver
+    transmission.py).
+
+    :params t: float. Determina o instante de tempo considerado.
+    :params par: float or array.
+
+    :returns: float.
+    '''
+
+    if isinstance(par, numbers.Number):
+        return par
+
+    return par[int(t)]
+
+
 def get_temp(start_date, end_date):
     '''
     Função que retorna um array com a temperatura média em um determinado intervalo de 
@@ -149,6 +274,8 @@ def get_temp(start_date, end_date):
     :returns: array.
     '''
     
+    from get_data import get_weather_data
+
     df_we = get_weather_data()
     
     df_we = df_we.loc[(df_we.index >= start_date) & (df_we.index <= end_date)]
@@ -169,8 +296,10 @@ def theta_m(t, temp, fixed):
 
     if fixed == True:
         par = 0.11
-    else: 
-        par = dict_theta_m[temp[int(t)]]
+    elif isinstance(temp, dict):
+        par = temp['theta_m'][int(t)]
+    else:
+        par = (_DICTS or parameter_tables()[0])['theta_m'][temp[int(t)]]
 
     return par
 
@@ -188,8 +317,10 @@ def gamma_m(t,temp, fixed):
 
     if fixed == True:
         par = 0.095
+    elif isinstance(temp, dict):
+        par = temp['gamma_m'][int(t)]
     else:
-        par = dict_gamma_m[temp[int(t)]]
+        par = (_DICTS or parameter_tables()[0])['gamma_m'][temp[int(t)]]
     
     return par
 
@@ -207,8 +338,10 @@ def mu_a(t, temp, fixed):
 
     if fixed == True:
         par = 0.24
+    elif isinstance(temp, dict):
+        par = temp['mu_a'][int(t)]
     else:
-        par = dict_mu_a[temp[int(t)]]
+        par = (_DICTS or parameter_tables()[0])['mu_a'][temp[int(t)]]
 
     return par
 
@@ -227,8 +360,11 @@ def mu_m(t, temp, fixed):
     if fixed == True:
         par = 0.055
 
+    elif isinstance(temp, dict):
+        par = temp['mu_m'][int(t)]
+
     else:
-        par = dict_mu_m[temp[int(t)]]
+        par = (_DICTS or parameter_tables()[0])['mu_m'][temp[int(t)]]
     
     return par
 
@@ -246,8 +382,10 @@ def d(t,temp, fixed):
 
     if fixed == True:
         par = 5.6
+    elif isinstance(temp, dict):
+        par = temp['d'][int(t)]
     else:
-        par = dict_d[temp[int(t)]]
+        par = (_DICTS or parameter_tables()[0])['d'][temp[int(t)]]
 
     return par
 
@@ -255,10 +393,14 @@ def d(t,temp, fixed):
 def system_odes(t,x, param_fit, param_fixed, temp, cap, fixed = True):
     '''
     Função que implementa o sistema de equações. 
-    :params param_fit: tuple. parâmetros que serão fitados. 
-    :params param_fixed: tuple. parâmetros que serão fixados. 
+    :params param_fit: tuple. parâmetros que serão fitados (b, beta). Cada um pode ser um
+                       float ou um array com um valor por dia.
+    :params param_fixed: tuple. parâmetros que serão fixados. C_A e C_M podem ser arrays
+                         com um valor por dia.
     :params temp: array. Array com os valores de temperatura. O tamanho desse array deve ser 
                         condizente com o intervalo de tempo que o modelo será integrado. 
+                        Também pode ser o dict de séries diárias retornado por `onto_params`
+                        (por exemplo para cenários de clima, ver scenarios.py).
     :params cap: float or array. Parametro que irá determinar a cap suporte do modelo. 
     :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos. 
     '''
@@ -266,11 +408,37 @@ def system_odes(t,x, param_fit, param_fixed, temp, cap, fixed = True):
     #definindo parâmetros que vão ser fitados
     b, beta = param_fit 
 
-    beta_m = beta
-    beta_h = beta
-
     MU_H, THETA_H, ALPHA_H, K, C_A, C_M, D = param_fixed
 
+    # forçantes do dia na ordem de RATE_ROWS; C_A e C_M são o esforço de controle diário
+    # (campanhas de larvicida e fumacê, ver control.py)
+    p = (daily_value(t, b), daily_value(t, beta), daily_value(t, C_A), daily_value(t, C_M),
+         C(t, D, cap), d(t, temp, fixed), theta_m(t, temp, fixed), gamma_m(t, temp, fixed),
+         mu_a(t, temp, fixed), mu_m(t, temp, fixed))
+
+    return model_rhs(x, p, (MU_H, THETA_H, ALPHA_H, K), [0.0]*8)
+
+
+def model_rhs(x, p, consts, out):
+    '''
+    Equações do modelo, escritas em out. É a única implementação do lado direito: usada por
+    `system_odes`, pelas sensibilidades (transmission.py), pela órbita periódica (periodic.py)
+    e, compilada pelo Numba, pelo backend de compiled.py. Só usa indexação e operações com
+    números, para poder ser compilada; em Python puro p, consts e out podem ser tuplas ou
+    listas, que são mais rápidas que arrays pequenos.
+
+    :params x: array. Estado (8,), na ordem de COMPARTMENTS.
+    :params p: array. Forçantes do dia, na ordem de RATE_ROWS.
+    :params consts: array. [MU_H, THETA_H, ALPHA_H, K].
+    :params out: array or list. Onde as derivadas serão escritas (8 valores).
+
+    :returns: array. out.
+    '''
+    MU_H, THETA_H, ALPHA_H, K = consts[0], consts[1], consts[2], consts[3]
+    lam = p[0]*p[1]
+    c_a, c_m, cap = p[2], p[3], p[4]
+    d, theta_m, gamma_m, mu_a, mu_m = p[5], p[6], p[7], p[8], p[9]
+
     #Colocando cada variável em uma posição:
     A  = x[0] #Aquatic mosquito population
     Ms = x[1] #Susceptible mosquitos population
@@ -281,42 +449,359 @@ def system_odes(t,x, param_fit, param_fixed, temp, cap, fixed = True):
     Hi = x[6] #Infectious human population
     Hr = x[7] #Recovered Individuals
 
+    M = A + Ms + Me + Mi  #População total de Mosquitos
+    H = Hs + He + Hi + Hr #População total de humanos
+
+    inf_m = lam*Ms*Hi/H
+    inf_h = lam*Hs*Mi/H
+
+    out[0] = K*d*(1 - A/cap)*M - (gamma_m + mu_a + c_a)*A
+    out[1] = gamma_m*A - inf_m - (mu_m + c_m)*Ms
+    out[2] = inf_m - (theta_m + mu_m + c_m)*Me
+    out[3] = theta_m*Me - (mu_m + c_m)*Mi
+    out[4] = MU_H*(H - Hs) - inf_h
+    out[5] = inf_h - (THETA_H + MU_H)*He
+    out[6] = THETA_H*He - (ALPHA_H + MU_H)*Hi
+    out[7] = ALPHA_H*Hi - MU_H*Hr
+
+    return out
+
+
+def model_jacobian(x, p, consts, J):
+    '''
+    Jacobiano analítico de `model_rhs`, escrito em J (8, 8). Os parâmetros são os mesmos de
+    `model_rhs`.
+
+    :returns: array. J.
+    '''
+    MU_H, THETA_H, ALPHA_H, K = consts[0], consts[1], consts[2], consts[3]
+    lam = p[0]*p[1]
+    c_a, c_m, cap = p[2], p[3], p[4]
+    d, theta_m, gamma_m, mu_a, mu_m = p[5], p[6], p[7], p[8], p[9]
+
+    A, Ms, Me, Mi, Hs, He, Hi, Hr = x[0], x[1], x[2], x[3], x[4], x[5], x[6], x[7]
+
+    M = A + Ms + Me + Mi
+    H = Hs + He + Hi + Hr
+    H2 = H*H
+
+    J[:, :] = 0.0
+
+    growth = K*d*(1 - A/cap)
+    J[0, 0] = growth - K*d*M/cap - (gamma_m + mu_a + c_a)
+    J[0, 1] = growth
+    J[0, 2] = growth
+    J[0, 3] = growth
+
+    # derivadas de lam*Ms*Hi/H
+    dm_ms = lam*Hi/H
+    dm_hi = lam*Ms*(H - Hi)/H2
+    dm_h = -lam*Ms*Hi/H2
+
+    J[1, 0] = gamma_m
+    J[1, 1] = -dm_ms - (mu_m + c_m)
+    J[2, 1] = dm_ms
+    J[2, 2] = -(theta_m + mu_m + c_m)
+    J[3, 2] = theta_m
+    J[3, 3] = -(mu_m + c_m)
+
+    for k in (4, 5, 7):
+        J[1, k] = -dm_h
+        J[2, k] = dm_h
+    J[1, 6] = -dm_hi
+    J[2, 6] = dm_hi
+
+    # derivadas de lam*Hs*Mi/H
+    dh_mi = lam*Hs/H
+    dh_hs = lam*Mi*(H - Hs)/H2
+    dh_h = -lam*Hs*Mi/H2
+
+    J[4, 3] = -dh_mi
+    J[5, 3] = dh_mi
+    J[4, 4] = -dh_hs
+    J[5, 4] = dh_hs
+
+    for k in (5, 6, 7):
+        J[4, k] = MU_H - dh_h
+        J[5, k] = dh_h
+    J[5, 5] -= THETA_H + MU_H
+
+    J[6, 5] = THETA_H
+    J[6, 6] = -(ALPHA_H + MU_H)
+    J[7, 6] = ALPHA_H
+    J[7, 7] = -MU_H
+
+    return J
+
+
+def model_outputs(y, outputs, out = None, dtype = np.float64):
+    '''
+    Seleciona compartimentos ou quantidades derivadas da solução do modelo.
+
+    :params y: array. Solução com dimensão (8, n_tempos), como r.y do solve_ivp, ou
+               (8, n_membros, n_tempos) para um ensemble.
+    :params outputs: list. Nomes de COMPARTMENTS ou de DERIVED.
+    :params out: array or None. Array (len(outputs),) + y.shape[1:] onde o resultado será
+                 escrito.
+    :params dtype: tipo do array criado quando out é None.
+
+    :returns: array com dimensão (len(outputs),) + y.shape[1:].
+    '''
+    if out is None:
+        out = np.empty((len(outputs),) + y.shape[1:], dtype = dtype)
+
+    for i, name in enumerate(outputs):
+        if name in COMPARTMENTS:
+            out[i] = y[COMPARTMENTS.index(name)]
+        elif name == 'cases':
+            out[i] = y[6] + y[7]
+        elif name == 'incidence':
+            out[i] = np.diff(y[6] + y[7], prepend = y[6, ..., :1] + y[7, ..., :1])
+        elif name == 'mosquitoes':
+            out[i] = y[0:4].sum(axis = 0)
+        elif name == 'humans':
+            out[i] = y[4:8].sum(axis = 0)
+        else:
+            raise ValueError(f'Saída desconhecida: {name}. Opções: {COMPARTMENTS + DERIVED}.')
+
+    return out
+
+
+FORCING = ['step', 'segments', 'linear']
+BACKENDS = ['scipy', 'numba']
 
-    #Definindo condições de contorno para as variáveis(?):
-    M = A+Ms+Me+Mi  #População total de Mosquitos
-    H = Hs+He+Hi+Hr #População total de humanos
-    
-    #Definindo cada ODE:
-    dA_dt  = K*d(t,temp, fixed)*(1-(A/C(t, D, cap)))*M - (gamma_m(t,temp, fixed) + mu_a(t,temp, fixed) + C_A)*A
-    dMs_dt = gamma_m(t,temp, fixed)*A - (b*beta_m*Ms*Hi)/H - (mu_m(t,temp, fixed) + C_M)*Ms
-    dMe_dt = (b*beta_m*Ms*Hi)/H - (theta_m(t,temp, fixed ) + mu_m(t,temp, fixed) + C_M)*Me
-    dMi_dt = theta_m(t,temp, fixed)*Me - (mu_m(t,temp, fixed) + C_M)*Mi
-    dHs_dt = MU_H*(H-Hs) - (b*beta_h*Hs*Mi)/H
-    dHe_dt = (b*beta_h*Hs*Mi)/H - (THETA_H + MU_H)*He
-    dHi_dt = THETA_H*He - (ALPHA_H + MU_H)*Hi
-    dHr_dt = ALPHA_H*Hi - MU_H*Hr
 
-    return [dA_dt, dMs_dt, dMe_dt, dMi_dt, dHs_dt, dHe_dt, dHi_dt, dHr_dt]
+def _daily_series(param_fit, param_fixed, temp, cap, fixed):
+    # séries diárias das forçantes, na ordem b, beta, C_A, C_M, cap e parâmetros entomológicos
+    series = {}
 
+    for name, par in zip(['b', 'beta', 'c_a', 'c_m', 'cap'], tuple(param_fit) + tuple(param_fixed[4:6]) + (cap,)):
+        if not isinstance(par, numbers.Number):
+            series[name] = np.asarray(par, dtype = float)
 
-def solve_model(t, y0, param_fit, param_fixed, temp, cap, fixed):
+    if not fixed:
+        pars = temp if isinstance(temp, dict) else onto_params(temp)
+        series.update({name: np.asarray(pars[name], dtype = float) for name in ONTO_NAMES})
+
+    return series
+
+
+def forcing_breaks(t, param_fit, param_fixed, temp, cap, fixed):
+    '''
+    Retorna os dias, entre t[0] e t[-1], em que alguma forçante diária (temperatura, capacidade
+    suporte, b, beta, C_A ou C_M) muda de valor. Entre dois desses dias o lado direito do
+    sistema é suave.
+
+    :returns: array de inteiros.
+    '''
+    first, last = int(t[0]), int(np.ceil(t[-1]))
+    changed = np.zeros(last - first, dtype = bool)
+
+    for s in _daily_series(param_fit, param_fixed, temp, cap, fixed).values():
+        s = s[first:last + 1]
+        changed[:len(s) - 1] |= s[1:] != s[:-1]
+
+    return first + 1 + np.flatnonzero(changed)
+
+
+def _solve_segments(t_eval, y0, args, method, fun = None):
+    # integra entre os dias em que a forçante muda, levando o estado e o tamanho do passo de um
+    # trecho para o outro. Em cada trecho o lado direito é avaliado com o t do início do trecho,
+    # de forma que a forçante não muda dentro do trecho nem no seu extremo final.
+    import scipy.integrate
+    from scipy.optimize import OptimizeResult
+
+    fun = system_odes if fun is None else fun
+    solver = getattr(scipy.integrate, method) if isinstance(method, str) else method
+
+    t0, t1 = t_eval[0], t_eval[-1]
+    edges = np.concatenate([[t0], forcing_breaks(t_eval, *args), [t1]])
+
+    y = np.zeros((len(y0), len(t_eval)))
+    y[:, 0] = y0
+    state = np.asarray(y0, dtype = float)
+    h = None
+    nfev = 0
+
+    for a, b in zip(edges[:-1], edges[1:]):
+        if b <= a:
+            continue
+
+        s = solver(lambda tt, x, a = a: fun(a, x, *args), a, state, b,
+                   first_step = None if h is None else min(h, b - a))
+
+        while s.status == 'running':
+            s.step()
+
+            m = (t_eval > s.t_old) & (t_eval <= s.t)
+            if m.any():
+                y[:, m] = s.dense_output()(t_eval[m])
+
+        if s.status == 'failed':
+            return OptimizeResult(t = t_eval, y = y, nfev = nfev + s.nfev, njev = 0, nlu = 0,
+                                  status = -1, message = 'Integration step failed.', success = False)
+
+        nfev += s.nfev
+        state = s.y
+        h = s.step_size
+
+    return OptimizeResult(t = t_eval, y = y, nfev = nfev, njev = 0, nlu = 0, status = 0,
+                          message = 'The solver successfully reached the end of the integration interval.',
+                          success = True, t_events = None, y_events = None, segments = len(edges) - 1)
+
+
+def _linear_odes(t, x, param_fit, param_fixed, temp, cap, fixed, names, table):
+    # lado direito com as forçantes interpoladas linearmente entre os meios dos dias
+    u = min(max(t - 0.5, 0), table.shape[1] - 1)
+    i = min(int(u), table.shape[1] - 2)
+    v = dict(zip(names, table[:, i] + (u - i)*(table[:, i + 1] - table[:, i])))
+
+    param_fit = (v.get('b', param_fit[0]), v.get('beta', param_fit[1]))
+    param_fixed = param_fixed[:4] + (v.get('c_a', param_fixed[4]), v.get('c_m', param_fixed[5])) + param_fixed[6:]
+    cap = [v['cap']] if 'cap' in v else cap
+
+    if not fixed:
+        temp = {name: [v[name]] for name in ONTO_NAMES}
+
+    return system_odes(0, x, param_fit, param_fixed, temp, cap, fixed)
+
+
+@instrumentation.timed('solve')
+def solve_model(t, y0, param_fit, param_fixed, temp, cap, fixed, outputs = None, every = 1,
+                dtype = np.float64, out = None, events = None, forcing = None, backend = 'scipy'):
     '''
     Função que computa a solução numérica do sistema de equações. 
     
     :params t: array. Intervalo de tempo que deverá ser computado.
     :params y0: list or array. Deve conter os valores das condições iniciais do modelo. 
-    :params param_fit: tuple. parâmetros que serão fitados. 
-    :params param_fixed: tuple. parâmetros que serão fixados. 
+    :params param_fit: tuple. parâmetros que serão fitados (b, beta). Cada um pode ser um
+                       float ou um array com um valor por dia.
+    :params param_fixed: tuple. parâmetros que serão fixados. C_A e C_M podem ser arrays
+                         com um valor por dia.
     :params temp: array. Array com os valores de temperatura. O tamanho desse array deve ser 
                         condizente com o intervalo de tempo que o modelo será integrado. 
+                        Também pode ser o dict de séries diárias retornado por `onto_params`
+                        (por exemplo para cenários de clima, ver scenarios.py).
     :params cap: float or array. Parametro que irá determinar a cap suporte do modelo. 
     :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos. 
+    :params outputs: list or None. Se None, retorna o resultado completo do solve_ivp. Caso
+                     contrário, retorna apenas as saídas listadas (ver `model_outputs`).
+    :params every: int. Só são guardados os instantes t[::every].
+    :params dtype: tipo das saídas (por exemplo np.float32) quando outputs não é None.
+    :params out: array or None. Array pré-alocado (len(outputs), len(t[::every])) onde as
+                 saídas serão escritas.
+    :params events: list or None. Funções de evento repassadas ao solve_ivp (ver
+                    `events.outbreak_events`). Os instantes ficam em r.t_events quando
+                    outputs é None.
+    :params forcing: string or None. Como as forçantes diárias entram na integração (se
+                     None, 'step' no backend 'scipy' e 'segments' no 'numba'):
+                     * 'step': valor do dia int(t), com saltos nas viradas dos dias;
+                     * 'segments': integra separadamente cada trecho em que as forçantes
+                       não mudam (ver `forcing_breaks`), levando o estado e o passo adiante,
+                       de forma que nenhum passo cruza uma virada de dia. Resolve o mesmo
+                       problema que 'step', mas não é mais barato com o RK45: o passo é
+                       limitado pela rigidez do subsistema dos mosquitos e não pelas
+                       viradas, e cada trecho recomeça o solver. Na janela de 2010 de
+                       `benchmark.forcing_report` os passos rejeitados caem de 12% a 24%
+                       e o nfev fica entre 4% abaixo e 5% acima do de 'step'. É o modo
+                       usado pelo backend 'numba'. Não aceita events;
+                     * 'linear': forçantes interpoladas linearmente entre os meios dos dias,
+                       com o lado direito contínuo.
+    :params backend: string. 'scipy' (solve_ivp) ou 'numba' (integrador compilado de
+                     compiled.py). O backend 'numba' só tem a forçante de 'segments', não
+                     aceita events e exige o Numba instalado.
     '''
 
-    
-    r  = solve_ivp(system_odes, t_span = [ t[0], t[-1]], y0 = y0, t_eval = t, args=(param_fit, param_fixed, temp, cap, fixed)) 
+    from scipy.integrate import solve_ivp
+
+    t_eval = t[::every]
+
+    # com a instrumentação desligada, method é 'RK45' e counters é None
+    method, counters = instrumentation.solver('RK45')
+
+    args = (param_fit, param_fixed, temp, cap, fixed)
+
+    if backend == 'numba':
+        # importado aqui porque compiled.py importa este módulo
+        import compiled
+
+        if not compiled.HAS_NUMBA:
+            raise ImportError("backend = 'numba' exige o pacote numba.")
+        if events is not None:
+            raise ValueError("events não pode ser usado com backend = 'numba'.")
+
+        forcing = 'segments' if forcing is None else forcing
+        if forcing != 'segments':
+            raise ValueError(f"backend = 'numba' só aceita forcing = 'segments', não {forcing!r}.")
+
+        r = compiled.solve_compiled(t, y0, *args, every = every)
+
+    elif backend != 'scipy':
+        raise ValueError(f'backend deve ser um de {BACKENDS}.')
+
+    elif forcing is None or forcing == 'step':
+        forcing = 'step'
+
+        r  = solve_ivp(instrumentation.rhs(system_odes, counters), t_span = [ t[0], t[-1]], y0 = y0, t_eval = t_eval, events = events, method = method, args=args) 
+
+    elif forcing == 'segments':
+        if events is not None:
+            raise ValueError("events não pode ser usado com forcing = 'segments'.")
+
+        r = _solve_segments(t, y0, args, method, instrumentation.rhs(system_odes, counters))
+        r.t, r.y = r.t[::every], r.y[:, ::every]
+
+    elif forcing == 'linear':
+        series = _daily_series(*args)
+        n = min([len(s) for s in series.values()], default = 2)
+        table = np.array([s[:n] for s in series.values()]).reshape(len(series), n)
+
+        r = solve_ivp(instrumentation.rhs(_linear_odes, counters), t_span = [t[0], t[-1]], y0 = y0, t_eval = t_eval,
+                      events = events, method = method, args = args + (list(series), table))
+
+    else:
+        raise ValueError(f'forcing deve ser um de {FORCING}.')
+
+    if backend == 'scipy':
+        instrumentation.record_solve(r, counters, days = len(t), fixed = fixed, forcing = forcing)
+    else:
+        instrumentation.record_compiled(r, days = len(t), fixed = fixed, forcing = forcing)
 
-    return r 
+    if outputs is None:
+        return r 
+
+    return model_outputs(r.y, outputs, out = out, dtype = dtype)
+
+
+def solve_ensemble(t, y0s, param_fits, param_fixed, temp, cap, fixed, outputs = ('cases',),
+                   every = 1, dtype = np.float32, out = None):
+    '''
+    Resolve o modelo para vários membros de um ensemble, guardando apenas as saídas
+    selecionadas em um único array pré-alocado.
+
+    :params y0s: array. Condições iniciais de cada membro, com dimensão (n_membros, 8), ou
+                 uma única condição inicial usada por todos os membros.
+    :params param_fits: array. Parâmetros fitados de cada membro, com dimensão (n_membros, 2).
+    :params out: array or None. Array (n_membros, len(outputs), len(t[::every])). Se None,
+                 é alocado com o dtype informado.
+
+    Os demais parâmetros são os mesmos de `solve_model`.
+
+    :returns: array com dimensão (n_membros, len(outputs), len(t[::every])).
+    '''
+    param_fits = np.asarray(param_fits, dtype = float)
+    n = param_fits.shape[0]
+
+    y0s = np.broadcast_to(np.asarray(y0s, dtype = float), (n, len(COMPARTMENTS)))
+
+    if out is None:
+        out = np.empty((n, len(outputs), len(t[::every])), dtype = dtype)
+
+    for i in range(n):
+        solve_model(t, y0s[i], tuple(param_fits[i]), param_fixed, temp, cap, fixed,
+                    outputs = outputs, every = every, out = out[i])
+
+    return out
 
 
 def solve_fit(out, t, y0, temp, df_we = None, fixed = False): 
@@ -328,6 +813,8 @@ def solve_fit(out, t, y0, temp, df_we = None, fixed = False):
     :params y0: list or array. Deve conter os valores das condições iniciais do modelo. 
     :params temp: array. Array com os valores de temperatura. O tamanho desse array deve ser 
                         condizente com o intervalo de tempo que o modelo será integrado. 
+                        Também pode ser o dict de séries diárias retornado por `onto_params`
+                        (por exemplo para cenários de clima, ver scenarios.py).
     :params df_we: pd.Dataframe or None. No caso de um dataframe será computado as capacidade
                     suporte usando a fórmula do Yang. 
     :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos. 
@@ -348,6 +835,8 @@ def solve_fit(out, t, y0, temp, df_we = None, fixed = False):
     C_M = 0.0    #control effort rate on terretrial phase
     D = 4 
 
+    import pandas as pd
+
     if isinstance(df_we, pd.DataFrame):
 
         c_f = sup_cap_yang(df_we)
@@ -356,9 +845,9 @@ def solve_fit(out, t, y0, temp, df_we = None, fixed = False):
 
     par_fixed = MU_H, THETA_H, ALPHA_H, K, C_A, C_M, D
     
-    r_fit  = solve_model(t, y0, parametros_fitting, par_fixed, temp, c_f, fixed ) 
+    H_fit  = solve_model(t, y0, parametros_fitting, par_fixed, temp, c_f, fixed, outputs = ['cases']) 
 
-    return r_fit.y[6] + r_fit.y[7]
+    return H_fit[0]
 
 def plot_fit(t, data, fit):
     '''
@@ -367,6 +856,8 @@ def plot_fit(t, data, fit):
     :params data: array. dados.
     :params fit: array. A curva fitada. 
     '''
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots()
     #plot of fitted function
     ax.plot(t, fit, color='blue',label='Fitted Model')
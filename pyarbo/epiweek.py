@@ -0,0 +1,144 @@
+'''
+Neste .py script estão as funções para trabalhar com semanas epidemiológicas (SE), usadas
+pela vigilância do Brasil, do Paraguai e da Argentina.
+
+A SE começa no domingo e termina no sábado. A SE 1 é a semana (domingo a sábado) que contém
+o dia 4 de janeiro, isto é, que tem pelo menos 4 dias no novo ano. Por isso alguns anos têm
+53 semanas e os primeiros dias de janeiro podem pertencer à última SE do ano anterior.
+
+Todas as conversões são vetorizadas e operam sobre arrays de datetime64.
+'''
+import numpy as np
+import pandas as pd
+
+
+def week_start(dates):
+    '''
+    Retorna o domingo em que começa a SE de cada data.
+
+    :params dates: array. Datas (datetime64).
+
+    :returns: array de datetime64[D].
+    '''
+    days = np.asarray(dates, dtype='datetime64[D]')
+
+    # 1970-01-01 foi uma quinta-feira, então o domingo anterior é o dia -4
+    n = days.astype(np.int64)
+
+    return days - (n + 4) % 7
+
+
+def year_start(year):
+    '''
+    Retorna o domingo em que começa a SE 1 de cada ano.
+
+    :params year: int or array.
+
+    :returns: array de datetime64[D].
+    '''
+    year = np.asarray(year, dtype=np.int64)
+
+    jan4 = (year - 1970).astype('datetime64[Y]').astype('datetime64[D]') + 3
+
+    # a SE 1 é a semana que contém o dia 4 de janeiro
+    return week_start(jan4)
+
+
+def to_epiweek(dates):
+    '''
+    Converte datas para (ano epidemiológico, SE).
+
+    :params dates: array. Datas (datetime64, strings no formato %Y-%m-%d ou pd.DatetimeIndex).
+
+    :returns: tuple. Arrays de int com o ano e a semana epidemiológica.
+    '''
+    days = np.asarray(dates, dtype='datetime64[D]')
+
+    start = week_start(days)
+
+    # a quarta-feira define a SE: a semana pertence ao ano que contém 4 dias ou mais dela,
+    # e a quarta-feira da SE n cai entre os dias 7(n-1)+1 e 7n desse ano
+    wed = start + 3
+    first_day = wed.astype('datetime64[Y]')
+
+    year = first_day.astype(np.int64) + 1970
+    week = (wed - first_day.astype('datetime64[D]')).astype(np.int64)//7 + 1
+
+    return year, week
+
+
+def from_epiweek(year, week):
+    '''
+    Retorna o domingo em que começa a SE `week` do ano `year`.
+
+    :params year: int or array.
+    :params week: int or array.
+
+    :returns: array de datetime64[D].
+    '''
+    week = np.asarray(week, dtype=np.int64)
+
+    return year_start(year) + 7*(week - 1)
+
+
+def weeks_in_year(year):
+    '''
+    Retorna o número de semanas epidemiológicas (52 ou 53) de cada ano.
+    '''
+    year = np.asarray(year, dtype=np.int64)
+
+    return (year_start(year + 1) - year_start(year)).astype(np.int64)//7
+
+
+def epiweek_code(dates):
+    '''
+    Retorna a SE no formato inteiro AAAASS (por exemplo 201053), usado nos boletins.
+    '''
+    year, week = to_epiweek(dates)
+
+    return 100*year + week
+
+
+def aggregate_epiweek(values, dates, how='sum'):
+    '''
+    Agrega uma série ou painel diário por semana epidemiológica em uma única passada com
+    `np.add.reduceat`. As datas devem estar ordenadas; semanas incompletas no início e no fim
+    são mantidas e o número de dias de cada semana é retornado.
+
+    :params values: array. Array com dimensão (n_dias,) ou (n_dias, n_colunas).
+    :params dates: array. Datas correspondentes às linhas de `values`.
+    :params how: string. 'sum' ou 'mean'.
+
+    :returns: tuple. (início de cada SE, valores agregados, número de dias em cada SE).
+    '''
+    values = np.asarray(values, dtype=float)
+    start = week_start(dates)
+
+    first = np.flatnonzero(np.r_[True, start[1:] != start[:-1]])
+    n_days = np.diff(np.r_[first, len(start)])
+
+    out = np.add.reduceat(values, first, axis=0)
+
+    if how == 'mean':
+        out = out/(n_days if out.ndim == 1 else n_days[:, None])
+
+    return start[first], out, n_days
+
+
+def aggregate_frame(df, how='sum'):
+    '''
+    Agrega um pd.DataFrame diário (indexado pela data) por semana epidemiológica.
+
+    :params df: pd.DataFrame.
+    :params how: string. 'sum' ou 'mean'.
+
+    :returns: pd.DataFrame indexado pelo início da SE, com as colunas `epi_year` e `epi_week`.
+    '''
+    df = df.sort_index()
+
+    start, out, n_days = aggregate_epiweek(df.to_numpy(dtype=float), df.index.values, how=how)
+    year, week = to_epiweek(start)
+
+    res = pd.DataFrame(out, index=pd.DatetimeIndex(start, name='date'), columns=df.columns)
+
+    return res.assign(epi_year=year, epi_week=week, n_days=n_days)
@@ -0,0 +1,145 @@
+'''
+Neste .py script estão as funções de evento usadas para obter os resumos de um surto
+durante a integração do modelo, sem guardar as trajetórias:
+
+    * pico da incidência (THETA_H*He, entrada de novos infectados em Hi): instantes em que
+      dHe/dt cruza zero de positivo para negativo;
+    * dia em que os casos acumulados (Hi + Hr) cruzam cada limiar de alerta;
+    * dia em que o total de mosquitos (A + Ms + Me + Mi) ultrapassa cada nível.
+
+Os instantes são encontrados pelo solve_ivp com busca de raízes entre os passos do
+integrador, e apenas o estado final é guardado.
+'''
+import numpy as np
+import pandas as pd
+from scipy.integrate import solve_ivp
+from edo_model_yang import system_odes, daily_value
+
+
+def _peak_event(param_fixed):
+
+    MU_H, THETA_H = param_fixed[0], param_fixed[1]
+
+    def peak(t, x, param_fit, *args):
+        b, beta = param_fit
+        b, beta = daily_value(t, b), daily_value(t, beta)
+        H = x[4] + x[5] + x[6] + x[7]
+        return b*beta*x[4]*x[3]/H - (THETA_H + MU_H)*x[5]
+
+    peak.direction = -1
+
+    return peak
+
+
+def _crossing_event(level, rows):
+
+    def crossing(t, x, *args):
+        return np.take(x, rows).sum() - level
+
+    crossing.direction = 1
+
+    return crossing
+
+
+def outbreak_events(param_fixed, thresholds = (), mosquito_levels = ()):
+    '''
+    Cria as funções de evento para o solve_ivp (ou para o argumento events de `solve_model`).
+
+    :params param_fixed: tuple. Parâmetros fixos do modelo.
+    :params thresholds: list. Limiares de casos acumulados (Hi + Hr).
+    :params mosquito_levels: list. Níveis do total de mosquitos.
+
+    :returns: tuple. (lista de funções de evento, lista com o nome de cada evento)
+    '''
+    events = [_peak_event(param_fixed)]
+    names = ['peak']
+
+    for level in thresholds:
+        events.append(_crossing_event(level, [6, 7]))
+        names.append(f'cases_{level:g}')
+
+    for level in mosquito_levels:
+        events.append(_crossing_event(level, [0, 1, 2, 3]))
+        names.append(f'mosquitoes_{level:g}')
+
+    return events, names
+
+
+def summarize(r, names, param_fixed, y0, t0, events = None):
+    '''
+    Resume o resultado de uma integração feita com os eventos de `outbreak_events`.
+
+    :params r: OdeResult. Saída do solve_ivp com t_events e y_events.
+    :params names: list. Nomes dos eventos.
+    :params param_fixed: tuple. Parâmetros fixos do modelo.
+    :params y0: list. Condições iniciais.
+    :params t0: float. Instante inicial da integração.
+    :params events: list or None. Funções de evento de `outbreak_events`. Se dadas, os
+                    limiares que já estão ultrapassados em y0 (e portanto não têm
+                    cruzamento) recebem t0.
+
+    :returns: dict com `peak_day`, `peak_incidence`, `final_cases`, o primeiro dia de cada
+              cruzamento (t0 se o limiar já estava ultrapassado, NaN se não ocorreu) e
+              `status` do integrador.
+    '''
+    THETA_H = param_fixed[1]
+
+    # o pico pode estar em um dos extremos do intervalo
+    times = np.concatenate([[t0], r.t_events[0], r.t[-1:]])
+    states = [np.asarray(y0)] + list(r.y_events[0]) + [r.y[:, -1]]
+    incidence = np.array([THETA_H*y[5] for y in states])
+
+    i = np.nanargmax(incidence)
+
+    res = {'peak_day': times[i], 'peak_incidence': incidence[i],
+           'final_cases': r.y[6, -1] + r.y[7, -1]}
+
+    for j, (name, t_ev) in enumerate(zip(names[1:], r.t_events[1:]), start = 1):
+
+        if events is not None and events[j](t0, np.asarray(y0)) >= 0:
+            res[name] = t0
+        else:
+            res[name] = t_ev[0] if len(t_ev) else np.nan
+
+    res['status'] = r.status
+
+    return res
+
+
+def solve_summary(t, y0, param_fit, param_fixed, temp, cap, fixed, thresholds = (),
+                  mosquito_levels = (), **kwargs):
+    '''
+    Integra o modelo no intervalo de t guardando apenas o estado final e os eventos.
+
+    Os parâmetros são os mesmos de `solve_model`, mais os de `outbreak_events`.
+    kwargs é repassado ao solve_ivp.
+
+    :returns: dict (ver `summarize`).
+    '''
+    events, names = outbreak_events(param_fixed, thresholds, mosquito_levels)
+
+    r = solve_ivp(system_odes, t_span = [t[0], t[-1]], y0 = y0, t_eval = [t[-1]],
+                  events = events, args = (param_fit, param_fixed, temp, cap, fixed), **kwargs)
+
+    return summarize(r, names, param_fixed, y0, t[0], events)
+
+
+def solve_ensemble_summary(t, y0s, param_fits, param_fixed, temp, cap, fixed, thresholds = (),
+                           mosquito_levels = (), **kwargs):
+    '''
+    Versão de `solve_ensemble` que guarda apenas os resumos de cada membro.
+
+    :params y0s: array. Condições iniciais (n_membros, 8) ou uma única condição inicial.
+    :params param_fits: array. Parâmetros fitados de cada membro (n_membros, 2).
+
+    :returns: pd.DataFrame com uma linha por membro.
+    '''
+    param_fits = np.asarray(param_fits, dtype = float)
+    n = param_fits.shape[0]
+
+    y0s = np.broadcast_to(np.asarray(y0s, dtype = float), (n, 8))
+
+    rows = [solve_summary(t, y0s[i], tuple(param_fits[i]), param_fixed, temp, cap, fixed,
+                          thresholds, mosquito_levels, **kwargs) for i in range(n)]
+
+    return pd.DataFrame(rows)
@@ -0,0 +1,262 @@
+'''
+Neste .py script está o modo rápido de integração do modelo do Yang, para varreduras
+(screening) e geração de dados de treino de surrogates, onde a precisão do RK45 adaptativo
+não é necessária.
+
+O modelo é integrado com passo fixo de 1/substeps dia, de forma que as viradas dos dias
+(onde as forçantes diárias mudam) coincidem com o fim dos passos. Todos os membros de um
+ensemble são integrados juntos: o estado é um array (8, n_membros) e as taxas são
+calculadas para todos os membros em cada passo, escrevendo em arrays pré-alocados.
+
+Três esquemas estão disponíveis:
+    * 'expeuler': Euler exponencial. Cada equação é escrita como dX/dt = P - L*X (produção e
+      taxa de perda não negativas) e o passo é X <- X*exp(-L*h) + P*(1 - exp(-L*h))/L. É
+      estável e mantém os compartimentos positivos mesmo quando a capacidade suporte do Yang
+      deixa o sistema rígido, mas tem precisão de primeira ordem;
+    * 'expmid': o mesmo passo exponencial com P e L avaliados no meio do passo (segunda
+      ordem, duas avaliações das taxas por passo). É o padrão;
+    * 'rk4': Runge-Kutta clássico de quarta ordem. Só é estável quando o sistema não é rígido;
+      com `initial_conditions` (fase aquática muito acima da capacidade suporte) ele diverge
+      e retorna nan.
+
+Na janela de 2010 do notebook fitting_models.ipynb (8 pares de (b, beta)), 'expmid' com 2
+passos por dia fica a ~0.2% dos casos acumulados do `solve_model` e é ~100 vezes mais rápido
+por membro; 'expeuler' com 4 passos por dia fica a ~3%. Use `accuracy_report` para comparar
+com `solve_model` antes de usar o modo rápido em um novo tipo de cenário e prefira o
+`solve_model` para ajustes finais.
+'''
+import time
+import numbers
+import numpy as np
+from edo_model_yang import onto_params, model_outputs, solve_model, COMPARTMENTS, ONTO_NAMES, ONTO_FIXED
+
+SCHEMES = ['expeuler', 'expmid', 'rk4']
+
+
+def _day_value(par, day):
+    # valor do dia para um parâmetro constante, diário (n_dias,) ou por membro (n_membros, n_dias)
+    if isinstance(par, numbers.Number) or np.ndim(par) == 0:
+        return par
+
+    return np.asarray(par)[..., day]
+
+
+def _rates(X, lam, pars, cap, param_fixed, P, L):
+    # escreve em P e L a produção e a taxa de perda de cada compartimento, dX/dt = P - L*X.
+    # Os totais e produtos por membro são guardados nas linhas de P e L ainda não escritas
+    # (H em L[7] e Hi/H em L[6]), sem alocar arrays a cada avaliação.
+    MU_H, THETA_H, ALPHA_H, K, C_A, C_M, D = param_fixed
+    d, theta_m, gamma_m, mu_a, mu_m = pars
+
+    A, Ms, Me, Mi, Hs, He, Hi, Hr = X
+
+    mu = mu_m + C_M
+
+    np.add(A, Ms, out = P[0])
+    P[0] += Me
+    P[0] += Mi
+    np.multiply(K*d, P[0], out = P[0])
+    np.divide(P[0], cap, out = L[0])
+    L[0] += gamma_m + mu_a + C_A
+
+    np.add(Hs, He, out = L[7])
+    L[7] += Hi
+    L[7] += Hr
+    np.divide(Hi, L[7], out = L[6])
+
+    np.multiply(gamma_m, A, out = P[1])
+    np.multiply(L[6], lam, out = L[1])
+    L[1] += mu
+
+    np.multiply(Ms, lam, out = P[2])
+    P[2] *= L[6]
+    L[2] = theta_m + mu
+
+    np.multiply(theta_m, Me, out = P[3])
+    L[3] = mu
+
+    np.subtract(L[7], Hs, out = P[4])
+    P[4] *= MU_H
+    np.multiply(Mi, lam, out = L[4])
+    L[4] /= L[7]
+
+    np.multiply(L[4], Hs, out = P[5])
+    L[5] = THETA_H + MU_H
+
+    np.multiply(THETA_H, He, out = P[6])
+    L[6] = ALPHA_H + MU_H
+
+    np.multiply(ALPHA_H, Hi, out = P[7])
+    L[7] = MU_H
+
+
+def _exp_step(X0, P, L, h, E, out):
+    # out <- X0*exp(-L*h) + P*(1 - exp(-L*h))/L, com (1 - exp(-L*h))/L = h quando L = 0
+    np.multiply(L, -h, out = E)
+    np.expm1(E, out = E)
+    np.negative(E, out = E)
+    np.multiply(X0, E, out = out)
+    np.subtract(X0, out, out = out)
+    np.divide(E, L, out = E, where = L > 0)
+    E[L <= 0] = h
+    E *= P
+    out += E
+
+
+def solve_fast(t, y0s, param_fits, param_fixed, temp, cap, fixed, outputs = ('cases',), every = 1,
+               substeps = 2, scheme = 'expmid', dtype = np.float64, out = None):
+    '''
+    Integra o modelo com passo fixo para todos os membros de um ensemble de uma só vez.
+
+    :params t: array. Dias inteiros consecutivos, [t0, t0 + 1, ..., t0 + n - 1]. As forçantes
+               diárias são indexadas pelo dia, como em `system_odes`.
+    :params y0s: array. Condições iniciais (n_membros, 8) ou uma única condição inicial.
+    :params param_fits: array. (b, beta) de cada membro, com dimensão (n_membros, 2).
+    :params param_fixed: tuple. Parâmetros fixos. C_A e C_M podem ser séries diárias.
+    :params temp: array or dict. Temperaturas diárias (n_dias,) ou (n_membros, n_dias), ou o
+                  dict de `onto_params`. Não é usado se fixed for True.
+    :params cap: float or array. Capacidade suporte em unidades de 10**D, constante, diária
+                 (n_dias,) ou por membro (n_membros, n_dias).
+    :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos.
+    :params outputs: list. Saídas guardadas (ver `model_outputs`).
+    :params every: int. Só são guardados os dias t[::every].
+    :params substeps: int. Número de passos por dia.
+    :params scheme: string. Um de SCHEMES.
+    :params out: array or None. Array (n_membros, len(outputs), len(t[::every])).
+
+    :returns: array com dimensão (n_membros, len(outputs), len(t[::every])), como em
+              `solve_ensemble`.
+    '''
+    if scheme not in SCHEMES:
+        raise ValueError(f'scheme deve ser um de {SCHEMES}.')
+
+    param_fits = np.atleast_2d(np.asarray(param_fits, dtype = float))
+    m = param_fits.shape[0]
+    lam = param_fits[:, 0]*param_fits[:, 1]
+
+    MU_H, THETA_H, ALPHA_H, K, C_A, C_M, D = param_fixed
+
+    if fixed:
+        pars = {name: value for name, value in zip(ONTO_NAMES, ONTO_FIXED)}
+    else:
+        pars = temp if isinstance(temp, dict) else onto_params(temp)
+
+    cap = (10**D)*(np.asarray(cap, dtype = float) if not isinstance(cap, numbers.Number) else cap)
+
+    days = np.asarray(t, dtype = int)
+    saved = days[::every]
+
+    # buffers pré-alocados
+    X = np.empty((len(COMPARTMENTS), m))
+    X[:] = np.broadcast_to(np.asarray(y0s, dtype = float), (m, len(COMPARTMENTS))).T
+    Y = np.empty((len(COMPARTMENTS), m, len(saved)))
+    P = np.empty_like(X)
+    L = np.empty_like(X)
+    E = np.empty_like(X)
+
+    Xs = np.empty_like(X)
+
+    if scheme == 'rk4':
+        k = np.empty((4,) + X.shape)
+
+    h = 1.0/substeps
+    j = 0
+
+    # um esquema instável (rk4 com o sistema rígido) diverge e produz nan em vez de avisos
+    with np.errstate(over = 'ignore', invalid = 'ignore'):
+        for day in days:
+            if j < len(saved) and saved[j] == day:
+                Y[:, :, j] = X
+                j += 1
+
+            if day == days[-1]:
+                break
+
+            day_pars = [_day_value(pars[name], day) for name in ONTO_NAMES]
+            fixed_day = (MU_H, THETA_H, ALPHA_H, K, _day_value(C_A, day), _day_value(C_M, day), D)
+            cap_day = _day_value(cap, day)
+
+            for _ in range(substeps):
+                if scheme == 'expeuler':
+                    _rates(X, lam, day_pars, cap_day, fixed_day, P, L)
+                    _exp_step(X, P, L, h, E, Xs)
+                    X, Xs = Xs, X
+                elif scheme == 'expmid':
+                    # taxas avaliadas no meio do passo (previsor de meio passo)
+                    _rates(X, lam, day_pars, cap_day, fixed_day, P, L)
+                    _exp_step(X, P, L, h/2, E, Xs)
+                    _rates(Xs, lam, day_pars, cap_day, fixed_day, P, L)
+                    _exp_step(X, P, L, h, E, Xs)
+                    X, Xs = Xs, X
+                else:
+                    for s, c in enumerate([0.0, 0.5, 0.5, 1.0]):
+                        if s == 0:
+                            Xs[:] = X
+                        else:
+                            np.multiply(k[s - 1], c*h, out = Xs)
+                            Xs += X
+
+                        _rates(Xs, lam, day_pars, cap_day, fixed_day, P, L)
+                        np.multiply(L, Xs, out = k[s])
+                        np.subtract(P, k[s], out = k[s])
+
+                    # X <- X + h*(k1 + 2*k2 + 2*k3 + k4)/6
+                    k[1] += k[2]
+                    k[1] *= 2
+                    k[1] += k[0]
+                    k[1] += k[3]
+                    k[1] *= h/6
+                    X += k[1]
+
+    if out is None:
+        out = np.empty((m, len(outputs), len(saved)), dtype = dtype)
+
+    out[:] = np.moveaxis(model_outputs(Y, list(outputs)), 0, 1)
+
+    return out
+
+
+def accuracy_report(t, y0, param_fits, param_fixed, temp, cap, fixed, substeps = (1, 2, 4, 8),
+                    schemes = SCHEMES):
+    '''
+    Compara o modo rápido com `solve_model` (RK45 adaptativo) nos casos acumulados.
+
+    :params param_fits: array. (b, beta) de cada membro, com dimensão (n_membros, 2).
+    :params substeps: list. Números de passos por dia testados.
+    :params schemes: list. Esquemas testados.
+
+    Os demais parâmetros são os mesmos de `solve_fast`.
+
+    :returns: pd.DataFrame com `scheme`, `substeps`, `seconds`, `speedup` (tempo do
+              solve_model dividido pelo tempo do modo rápido), `max_rel_error` (maior erro
+              relativo dos casos acumulados ao longo do tempo, em relação ao maior valor da
+              trajetória) e `final_rel_error` (erro relativo dos casos no último dia), como
+              médias entre os membros.
+    '''
+    import pandas as pd
+
+    param_fits = np.atleast_2d(np.asarray(param_fits, dtype = float))
+
+    t0 = time.perf_counter()
+    ref = np.array([solve_model(t, y0, tuple(p), param_fixed, temp, cap, fixed, outputs = ['cases'])[0]
+                    for p in param_fits])
+    ref_seconds = time.perf_counter() - t0
+
+    scale = np.maximum(np.abs(ref).max(axis = 1), 1.0)
+
+    rows = []
+    for scheme in schemes:
+        for n in substeps:
+            t0 = time.perf_counter()
+            cases = solve_fast(t, y0, param_fits, param_fixed, temp, cap, fixed, substeps = n,
+                               scheme = scheme)[:, 0]
+            seconds = time.perf_counter() - t0
+
+            err = np.abs(cases - ref)
+
+            rows.append({'scheme': scheme, 'substeps': n, 'seconds': seconds,
+                         'speedup': ref_seconds/seconds,
+                         'max_rel_error': float(np.mean(err.max(axis = 1)/scale)),
+                         'final_rel_error': float(np.mean(err[:, -1]/np.maximum(np.abs(ref[:, -1]), 1.0)))})
+
+    return pd.DataFrame(rows)
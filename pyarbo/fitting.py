@@ -0,0 +1,118 @@
+'''
+Neste .py script estão as funções usadas para o fitting do modelo do Yang aos casos
+notificados acumulados, seguindo o que é feito no notebook `fitting_models.ipynb`.
+'''
+import instrumentation
+from edo_model_yang import A0, solve_model
+
+# o lmfit e initial_state.py (pandas e scipy) só são importados no primeiro uso, de forma que
+# os módulos que usam apenas PARAM_FIXED e N_FOZ iniciem rápido
+
+# parâmetros fixos usados no fitting (os mesmos de `solve_fit`)
+MU_H = 1/(365*67)    #human mortality rate - day^-1
+ALPHA_H = 0.1 #recovering rate - day^-1
+THETA_H = 0.027   #intrinsic incubation rate - day^-1
+K = 0.5          #fraction of female mosquitoes hatched from all egs
+C_A = 0.0      #control effort rate on aquatic phase
+C_M = 0.0    #control effort rate on terretrial phase
+D = 4
+
+PARAM_FIXED = MU_H, THETA_H, ALPHA_H, K, C_A, C_M, D
+
+# população de Foz (censo 2010)
+N_FOZ = 256088
+
+
+def initial_conditions(N = N_FOZ, Hi0 = 2, Mi0 = 0, ratio = 2, start_date = None, df_we = None,
+                       **kwargs):
+    '''
+    Retorna as condições iniciais do modelo usando o ponto de equilíbrio livre de doença
+    com os parâmetros entomológicos para T = 28 °C, como no notebook de fitting.
+    Se start_date e df_we forem fornecidos, os mosquitos são aquecidos até a data de início
+    usando o clima observado (ver `initial_state.initial_state`).
+
+    :params N: int. População humana.
+    :params Hi0: float. Número inicial de humanos infectados.
+    :params Mi0: float. Número inicial de mosquitos infectados.
+    :params ratio: float. Número de mosquitos por habitante.
+    :params start_date: string or None. Data de início da simulação.
+    :params df_we: pd.DataFrame or None. Dados de clima.
+    :params kwargs: demais parâmetros de `initial_state.mosquito_state`.
+
+    :returns: list. [A, Ms, Me, Mi, Hs, He, Hi, Hr]
+    '''
+    if start_date is not None:
+        from initial_state import initial_state
+
+        return initial_state(start_date, df_we, N, Hi0 = Hi0, Mi0 = Mi0, **kwargs)
+
+    Ms_0 = ratio*N
+
+    # para T = 28
+    A_0 = A0(Ms_0, gamma_m = 0.12, mu_m = 0.03039, c_m = 0.0)
+
+    return [A_0, Ms_0 - Mi0, 0, Mi0, N - Hi0, 0, Hi0, 0]
+
+
+def default_params(c = True):
+    '''
+    Retorna os parâmetros do lmfit com os intervalos usados no notebook de fitting.
+
+    :params c: boolean. Se True, a capacidade suporte constante `c` também é fitada.
+    '''
+    import lmfit as lm
+
+    params = lm.Parameters()
+
+    params.add('b', value = 0.5, min = 0.001, max = 1, vary = True)
+    params.add('beta', value = 0.5, min = 0.001, max = 1, vary = True)
+
+    if c:
+        params.add('c', value = 5, min = 0.5, max = 50, vary = True)
+
+    return params
+
+
+@instrumentation.timed('objective')
+def residual(params, t, data, y0, temp = None, cap = None, fixed = True, backend = 'scipy'):
+    '''
+    Função objetivo: diferença entre Hi + Hr do modelo e os casos acumulados.
+
+    :params params: lm.Parameters. Deve conter `b`, `beta` e, se cap for None, `c`.
+    :params t: array. Intervalo de tempo, [0, 1, 2, ..., n].
+    :params data: array. Casos acumulados.
+    :params y0: list. Condições iniciais.
+    :params temp: array or None. Temperaturas usadas se fixed for False.
+    :params cap: float, array or None. Capacidade suporte. Se None, é usado o parâmetro `c`.
+    :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos.
+    :params backend: string. Backend de `solve_model` ('scipy' ou 'numba').
+    '''
+    pars = params.valuesdict()
+
+    if cap is None:
+        cap = pars['c']
+
+    model = solve_model(t, y0, (pars['b'], pars['beta']), PARAM_FIXED, temp, cap, fixed,
+                        outputs = ['cases'], backend = backend)
+
+    return model[0] - data
+
+
+def fit_model(t, data, y0, temp = None, cap = None, fixed = True, params = None, method = 'leastsq',
+              backend = 'scipy'):
+    '''
+    Fita `b`, `beta` (e `c`, se cap for None) aos casos acumulados.
+
+    :params params: lm.Parameters or None. Valores iniciais. Se None, usa `default_params`.
+    :params method: string. Método do lm.minimize.
+
+    Os demais parâmetros são os mesmos da função `residual`.
+
+    :returns: lmfit.MinimizerResult.
+    '''
+    import lmfit as lm
+
+    if params is None:
+        params = default_params(c = cap is None)
+
+    return lm.minimize(residual, params, args = (t, data, y0, temp, cap, fixed, backend), method = method)
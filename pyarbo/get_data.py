@@ -1,17 +1,28 @@
+import os
 import pandas as pd 
 from datetime import timedelta
-import matplotlib.pyplot as plt 
+import instrumentation
 
-def get_dengue_data(mean = True):
+# diretório com os arquivos csv do projeto e diretório usado para salvar os caches
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+CACHE_DIR = os.environ.get('PYARBO_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'pyarbo'))
+
+DENGUE_URL = 'https://raw.githubusercontent.com/AlertaDengue/arbo-fronteiras/main/data/dengue_cases-2010_2022.csv'
+WEATHER_URL = 'https://raw.githubusercontent.com/AlertaDengue/arbo-fronteiras/main/data/weather-2010_2022.csv'
+
+@instrumentation.timed('load')
+def get_dengue_data(mean = True, path = DENGUE_URL):
 
     '''
     Essa função faz o download dos dados de dengue previamente limpos pelo Alex. 
     São retornadas as séries temporais de casos notificados, prováveis e confirmados
     em laboratório. 
     :params mean: boolean. If True, é aplicada uma média móvel de 7 dias nos dados.
+    :params path: string. Caminho ou url do arquivo csv. Para usar o arquivo local, 
+                  passe os.path.join(DATA_DIR, 'dengue_cases-2010_2022.csv').
     '''
 
-    data = pd.read_csv('https://raw.githubusercontent.com/AlertaDengue/arbo-fronteiras/main/data/dengue_cases-2010_2022.csv', index_col = 'date')
+    data = pd.read_csv(path, index_col = 'date')
 
     data.index = pd.to_datetime(data.index)
 
@@ -51,6 +62,7 @@ def parse_date(date):
     return new_date
 
 
+@instrumentation.timed('clean')
 def fill_nan_weather(df):
     '''
     Essa função foi criada para corrigir os dados de temperatura. Na ausência de valores nulos ele vai verificar se a temperatura mínima e máxima é dif de zero
@@ -71,7 +83,7 @@ def fill_nan_weather(df):
     else: 
         for col in df.columns: 
             for i in df.loc[df[col].isna() == True].index: 
-                df.loc[i][col] = df.loc[i - timedelta(7): i - timedelta(1)][col].mean()
+                df.loc[i, col] = df.loc[i - timedelta(7): i - timedelta(1)][col].mean()
         
         if df.isnull().sum().sum() == 0:
             for i in df.loc[ (df['temp_min-celsius'] == 0) & (df['temp_max-celsius'] == 0)  ].index:
@@ -80,12 +92,16 @@ def fill_nan_weather(df):
 
     return df
 
-def get_weather_data():
+@instrumentation.timed('load')
+def get_weather_data(path = WEATHER_URL):
     ''''
     Essa função carrega os dados climáticos salvos pelo Alex no github.
+
+    :params path: string. Caminho ou url do arquivo csv. Para usar o arquivo local, 
+                  passe os.path.join(DATA_DIR, 'weather-2010_2022.csv').
     '''
 
-    we_data = pd.read_csv('https://raw.githubusercontent.com/AlertaDengue/arbo-fronteiras/main/data/weather-2010_2022.csv')
+    we_data = pd.read_csv(path)
     
     we_data['date'] = we_data['date'].apply(lambda x: parse_date(x))
 
@@ -93,6 +109,9 @@ def get_weather_data():
 
     we_data.index = pd.to_datetime(we_data.index)
 
+    # o arquivo não está totalmente ordenado e a correção abaixo usa os 7 dias anteriores
+    we_data.sort_index(inplace = True)
+
     for col in ['daily_precipitation-mm', 'temp_max-celsius',         
                 'temp_min-celsius', 'temp_mean-celsius',        
                 'mean_relative_humidity-%', 'mean_wind_speed-m_per_s']:
@@ -111,6 +130,9 @@ def plot_data(df):
                             * `notified`
                             * `acum_notified`
     '''
+    # o matplotlib só é importado quando algum gráfico é feito
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(1,2, figsize = (12,5))
 
     ax[0].plot(df.notified)
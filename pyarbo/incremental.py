@@ -0,0 +1,248 @@
+'''
+Neste .py script está implementado um armazenamento incremental para os dados diários de
+dengue e clima. A série completa é processada apenas uma vez (`init_dengue_store` e
+`init_weather_store`); depois disso cada novo dia é acrescentado ao final dos arquivos e as
+colunas derivadas são atualizadas usando apenas a janela dos últimos dias, que fica salva
+em um arquivo json junto com os totais acumulados.
+
+Estrutura do diretório do armazenamento:
+    * dengue.csv / dengue_state.json
+    * weather.csv / weather_state.json
+
+O estado guarda o tamanho do csv correspondente a ele, e é salvo só depois que as novas
+linhas foram escritas. Se um append for interrompido antes disso, as linhas escritas a mais
+são ignoradas na leitura e descartadas no próximo append, de forma que um append é aplicado
+por inteiro ou não é aplicado.
+'''
+import io
+import os
+import json
+import numpy as np
+import pandas as pd
+
+WINDOW = 7
+
+DENGUE_COLS = ['notified', 'probable', 'lab_confirmed']
+
+WEATHER_COLS = ['daily_precipitation-mm', 'temp_max-celsius',
+                'temp_min-celsius', 'temp_mean-celsius',
+                'mean_relative_humidity-%', 'mean_wind_speed-m_per_s']
+
+
+def _files(path, kind):
+
+    return os.path.join(path, f'{kind}.csv'), os.path.join(path, f'{kind}_state.json')
+
+
+def _save_state(path, kind, state):
+
+    _, state_file = _files(path, kind)
+
+    tmp = state_file + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+
+    os.replace(tmp, state_file)
+
+
+def _append_rows(path, kind, state, rows):
+    # escreve as linhas e só então salva o estado com o novo tamanho do arquivo
+    data_file, _ = _files(path, kind)
+
+    with open(data_file, 'a') as f:
+        for row in rows:
+            f.write(','.join(str(v) for v in row) + '\n')
+
+        f.flush()
+        os.fsync(f.fileno())
+
+    state['size'] = os.path.getsize(data_file)
+    _save_state(path, kind, state)
+
+
+def _recover(path, kind, state):
+    # descarta as linhas de um append interrompido antes de o estado ser salvo
+    data_file, _ = _files(path, kind)
+    size = state.get('size')
+
+    if size is not None and os.path.getsize(data_file) > size:
+        with open(data_file, 'r+b') as f:
+            f.truncate(size)
+
+
+def load_state(path, kind):
+    '''
+    Carrega o estado salvo do armazenamento.
+
+    :params path: string. Diretório do armazenamento.
+    :params kind: string. 'dengue' ou 'weather'.
+
+    :returns: dict.
+    '''
+    _, state_file = _files(path, kind)
+
+    with open(state_file) as f:
+        return json.load(f)
+
+
+def load_store(path, kind):
+    '''
+    Lê a série completa salva no armazenamento.
+
+    :params path: string. Diretório do armazenamento.
+    :params kind: string. 'dengue' ou 'weather'.
+
+    :returns: pd.DataFrame indexado pela data.
+    '''
+    data_file, _ = _files(path, kind)
+    size = load_state(path, kind).get('size')
+
+    # apenas as linhas confirmadas pelo estado
+    with open(data_file, 'rb') as f:
+        content = f.read() if size is None else f.read(size)
+
+    return pd.read_csv(io.BytesIO(content), index_col='date', parse_dates=True)
+
+
+def _next_dates(state, date):
+
+    last = np.datetime64(state['last_date'], 'D')
+    date = np.datetime64(date, 'D')
+
+    if date <= last:
+        raise ValueError(f'A data {date} já está no armazenamento (último dia: {last}).')
+
+    return np.arange(last + 1, date + 1)
+
+
+def init_dengue_store(path, data):
+    '''
+    Cria o armazenamento de dengue a partir da série histórica. Os dados salvos são os mesmos
+    retornados por `get_dengue_data(mean = True)`.
+
+    :params path: string. Diretório do armazenamento.
+    :params data: pd.DataFrame. Saída de `get_dengue_data(mean = False)`, isto é, já com as
+                  correções de notified e probable.
+    '''
+    os.makedirs(path, exist_ok=True)
+    data_file, _ = _files(path, 'dengue')
+
+    data = data[DENGUE_COLS].sort_index()
+
+    df = data.rolling(window=WINDOW).mean().dropna()
+    df['acum_notified'] = df.notified.cumsum()
+    df.to_csv(data_file, index_label='date')
+
+    state = {'last_date': str(data.index[-1].date()),
+             'window': data.iloc[-WINDOW:].values.tolist(),
+             'acum_notified': float(df.acum_notified.iloc[-1]) if len(df) else 0.0,
+             'size': os.path.getsize(data_file)}
+
+    _save_state(path, 'dengue', state)
+
+
+def append_dengue(path, date, notified, probable, lab_confirmed):
+    '''
+    Acrescenta um novo dia ao armazenamento de dengue. Os valores devem estar no mesmo formato
+    do arquivo `dengue_cases-2010_2022.csv`, as correções de `get_dengue_data` são aplicadas
+    aqui. Dias faltantes entre o último dia salvo e `date` são preenchidos com zero casos.
+
+    :params path: string. Diretório do armazenamento.
+    :params date: string. Data no formato %Y-%m-%d.
+    :params notified: float. Casos notificados.
+    :params probable: float. Casos prováveis.
+    :params lab_confirmed: float. Casos confirmados em laboratório.
+
+    :returns: list. Linhas acrescentadas ao arquivo, no formato
+              [date, notified, probable, lab_confirmed, acum_notified].
+    '''
+    state = load_state(path, 'dengue')
+    _recover(path, 'dengue', state)
+    dates = _next_dates(state, date)
+
+    raw = np.zeros((len(dates), 3))
+    raw[-1] = [notified + probable + lab_confirmed, probable + lab_confirmed, lab_confirmed]
+
+    window = state['window']
+    acum = state['acum_notified']
+    rows = []
+
+    for day, values in zip(dates, raw):
+
+        window = window[-(WINDOW - 1):] + [values.tolist()]
+
+        if len(window) == WINDOW:
+            mean = np.mean(window, axis=0)
+            acum += float(mean[0])
+            rows.append([str(day)] + mean.tolist() + [acum])
+
+    state.update(last_date=str(dates[-1]), window=window, acum_notified=acum)
+    _append_rows(path, 'dengue', state, rows)
+
+    return rows
+
+
+def init_weather_store(path, data):
+    '''
+    Cria o armazenamento de clima a partir da série histórica já limpa.
+
+    :params path: string. Diretório do armazenamento.
+    :params data: pd.DataFrame. Saída de `get_weather_data()`.
+    '''
+    os.makedirs(path, exist_ok=True)
+    data_file, _ = _files(path, 'weather')
+
+    data = data[WEATHER_COLS].sort_index()
+    data.to_csv(data_file, index_label='date')
+
+    state = {'last_date': str(data.index[-1].date()),
+             'window': data.iloc[-WINDOW:].values.tolist(),
+             'size': os.path.getsize(data_file)}
+
+    _save_state(path, 'weather', state)
+
+
+def append_weather(path, date, values):
+    '''
+    Acrescenta um novo dia ao armazenamento de clima aplicando a mesma correção de
+    `fill_nan_weather`: valores ausentes são substituídos pela média dos últimos 7 dias e,
+    se as temperaturas mínima e máxima forem ambas zero, a linha inteira é substituída pela
+    média dos últimos 7 dias. Dias faltantes entre o último dia salvo e `date` são
+    preenchidos da mesma forma.
+
+    :params path: string. Diretório do armazenamento.
+    :params date: string. Data no formato %Y-%m-%d.
+    :params values: dict. Valores do dia, com as chaves de `WEATHER_COLS`.
+
+    :returns: list. Linhas acrescentadas ao arquivo.
+    '''
+    state = load_state(path, 'weather')
+    _recover(path, 'weather', state)
+    dates = _next_dates(state, date)
+
+    raw = np.full((len(dates), len(WEATHER_COLS)), np.nan)
+    raw[-1] = pd.to_numeric(pd.Series([values.get(col) for col in WEATHER_COLS], dtype=object),
+                            errors='coerce').values
+
+    i_min = WEATHER_COLS.index('temp_min-celsius')
+    i_max = WEATHER_COLS.index('temp_max-celsius')
+
+    window = state['window']
+    rows = []
+
+    for day, row in zip(dates, raw):
+
+        mean = np.nanmean(window, axis=0)
+
+        row = np.where(np.isnan(row), mean, row)
+
+        if row[i_min] == 0 and row[i_max] == 0:
+            row = mean
+
+        window = window[-(WINDOW - 1):] + [row.tolist()]
+        rows.append([str(day)] + row.tolist())
+
+    state.update(last_date=str(dates[-1]), window=window)
+    _append_rows(path, 'weather', state, rows)
+
+    return rows
@@ -0,0 +1,159 @@
+'''
+Neste .py script está implementada a leitura em blocos (streaming) das listas de casos
+individuais do SINAN. Cada bloco é classificado com máscaras vetorizadas e as contagens
+são acumuladas em um array pré-alocado de dimensão data x município x categoria, de forma
+que a memória utilizada depende apenas do tamanho do bloco e não do tamanho do arquivo.
+
+A classificação segue a mesma regra usada na limpeza dos dados (ver `misc.return_dengue_cases`):
+    * notified: todas as notificações;
+    * probable: classi_fin != 5;
+    * lab_confirmed: classi_fin != 5 e criterio == 1.
+As categorias são exclusivas, e a saída segue o formato do arquivo `dengue_cases-2010_2022.csv`.
+'''
+import os
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ['notified', 'probable', 'lab_confirmed']
+
+
+def classify_cases(classi_fin, criterio):
+    '''
+    Classifica cada notificação em uma das categorias de `CATEGORIES`.
+
+    :params classi_fin: array. Valores da coluna classi_fin.
+    :params criterio: array. Valores da coluna criterio.
+
+    :returns: array de int8 com o índice da categoria de cada linha.
+    '''
+    classi_fin = np.asarray(classi_fin, dtype=float)
+    criterio = np.asarray(criterio, dtype=float)
+
+    probable = classi_fin != 5
+
+    cat = probable.astype(np.int8)
+    cat[probable & (criterio == 1)] = 2
+
+    return cat
+
+
+def read_chunks(path, columns, chunksize=500_000):
+    '''
+    Lê um arquivo CSV ou Parquet em blocos de até `chunksize` linhas.
+
+    :params path: string. Caminho do arquivo (.csv, .csv.gz ou .parquet).
+    :params columns: list. Colunas que serão lidas.
+    :params chunksize: int. Número máximo de linhas por bloco.
+
+    :returns: gerador de pd.DataFrame.
+    '''
+    if str(path).endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        for batch in pf.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+
+
+def ingest_dengue_cases(path, start_date, end_date, municipalities=None, chunksize=500_000,
+                        date_col='dt_sin_pri', mun_col='id_mn_resi', date_format=None):
+    '''
+    Lê a lista de casos em blocos e retorna as contagens diárias por município e categoria.
+    Linhas sem data, fora do intervalo de datas ou de municípios não listados são
+    descartadas. Linhas sem classi_fin são contadas como em `misc.return_dengue_cases`
+    (classi_fin vazio é diferente de 5, ver `classify_cases`).
+
+    :params path: string. Caminho do arquivo (.csv ou .parquet).
+    :params start_date: string. Primeira data da série, no formato %Y-%m-%d.
+    :params end_date: string. Última data da série, no formato %Y-%m-%d.
+    :params municipalities: list or None. Códigos dos municípios. Se None, todas as linhas
+                            são somadas em um único município.
+    :params chunksize: int. Número de linhas lidas por vez.
+    :params date_col: string. Coluna com a data usada para a série.
+    :params mun_col: string. Coluna com o código do município.
+    :params date_format: string or None. Formato da data repassado ao pd.to_datetime.
+
+    :returns: array de int64 com dimensão (n_dias, n_municipios, 3).
+    '''
+    start = np.datetime64(start_date, 'D')
+    n_days = int((np.datetime64(end_date, 'D') - start).astype(np.int64)) + 1
+
+    columns = [date_col, 'classi_fin', 'criterio']
+
+    if municipalities is None:
+        n_mun = 1
+    else:
+        mun_codes = np.asarray(municipalities, dtype=np.int64)
+        order = np.argsort(mun_codes)
+        sorted_codes = mun_codes[order]
+        n_mun = len(mun_codes)
+        columns.append(mun_col)
+
+    n_cat = len(CATEGORIES)
+    counts = np.zeros((n_days, n_mun, n_cat), dtype=np.int64)
+    flat = counts.reshape(-1)
+
+    for chunk in read_chunks(path, columns, chunksize):
+
+        dates = pd.to_datetime(chunk[date_col], errors='coerce', format=date_format)
+        dates = dates.to_numpy(dtype='datetime64[D]')
+        classi_fin = pd.to_numeric(chunk['classi_fin'], errors='coerce').to_numpy(dtype=float)
+        # exportações com criterio em branco ou não numérico são lidas como texto
+        criterio = pd.to_numeric(chunk['criterio'], errors='coerce').to_numpy(dtype=float)
+
+        day = (dates - start).astype(np.int64)
+        valid = (~np.isnat(dates)) & (day >= 0) & (day < n_days)
+
+        if municipalities is None:
+            mun = np.zeros(len(day), dtype=np.int64)
+        else:
+            code = pd.to_numeric(chunk[mun_col], errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+            pos = np.searchsorted(sorted_codes, code).clip(0, n_mun - 1)
+            valid &= sorted_codes[pos] == code
+            mun = order[pos]
+
+        cat = classify_cases(classi_fin, criterio)
+
+        idx = (day[valid]*n_mun + mun[valid])*n_cat + cat[valid]
+        idx, n = np.unique(idx, return_counts=True)
+        flat[idx] += n
+
+    return counts
+
+
+def daily_frame(counts, start_date, mun=0):
+    '''
+    Converte as contagens de um município para o formato do `dengue_cases-2010_2022.csv`.
+
+    :params counts: array. Saída da função `ingest_dengue_cases`.
+    :params start_date: string. Data correspondente à primeira linha de `counts`.
+    :params mun: int. Posição do município em `counts`.
+
+    :returns: pd.DataFrame com índice `date` e as colunas de `CATEGORIES`.
+    '''
+    dates = pd.date_range(start_date, periods=counts.shape[0], name='date')
+
+    return pd.DataFrame(counts[:, mun, :].astype(float), index=dates, columns=CATEGORIES)
+
+
+def write_daily_csv(counts, start_date, output, municipalities=None):
+    '''
+    Salva as contagens diárias no mesmo formato do `dengue_cases-2010_2022.csv`.
+
+    :params counts: array. Saída da função `ingest_dengue_cases`.
+    :params start_date: string. Data correspondente à primeira linha de `counts`.
+    :params output: string. Se `municipalities` for None, é o caminho do arquivo csv. Caso
+                    contrário, é o diretório onde será salvo um arquivo
+                    `dengue_cases-<código>.csv` por município.
+    :params municipalities: list or None. Códigos dos municípios, na mesma ordem de `counts`.
+    '''
+    if municipalities is None:
+        daily_frame(counts, start_date).to_csv(output)
+        return
+
+    os.makedirs(output, exist_ok=True)
+
+    for i, code in enumerate(municipalities):
+        daily_frame(counts, start_date, mun=i).to_csv(os.path.join(output, f'dengue_cases-{code}.csv'))
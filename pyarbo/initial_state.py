@@ -0,0 +1,124 @@
+'''
+Neste .py script está o serviço de condições iniciais com os mosquitos já aquecidos
+(warm-up) para uma data de início.
+
+O estado livre de doença dos mosquitos (A, Ms) na data de início é calculado de uma das
+formas abaixo e salvo em um cache persistente, indexado pela data, pela configuração da
+forçante e por um hash dos arrays de temperatura e capacidade suporte usados:
+    * 'warmup': o subsistema dos mosquitos é integrado com o clima observado nos
+      `warmup_days` dias anteriores à data de início;
+    * 'periodic': o estado é lido da órbita periódica do ano climático (ver `periodic.py`).
+
+Cenários repetidos (fitting, backtesting, varreduras de parâmetros) leem o estado do cache e
+não refazem o aquecimento.
+'''
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from scipy.integrate import solve_ivp
+from get_data import CACHE_DIR
+from edo_model_yang import onto_params, K, C_A, C_M, D
+from periodic import mosquito_rhs, equilibrium_guess, forcing, climate_year, periodic_orbit
+
+
+def _key(config, arrays):
+
+    h = hashlib.sha1(json.dumps(config, sort_keys = True).encode())
+
+    for a in arrays:
+        h.update(np.ascontiguousarray(a, dtype = float).tobytes())
+
+    return h.hexdigest()
+
+
+def mosquito_state(start_date, df_we, warmup_days = 90, method = 'warmup', yang_cap = True,
+                   cap = 1, D = D, fixed = False, k = K, c_a = C_A, c_m = C_M,
+                   cache_dir = CACHE_DIR, refresh = False):
+    '''
+    Retorna o estado livre de doença dos mosquitos [A, Ms] na data de início.
+
+    :params start_date: string. Data de início da simulação, no formato %Y-%m-%d.
+    :params df_we: pd.DataFrame. Dados de clima, como retornado por `get_weather_data`.
+    :params warmup_days: int. Número de dias de aquecimento (método 'warmup').
+    :params method: string. 'warmup' ou 'periodic'.
+    :params yang_cap: boolean. Se True, a capacidade suporte segue `sup_cap_yang`; caso
+                      contrário é constante e igual a cap.
+    :params cap: float. Capacidade suporte constante, em unidades de 10**D.
+    :params D: int. Determina a magnitude da capacidade suporte.
+    :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos.
+    :params cache_dir: string or None. Diretório do cache. Se None, o cache não é usado.
+    :params refresh: boolean. Se True, o estado é recalculado e o cache atualizado.
+
+    :returns: list. [A, Ms]
+    '''
+    start = pd.Timestamp(start_date)
+
+    if method == 'warmup':
+        first = start - pd.Timedelta(days = warmup_days)
+        temp, cap_t = forcing(df_we, first, start - pd.Timedelta(days = 1))
+    elif method == 'periodic':
+        temp, cap_t = climate_year(df_we, start.year)
+    else:
+        raise ValueError("method deve ser 'warmup' ou 'periodic'.")
+
+    if not yang_cap:
+        cap_t = np.full(len(temp), float(cap))
+
+    config = {'start_date': str(start.date()), 'method': method, 'warmup_days': warmup_days,
+              'D': D, 'fixed': fixed, 'k': k, 'c_a': c_a, 'c_m': c_m}
+
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, 'initial_states', _key(config, [temp, cap_t]) + '.json')
+
+        if not refresh and os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)['state']
+
+    if method == 'warmup':
+        pars = onto_params(temp, fixed)
+        cap_x = (10**D)*cap_t
+        args = (pars, cap_x, k, c_a, c_m)
+
+        x0 = equilibrium_guess(pars, cap_x, k, c_a, c_m)
+        sol = solve_ivp(mosquito_rhs, [0, len(temp)], x0, args = args, method = 'LSODA',
+                        rtol = 1e-8, atol = 1e-6)
+
+        state = sol.y[:, -1]
+    else:
+        orbit = periodic_orbit(temp, cap_t, D = D, fixed = fixed, k = k, c_a = c_a, c_m = c_m)
+        state = orbit['orbit'][start.dayofyear - 1]
+
+    state = [float(v) for v in state]
+
+    if path is not None:
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'config': config, 'state': state}, f)
+
+        os.replace(tmp, path)
+
+    return state
+
+
+def initial_state(start_date, df_we, N, Hi0 = 0, Mi0 = 0, **kwargs):
+    '''
+    Retorna as condições iniciais do modelo completo, com os mosquitos aquecidos até a
+    data de início, no formato usado por `solve_model`.
+
+    :params start_date: string. Data de início da simulação, no formato %Y-%m-%d.
+    :params df_we: pd.DataFrame. Dados de clima, como retornado por `get_weather_data`.
+    :params N: int. População humana.
+    :params Hi0: float. Número inicial de humanos infectados.
+    :params Mi0: float. Número inicial de mosquitos infectados.
+    :params kwargs: demais parâmetros de `mosquito_state`.
+
+    :returns: list. [A, Ms, Me, Mi, Hs, He, Hi, Hr]
+    '''
+    A, Ms = mosquito_state(start_date, df_we, **kwargs)
+
+    return [A, Ms - Mi0, 0, Mi0, N - Hi0, 0, Hi0, 0]
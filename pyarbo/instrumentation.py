@@ -0,0 +1,256 @@
+'''
+Neste .py script está a instrumentação opcional do pacote, usada para descobrir onde está o
+tempo de um fitting ou de uma simulação:
+
+    * tempo de cada etapa (`load`, `clean`, `capacity`, `solve`, `objective`), medido pelas
+      funções decoradas com `timed`;
+    * para cada integração de `solve_model`: chamadas do lado direito (`system_odes`) e o
+      tempo gasto nelas, passos aceitos e rejeitados (métodos de Runge-Kutta), avaliações do
+      jacobiano e fatorações LU (métodos implícitos). As integrações do backend compilado
+      têm os mesmos contadores, exceto o tempo do lado direito.
+
+A instrumentação fica desligada por padrão e, nesse caso, cada função instrumentada faz
+apenas uma checagem de um booleano. Os registros podem ser exportados em JSON lines
+(`export`) e resumidos em uma tabela (`summary`).
+
+Uso:
+    with instrumented('perfil.jsonl'):
+        fit_model(t, data, y0)
+
+    print(summary())
+'''
+import json
+import time
+import functools
+import contextlib
+
+_STATE = {'enabled': False, 'records': [], 'stack': []}
+
+
+def enable():
+    '''
+    Liga a instrumentação.
+    '''
+    _STATE['enabled'] = True
+
+
+def disable():
+    '''
+    Desliga a instrumentação (os registros são mantidos).
+    '''
+    _STATE['enabled'] = False
+
+
+def is_enabled():
+
+    return _STATE['enabled']
+
+
+def reset():
+    '''
+    Apaga os registros.
+    '''
+    _STATE['records'] = []
+    _STATE['stack'] = []
+
+
+def records():
+    '''
+    Retorna a lista de registros (dicts).
+    '''
+    return list(_STATE['records'])
+
+
+def _record(record):
+
+    record['parent'] = _STATE['stack'][-1] if _STATE['stack'] else None
+    _STATE['records'].append(record)
+
+
+@contextlib.contextmanager
+def stage(name, **meta):
+    '''
+    Mede o tempo de um trecho de código como uma etapa.
+
+    :params name: string. Nome da etapa.
+    :params meta: valores extras guardados no registro.
+    '''
+    if not _STATE['enabled']:
+        yield
+        return
+
+    _STATE['stack'].append(name)
+    t0 = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - t0
+        _STATE['stack'].pop()
+        _record({'type': 'stage', 'name': name, 'seconds': seconds, **meta})
+
+
+def timed(name):
+    '''
+    Decorador que mede o tempo de cada chamada da função como a etapa `name`.
+    '''
+    def decorator(func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _STATE['enabled']:
+                return func(*args, **kwargs)
+
+            with stage(name, function = func.__name__):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def solver(method = 'RK45'):
+    '''
+    Retorna o método que deve ser passado ao solve_ivp e o dict de contadores da integração.
+    Com a instrumentação desligada, retorna (method, None).
+
+    :params method: string or OdeSolver. Método do solve_ivp.
+    '''
+    if not _STATE['enabled']:
+        return method, None
+
+    import scipy.integrate
+
+    counters = {'steps': 0, 'rejected': 0, 'rhs_seconds': 0.0}
+
+    base = getattr(scipy.integrate, method) if isinstance(method, str) else method
+
+    class Counting(base):
+
+        def _step_impl(self):
+            nfev = self.nfev
+            success, message = super()._step_impl()
+
+            counters['steps'] += 1
+
+            # nos métodos de Runge-Kutta cada tentativa custa n_stages avaliações
+            if hasattr(self, 'n_stages'):
+                counters['rejected'] += max((self.nfev - nfev)//self.n_stages - 1, 0)
+
+            return success, message
+
+    counters['method'] = base.__name__
+
+    return Counting, counters
+
+
+def rhs(fun, counters):
+    '''
+    Retorna fun, ou uma versão de fun que acumula o tempo gasto nas chamadas se counters não
+    for None (ver `solver`).
+    '''
+    if counters is None:
+        return fun
+
+    @functools.wraps(fun)
+    def wrapper(*args):
+        t0 = time.perf_counter()
+        out = fun(*args)
+        counters['rhs_seconds'] += time.perf_counter() - t0
+        return out
+
+    return wrapper
+
+
+def record_solve(r, counters, **meta):
+    '''
+    Guarda o registro de uma integração.
+
+    :params r: OdeResult. Saída do solve_ivp.
+    :params counters: dict or None. Contadores retornados por `solver`.
+    '''
+    if counters is None:
+        return
+
+    rejected = counters['rejected'] if counters['method'] in ('RK45', 'RK23', 'DOP853') else None
+
+    _record({'type': 'solver', 'name': 'solve_ivp', 'method': counters['method'],
+             'nfev': int(r.nfev), 'njev': int(r.njev), 'nlu': int(r.nlu),
+             'steps': counters['steps'], 'rejected': rejected,
+             'rhs_seconds': counters['rhs_seconds'], 'status': int(r.status), **meta})
+
+
+def record_compiled(r, **meta):
+    '''
+    Guarda o registro de uma integração do backend compilado (compiled.py). Os contadores
+    vêm do próprio integrador; o tempo do lado direito não é medido dentro do código
+    compilado (`rhs_seconds` fica vazio), e o tempo total é o da etapa `solve`.
+
+    :params r: OptimizeResult. Saída de `compiled.solve_compiled`.
+    '''
+    if not _STATE['enabled']:
+        return
+
+    _record({'type': 'solver', 'name': 'solve_compiled', 'method': f'numba-{r.method}',
+             'nfev': int(r.nfev), 'njev': int(r.njev), 'nlu': int(r.nlu),
+             'steps': int(r.steps), 'rejected': int(r.rejected),
+             'rhs_seconds': None, 'status': int(r.status), **meta})
+
+
+@contextlib.contextmanager
+def instrumented(path = None):
+    '''
+    Liga a instrumentação dentro do bloco, apagando os registros anteriores. Ao sair, os
+    registros são exportados para path (se fornecido) e a instrumentação volta ao estado
+    anterior.
+    '''
+    previous = _STATE['enabled']
+    reset()
+    enable()
+
+    try:
+        yield
+    finally:
+        _STATE['enabled'] = previous
+
+        if path is not None:
+            export(path)
+
+
+def export(path):
+    '''
+    Salva os registros em JSON lines (um registro por linha).
+    '''
+    with open(path, 'w') as f:
+        for record in _STATE['records']:
+            f.write(json.dumps(record) + '\n')
+
+
+def summary(recs = None):
+    '''
+    Resume os registros em uma tabela.
+
+    :params recs: list or None. Registros (por exemplo lidos de um arquivo exportado). Se
+                  None, usa os registros atuais.
+
+    :returns: pd.DataFrame com uma linha por etapa (`calls`, `seconds`, `mean`) e uma linha
+              `solve_ivp` com os totais das integrações (`nfev`, `steps`, `rejected`, `njev`,
+              `nlu` e `rhs_seconds`).
+    '''
+    import pandas as pd
+
+    df = pd.DataFrame(_STATE['records'] if recs is None else recs)
+
+    if df.empty:
+        return df
+
+    stages = df[df.type == 'stage']
+    out = stages.groupby('name', sort = False)['seconds'].agg(['count', 'sum', 'mean'])
+    out.columns = ['calls', 'seconds', 'mean']
+
+    solves = df[df.type == 'solver']
+    if len(solves):
+        totals = solves[['nfev', 'steps', 'rejected', 'njev', 'nlu', 'rhs_seconds']].sum()
+        out.loc['solve_ivp', ['calls'] + list(totals.index)] = [len(solves)] + list(totals.values)
+
+    return out
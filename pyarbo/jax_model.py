@@ -0,0 +1,324 @@
+'''
+Neste .py script está uma versão diferenciável do modelo do Yang, escrita em JAX, usada para
+calibrar muitos parâmetros de uma vez com otimizadores baseados em gradiente:
+
+    * taxa de transmissão b*beta variando no tempo, com os nós de `transmission.knot_basis`;
+    * coeficientes w1, C0, C1 e C2 da capacidade suporte do Yang (`sup_cap_yang`).
+
+Todo o caminho dos arrays de clima até a função perda é diferenciável:
+    * `sup_cap_yang`: a mesma fórmula de `edo_model_yang.sup_cap_yang_array`;
+    * `onto_params`: os parâmetros entomológicos são interpolados linearmente na tabela de
+      parameters.py (passo de 0.1 °C). Nas temperaturas da tabela (arredondadas para 0.1 °C)
+      os valores são os mesmos de `edo_model_yang.onto_params`;
+    * `solve`: integração com passo fixo pelo Euler exponencial de ponto médio (o esquema
+      'expmid' de fast_model.py), com `substeps` passos por dia, escrita com `jax.lax.scan`.
+
+`make_loss` retorna a perda e o seu gradiente (modo reverso) compilados com `jax.jit`, e
+`fit` os usa no L-BFGS-B do scipy. O JAX é opcional: sem ele o módulo pode ser importado,
+mas as funções levantam ImportError.
+
+As populações do modelo precisam de precisão dupla. As funções públicas do módulo (e as
+funções retornadas por `make_loss`) rodam com o x64 do JAX ligado apenas durante a chamada
+(ver `_x64`), sem mudar a configuração global do JAX para o resto do processo. Arrays
+passados a elas devem ser arrays do numpy ou arrays do JAX criados em precisão dupla.
+'''
+import time
+import functools
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from edo_model_yang import ONTO_NAMES, ONTO_FIXED, ONTO_T0, parameter_tables
+from transmission import knot_basis, difference_matrix
+from fitting import PARAM_FIXED
+
+try:
+    import jax
+    import jax.numpy as jnp
+    from jax.flatten_util import ravel_pytree
+    HAS_JAX = True
+except ImportError:
+    HAS_JAX = False
+
+# coeficientes da capacidade suporte e os seus valores padrão (os de sup_cap_yang)
+CAP_NAMES = ['w1', 'C0', 'C1', 'C2']
+CAP_DEFAULT = {'w1': 0.5, 'C0': 5.0, 'C1': 30.0, 'C2': 0.1}
+
+# limites usados em `fit`
+BOUNDS = {'bb': (1e-3, 1.0), 'w1': (0.05, 5.0), 'C0': (0.1, 50.0), 'C1': (1.0, 200.0),
+          'C2': (1e-3, 5.0)}
+
+
+def _require():
+
+    if not HAS_JAX:
+        raise ImportError('jax_model.py exige o pacote jax.')
+
+
+def _enable_x64():
+    # jax.enable_x64 nas versões novas, jax.experimental.enable_x64 nas antigas
+    if hasattr(jax, 'enable_x64'):
+        return jax.enable_x64(True)
+
+    from jax.experimental import enable_x64
+
+    return enable_x64()
+
+
+def _x64(func):
+    # roda func com a precisão dupla do JAX ligada só durante a chamada
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _require()
+
+        with _enable_x64():
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def weather_arrays(df_we, start_date, end_date, k = 7):
+    '''
+    Retorna os arrays de clima entre start_date - k dias e end_date (inclusive), como em
+    `periodic.forcing`: dias ausentes recebem os valores do dia anterior.
+
+    :returns: dict com `W` (chuva), `T_min` e `T_mean`, arrays com n_dias + k valores.
+    '''
+    days = pd.date_range(pd.Timestamp(start_date) - pd.Timedelta(days = k), end_date)
+    df = df_we[~df_we.index.duplicated()].reindex(days).ffill().bfill()
+
+    return {'W': df['daily_precipitation-mm'].to_numpy(dtype = float),
+            'T_min': df['temp_min-celsius'].to_numpy(dtype = float),
+            'T_mean': df['temp_mean-celsius'].to_numpy(dtype = float)}
+
+
+@_x64
+def sup_cap_yang(W, T_min, T_max, k = 7, w1 = 0.5, C0 = 5, C1 = 30, C2 = 0.1):
+    '''
+    Capacidade suporte do Yang, diferenciável em relação a todos os argumentos (ver
+    `edo_model_yang.sup_cap_yang_array`).
+
+    :returns: array com n - k dias.
+    '''
+    T = w1*(T_max + T_min)
+    n = W.shape[-1]
+
+    W_m = 0.0
+    for i in range(1, k + 1):
+        W_m = W_m + W[..., k - i:n - i]/T[..., k - i:n - i]**i
+
+    return C2 + (C0*(W[..., k:] + W_m))/(C1 + W[..., k:] + W_m)
+
+
+@_x64
+def onto_params(temp):
+    '''
+    Parâmetros entomológicos interpolados linearmente na tabela de parameters.py.
+
+    :returns: dict com um array para cada nome de ONTO_NAMES, com a dimensão de temp.
+    '''
+    table = parameter_tables()[1]
+    grid = (ONTO_T0 + np.arange(table.shape[0]))/10
+
+    return {name: jnp.interp(temp, grid, table[:, i]) for i, name in enumerate(ONTO_NAMES)}
+
+
+def _phi(z):
+    # (1 - exp(-z))/z, com o limite 1 - z/2 perto de zero (sem nan no gradiente)
+    small = z < 1e-8
+    z_safe = jnp.where(small, 1.0, z)
+
+    return jnp.where(small, 1 - z/2, -jnp.expm1(-z_safe)/z_safe)
+
+
+def _rates(X, lam, pars, cap, c_a, c_m, consts):
+    # produção P e taxa de perda L de cada compartimento, dX/dt = P - L*X
+    MU_H, THETA_H, ALPHA_H, K = consts
+    d, theta_m, gamma_m, mu_a, mu_m = pars
+
+    A, Ms, Me, Mi, Hs, He, Hi, Hr = X
+
+    M = A + Ms + Me + Mi
+    H = Hs + He + Hi + Hr
+    mu = mu_m + c_m
+
+    P = jnp.stack([K*d*M, gamma_m*A, lam*Ms*Hi/H, theta_m*Me, MU_H*(H - Hs),
+                   lam*Hs*Mi/H, THETA_H*He, ALPHA_H*Hi])
+    L = jnp.stack([K*d*M/cap + gamma_m + mu_a + c_a, lam*Hi/H + mu, theta_m + mu, mu,
+                   lam*Mi/H, THETA_H + MU_H, ALPHA_H + MU_H, MU_H])
+
+    return P, L
+
+
+def _exp_step(X0, P, L, h):
+
+    return X0*jnp.exp(-L*h) + P*h*_phi(L*h)
+
+
+@_x64
+def solve(y0, lam, pars, cap, param_fixed = PARAM_FIXED, substeps = 4):
+    '''
+    Integra o modelo com passo fixo de 1/substeps dia.
+
+    :params y0: array. Condição inicial (8,).
+    :params lam: array. b*beta de cada dia (n_dias,).
+    :params pars: dict. Parâmetros entomológicos de cada dia (ver `onto_params`).
+    :params cap: array. Capacidade suporte de cada dia, em unidades de 10**D.
+    :params param_fixed: tuple. Parâmetros fixos. C_A e C_M podem ser séries diárias.
+    :params substeps: int. Número de passos por dia.
+
+    :returns: array (n_dias, 8) com o estado no início de cada dia.
+    '''
+    MU_H, THETA_H, ALPHA_H, K, C_A, C_M, D = param_fixed
+    consts = (MU_H, THETA_H, ALPHA_H, K)
+
+    n = lam.shape[0]
+    daily = (lam, tuple(jnp.broadcast_to(pars[name], (n,)) for name in ONTO_NAMES), (10**D)*cap,
+             jnp.broadcast_to(jnp.asarray(C_A, dtype = float), (n,)),
+             jnp.broadcast_to(jnp.asarray(C_M, dtype = float), (n,)))
+
+    h = 1.0/substeps
+
+    def day(X, f):
+        lam_j, pars_j, cap_j, c_a, c_m = f
+
+        def step(_, X):
+            P, L = _rates(X, lam_j, pars_j, cap_j, c_a, c_m, consts)
+            P, L = _rates(_exp_step(X, P, L, h/2), lam_j, pars_j, cap_j, c_a, c_m, consts)
+            return _exp_step(X, P, L, h)
+
+        return jax.lax.fori_loop(0, substeps, step, X), X
+
+    _, states = jax.lax.scan(day, jnp.asarray(y0, dtype = float), daily)
+
+    return states
+
+
+@_x64
+def simulate(theta, weather, y0, basis = None, fixed = False, k = 7, substeps = 4,
+             param_fixed = PARAM_FIXED):
+    '''
+    Casos acumulados (Hi + Hr) de cada dia a partir dos parâmetros e do clima.
+
+    :params theta: dict. `bb` (valores dos nós de b*beta, ou um único valor se basis for
+                   None) e, opcionalmente, coeficientes de CAP_NAMES (os ausentes usam
+                   CAP_DEFAULT).
+    :params weather: dict. Saída de `weather_arrays`, com n_dias + k valores.
+    :params y0: array. Condição inicial.
+    :params basis: array or None. Matriz base (n_dias, n_nós) de `transmission.knot_basis`.
+    :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos.
+    :params k: int. Número de dias anteriores usados na capacidade suporte.
+    :params substeps: int. Número de passos por dia.
+
+    :returns: array (n_dias,).
+    '''
+    coefs = {name: theta.get(name, CAP_DEFAULT[name]) for name in CAP_NAMES}
+    cap = sup_cap_yang(weather['W'], weather['T_min'], weather['T_mean'], k = k, **coefs)
+    n = cap.shape[0]
+
+    if basis is None:
+        lam = jnp.broadcast_to(theta['bb'], (n,))
+    else:
+        lam = basis @ theta['bb']
+
+    if fixed:
+        pars = dict(zip(ONTO_NAMES, ONTO_FIXED))
+    else:
+        pars = onto_params(weather['T_mean'][k:])
+
+    states = solve(y0, lam, pars, cap, param_fixed, substeps)
+
+    return states[:, 6] + states[:, 7]
+
+
+@_x64
+def make_loss(data, weather, y0, basis = None, fixed = False, smooth = 0.0, order = 1, k = 7,
+              substeps = 4, param_fixed = PARAM_FIXED):
+    '''
+    Retorna a função perda e a função que calcula a perda e o seu gradiente, ambas compiladas
+    com `jax.jit`. A perda é o erro quadrático médio dos casos acumulados, dividido por
+    max(data)**2, mais smooth vezes a soma dos quadrados das diferenças entre nós vizinhos.
+
+    :params data: array. Casos acumulados (n_dias,).
+
+    Os demais parâmetros são os mesmos de `simulate` e, para smooth e order, de
+    `transmission.fit_schedule`.
+
+    :returns: tuple. (loss(theta), value_and_grad(theta))
+    '''
+    data = jnp.asarray(data, dtype = float)
+    weather = {key: jnp.asarray(v, dtype = float) for key, v in weather.items()}
+    scale = float(np.max(np.abs(data)))
+
+    if basis is not None:
+        basis = jnp.asarray(basis, dtype = float)
+        Dm = jnp.asarray(difference_matrix(basis.shape[1], order), dtype = float)
+
+    def loss(theta):
+        cases = simulate(theta, weather, y0, basis, fixed, k, substeps, param_fixed)
+        value = jnp.mean(((cases - data)/scale)**2)
+
+        if smooth > 0 and basis is not None:
+            value = value + smooth*jnp.sum((Dm @ theta['bb'])**2)
+
+        return value
+
+    return _x64(jax.jit(loss)), _x64(jax.jit(jax.value_and_grad(loss)))
+
+
+@_x64
+def fit(data, weather, y0, n_knots = 20, knots = None, kind = 'constant', fit_cap = CAP_NAMES,
+        theta0 = None, fixed = False, smooth = 0.0, order = 1, k = 7, substeps = 4,
+        param_fixed = PARAM_FIXED, maxiter = 500):
+    '''
+    Fita b*beta variando no tempo e os coeficientes da capacidade suporte com o L-BFGS-B,
+    usando o gradiente exato da perda (ver `make_loss`).
+
+    :params data: array. Casos acumulados (n_dias,).
+    :params weather: dict. Saída de `weather_arrays`.
+    :params y0: array. Condição inicial.
+    :params n_knots, knots, kind: nós de b*beta (ver `transmission.knot_basis`). Se n_knots
+                                  for None, b*beta é constante.
+    :params fit_cap: list. Coeficientes de CAP_NAMES fitados (os demais usam CAP_DEFAULT).
+    :params theta0: dict or None. Valores iniciais. Se None, usa b*beta = 0.25 e CAP_DEFAULT.
+    :params maxiter: int. Número máximo de iterações do L-BFGS-B.
+
+    Os demais parâmetros são os mesmos de `make_loss`.
+
+    :returns: dict com `theta`, `cases`, `loss`, `nit`, `nfev`, `success`, `message`,
+              `runtime` e `basis`.
+    '''
+    n = len(data)
+    basis = None if n_knots is None and knots is None else knot_basis(n, n_knots, knots, kind)
+    n_bb = 1 if basis is None else basis.shape[1]
+
+    if theta0 is None:
+        theta0 = {'bb': 0.25, **CAP_DEFAULT}
+
+    theta = {'bb': jnp.broadcast_to(jnp.asarray(theta0['bb'], dtype = float), (n_bb,)) if basis is not None
+             else jnp.asarray(theta0['bb'], dtype = float)}
+    theta.update({name: jnp.asarray(theta0.get(name, CAP_DEFAULT[name]), dtype = float)
+                  for name in fit_cap})
+
+    x0, unravel = ravel_pytree(theta)
+    bounds = [BOUNDS[name] for name in sorted(theta) for _ in range(np.size(theta[name]))]
+
+    loss, value_and_grad = make_loss(data, weather, y0, basis, fixed, smooth, order, k, substeps,
+                                     param_fixed)
+
+    def fun(x):
+        value, grad = value_and_grad(unravel(jnp.asarray(x)))
+        return float(value), np.asarray(ravel_pytree(grad)[0], dtype = float)
+
+    t0 = time.perf_counter()
+    res = minimize(fun, np.asarray(x0), jac = True, method = 'L-BFGS-B', bounds = bounds,
+                   options = {'maxiter': maxiter})
+    runtime = time.perf_counter() - t0
+
+    best = unravel(jnp.asarray(res.x))
+
+    return {'theta': {name: np.asarray(v) for name, v in best.items()},
+            'cases': np.asarray(simulate(best, {key: jnp.asarray(v) for key, v in weather.items()},
+                                         y0, basis, fixed, k, substeps, param_fixed)),
+            'loss': float(res.fun), 'nit': int(res.nit), 'nfev': int(res.nfev),
+            'success': bool(res.success), 'message': str(res.message), 'runtime': runtime,
+            'basis': basis}
@@ -52,9 +52,9 @@ def return_dengue_cases(data):
     classifin_not_5 = (data["classi_fin"] != 5)
     criterio_is_1 = (data["criterio"] == 1)
 
-    data.loc[:, (classifin_not_5, "tipo")] = "probable"
+    data.loc[classifin_not_5, "tipo"] = "probable"
 
     dengue_mask = classifin_not_5 & criterio_is_1
-    data[dengue_mask]["tipo"] = "lab_confirmed"
+    data.loc[dengue_mask, "tipo"] = "lab_confirmed"
 
     return data
@@ -0,0 +1,206 @@
+'''
+Neste .py script está implementado o painel diário com todos os dados do projeto (clima,
+casos de dengue e armadilhas) alinhados em um único índice de datas.
+
+Os valores ficam em um único array float64 com dimensão (n_colunas, n_dias), de forma que
+cada série é um array contíguo na memória. Dias sem informação em uma fonte ficam como NaN
+e a máscara `valid` indica, para cada fonte, os dias presentes no arquivo original.
+
+O painel é construído uma única vez a partir dos arquivos locais e salvo em formato binário
+(.npy) no diretório de cache. As próximas leituras usam memory map e não refazem a leitura
+e a limpeza dos csv, enquanto os arquivos de origem não forem alterados.
+'''
+import os
+import json
+import numpy as np
+import pandas as pd
+from get_data import DATA_DIR, CACHE_DIR, get_weather_data, get_dengue_data
+
+SOURCES = {'weather': 'weather-2010_2022.csv',
+           'dengue': 'dengue_cases-2010_2022.csv',
+           'trap': 'mosq_aaeg_trap-2017_2022.csv',
+           'trap_pos': 'mosq_aaeg_trap_pos-2017_2022.csv'}
+
+
+class Panel:
+    '''
+    Painel de dados diários alinhados.
+
+    :params dates: pd.DatetimeIndex. Índice diário comum a todas as fontes.
+    :params values: array. Array com dimensão (n_colunas, n_dias).
+    :params columns: list. Nome das colunas, na ordem das linhas de `values`.
+    :params sources: dict. Para cada fonte, o intervalo (início, fim) das suas colunas em `values`.
+    :params valid: array. Array booleano com dimensão (n_fontes, n_dias).
+    '''
+
+    def __init__(self, dates, values, columns, sources, valid):
+
+        self.dates = dates
+        self.values = values
+        self.columns = list(columns)
+        self.sources = {name: tuple(pos) for name, pos in sources.items()}
+        self.valid = valid
+
+        self._col = {col: i for i, col in enumerate(self.columns)}
+        self._src = {name: i for i, name in enumerate(self.sources)}
+
+    def __getitem__(self, col):
+
+        return self.values[self._col[col]]
+
+    def block(self, source):
+        '''
+        Retorna as colunas de uma fonte, sem cópia, com dimensão (n_colunas_fonte, n_dias).
+        '''
+        start, end = self.sources[source]
+
+        return self.values[start:end]
+
+    def mask(self, source):
+        '''
+        Retorna a máscara de dias válidos de uma fonte.
+        '''
+        return self.valid[self._src[source]]
+
+    def window(self, start_date, end_date):
+        '''
+        Retorna o slice com os dias entre start_date e end_date (inclusive).
+        '''
+        start = self.dates.searchsorted(pd.Timestamp(start_date))
+        end = self.dates.searchsorted(pd.Timestamp(end_date), side='right')
+
+        return slice(start, end)
+
+    def to_frame(self, source=None):
+        '''
+        Retorna o painel (ou uma fonte) como pd.DataFrame indexado pelas datas.
+        '''
+        if source is None:
+            return pd.DataFrame(self.values.T, index=self.dates, columns=self.columns)
+
+        start, end = self.sources[source]
+
+        return pd.DataFrame(self.values[start:end].T, index=self.dates, columns=self.columns[start:end])
+
+
+def _read_sources(data_dir):
+
+    weather = get_weather_data(os.path.join(data_dir, SOURCES['weather']))
+
+    dengue = get_dengue_data(mean=False, path=os.path.join(data_dir, SOURCES['dengue']))
+
+    trap = pd.read_csv(os.path.join(data_dir, SOURCES['trap']), index_col='date', parse_dates=True)
+
+    # o arquivo _pos repete as colunas do arquivo de armadilhas, só as colunas _pos são usadas
+    trap_pos = pd.read_csv(os.path.join(data_dir, SOURCES['trap_pos']), index_col='date', parse_dates=True)
+    trap_pos = trap_pos[[col for col in trap_pos.columns if col.endswith('_pos')]]
+
+    frames = {'weather': weather, 'dengue': dengue, 'trap': trap, 'trap_pos': trap_pos}
+
+    for name, df in frames.items():
+        df = df.sort_index(kind='stable')
+        frames[name] = df[~df.index.duplicated()]
+
+    return frames
+
+
+def build_panel(data_dir=DATA_DIR):
+    '''
+    Lê os arquivos de dados e constrói o painel alinhado.
+
+    :params data_dir: string. Diretório com os arquivos de `SOURCES`.
+
+    :returns: Panel.
+    '''
+    frames = _read_sources(data_dir)
+
+    dates = pd.date_range(min(df.index.min() for df in frames.values()),
+                          max(df.index.max() for df in frames.values()))
+
+    columns = [col for df in frames.values() for col in df.columns]
+
+    values = np.full((len(columns), len(dates)), np.nan)
+    valid = np.zeros((len(frames), len(dates)), dtype=bool)
+    sources = {}
+
+    row = 0
+    for i, (name, df) in enumerate(frames.items()):
+
+        pos = dates.get_indexer(df.index)
+        values[row:row + df.shape[1], pos] = df.to_numpy(dtype=float).T
+        valid[i, pos] = df.notna().any(axis=1).to_numpy()
+
+        sources[name] = (row, row + df.shape[1])
+        row += df.shape[1]
+
+    return Panel(dates, values, columns, sources, valid)
+
+
+def _signature(data_dir):
+
+    sig = {}
+    for name, filename in SOURCES.items():
+        st = os.stat(os.path.join(data_dir, filename))
+        sig[name] = [st.st_size, st.st_mtime_ns]
+
+    return sig
+
+
+def save_panel(panel, path, signature=None):
+    '''
+    Salva o painel em formato binário no diretório `path`.
+    '''
+    os.makedirs(path, exist_ok=True)
+
+    np.save(os.path.join(path, 'values.npy'), np.ascontiguousarray(panel.values))
+    np.save(os.path.join(path, 'valid.npy'), panel.valid)
+
+    meta = {'start': str(panel.dates[0].date()),
+            'n_days': len(panel.dates),
+            'columns': panel.columns,
+            'sources': panel.sources,
+            'signature': signature}
+
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+
+def read_panel(path, mmap_mode='r'):
+    '''
+    Lê o painel salvo por `save_panel`. Com mmap_mode = 'r' os arrays não são carregados
+    para a memória, apenas os trechos acessados.
+    '''
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+
+    values = np.load(os.path.join(path, 'values.npy'), mmap_mode=mmap_mode)
+    valid = np.load(os.path.join(path, 'valid.npy'), mmap_mode=mmap_mode)
+
+    dates = pd.date_range(meta['start'], periods=meta['n_days'])
+
+    return Panel(dates, values, meta['columns'], meta['sources'], valid)
+
+
+def load_panel(data_dir=DATA_DIR, cache_dir=CACHE_DIR, rebuild=False):
+    '''
+    Retorna o painel alinhado, usando o cache se os arquivos de origem não mudaram.
+
+    :params data_dir: string. Diretório com os arquivos de `SOURCES`.
+    :params cache_dir: string. Diretório do cache.
+    :params rebuild: boolean. Se True, o painel é reconstruído mesmo com o cache válido.
+
+    :returns: Panel.
+    '''
+    path = os.path.join(cache_dir, 'panel')
+    signature = _signature(data_dir)
+
+    if not rebuild and os.path.exists(os.path.join(path, 'meta.json')):
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+
+        if meta['signature'] == signature:
+            return read_panel(path)
+
+    save_panel(build_panel(data_dir), path, signature)
+
+    return read_panel(path)
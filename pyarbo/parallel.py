@@ -0,0 +1,41 @@
+'''
+Neste .py script estão as funções que distribuem trabalhos entre processos, usadas pela linha
+de comando (cli.py) e pelo executor de pipeline (pipeline.py).
+'''
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+
+def map_jobs(func, jobs, workers, *args):
+    '''
+    Executa func(job, *args) para cada job, em processos separados se workers != 1.
+
+    :params func: função. Precisa ser definida no nível de um módulo (para ser enviada aos
+                  processos).
+    :params jobs: list. Trabalhos.
+    :params workers: int or None. Número de processos. Se None, usa todos os núcleos; se 1,
+                     executa no processo atual.
+
+    :returns: list. Resultados na ordem dos jobs.
+    '''
+    if workers is None:
+        workers = os.cpu_count()
+
+    if workers == 1 or len(jobs) <= 1:
+        return [func(job, *args) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers = min(workers, len(jobs))) as ex:
+        futures = [ex.submit(func, job, *args) for job in jobs]
+        return [f.result() for f in futures]
+
+
+def blocks(n, workers):
+    '''
+    Divide range(n) em blocos contíguos, um por processo.
+
+    :returns: list of arrays.
+    '''
+    workers = os.cpu_count() if workers is None else workers
+
+    return [b for b in np.array_split(np.arange(n), max(1, min(workers, n))) if len(b)]
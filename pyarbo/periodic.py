@@ -0,0 +1,208 @@
+'''
+Neste .py script está o cálculo da órbita periódica (estado estacionário sazonal) do
+subsistema dos mosquitos (A, Ms) na ausência de doença, sob uma forçante anual de
+temperatura e capacidade suporte que se repete a cada ano.
+
+A órbita é encontrada pelo método do tiro (shooting): procura-se x0 tal que o fluxo de um
+ano, Phi(x0), seja igual a x0. As iterações de Newton usam a matriz de monodromia
+dPhi/dx0, obtida integrando as equações variacionais junto com o sistema.
+
+Com a órbita calculada, o estado dos mosquitos em qualquer dia do ano é consistente com o
+clima daquele ano, dispensando simulações de vários anos de aquecimento (burn-in).
+'''
+import warnings
+import numpy as np
+import pandas as pd
+from scipy.integrate import solve_ivp
+from edo_model_yang import onto_params, sup_cap_yang, R_m, K, C_A, C_M, D
+from compiled import rhs, jacobian
+
+# órbitas já calculadas, indexadas pelo ano climático e pelos parâmetros
+_ORBITS = {}
+
+
+def mosquito_rhs(t, x, pars, cap, k = K, c_a = C_A, c_m = C_M, variational = False):
+    '''
+    Lado direito do subsistema dos mosquitos sem doença (Me = Mi = 0): as equações de A e Ms
+    de `model_rhs`, avaliadas pelas versões compiladas de compiled.py (sem o Numba, o próprio
+    `model_rhs`).
+
+    :params t: float. Instante de tempo. A forçante é periódica com período len(cap).
+    :params x: array. [A, Ms] ou, se variational for True, [A, Ms, m11, m21, m12, m22].
+    :params pars: dict. Parâmetros diários, saída de `onto_params`.
+    :params cap: array. Capacidade suporte diária (já multiplicada por 10**D).
+    :params variational: boolean. Se True, integra também as equações variacionais.
+    '''
+    i = int(t) % len(cap)
+
+    # `model_rhs` sem doença: b*beta = 0, Me = Mi = He = Hi = Hr = 0 e Hs = 1
+    p = np.array([0.0, 0.0, c_a, c_m, cap[i], pars['d'][i], pars['theta_m'][i], pars['gamma_m'][i],
+                  pars['mu_a'][i], pars['mu_m'][i]])
+    consts = np.array([0.0, 0.0, 0.0, k])
+    state = np.array([x[0], x[1], 0.0, 0.0, 1.0, 0.0, 0.0, 0.0])
+
+    dx = rhs(state, p, consts, np.empty(8))[:2]
+
+    if not variational:
+        return dx
+
+    J = jacobian(state, p, consts, np.empty((8, 8)))[:2, :2]
+
+    dPhi = J @ np.reshape(x[2:], (2, 2), order = 'F')
+
+    return np.concatenate([dx, dPhi.ravel(order = 'F')])
+
+
+def equilibrium_guess(pars, cap, k = K, c_a = C_A, c_m = C_M):
+    '''
+    Retorna o equilíbrio livre de doença [A, Ms] calculado com a média dos parâmetros
+    diários e da capacidade suporte, usado como chute inicial.
+
+    :params pars: dict. Parâmetros diários, saída de `onto_params`.
+    :params cap: array. Capacidade suporte diária (já multiplicada por 10**D).
+    '''
+    mean = {name: np.mean(values) for name, values in pars.items()}
+    Rm = R_m(k, mean['d'], mean['gamma_m'], mean['mu_m'], mean['mu_a'], c_m = c_m, c_a = c_a)
+
+    A = np.mean(cap)*max(1 - 1/Rm, 0.5)
+
+    return [A, mean['gamma_m']*A/(mean['mu_m'] + c_m)]
+
+
+def periodic_orbit(temp, cap, D = D, fixed = False, k = K, c_a = C_A, c_m = C_M, x0 = None,
+                   tol = 1e-6, max_iter = 20, method = 'LSODA', rtol = 1e-8, atol = 1e-6):
+    '''
+    Calcula a órbita periódica do subsistema dos mosquitos.
+
+    :params temp: array. Temperatura média de cada dia do ano climático.
+    :params cap: float or array. Capacidade suporte de cada dia, em unidades de 10**D.
+    :params D: int. Determina a magnitude da capacidade suporte.
+    :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos.
+    :params x0: list or None. Chute inicial [A, Ms]. Se None, usa o equilíbrio livre de
+                doença com os parâmetros médios do ano, integrado por um período.
+    :params tol: float. Tolerância relativa de |Phi(x0) - x0|.
+    :params max_iter: int. Número máximo de iterações de Newton.
+    :params method: string. Método do solve_ivp. Com a capacidade suporte do Yang o sistema
+                    fica rígido nos dias de capacidade baixa, por isso o padrão é LSODA.
+
+    :returns: dict com `x0` (estado no dia 0), `orbit` (array (n_dias, 2) com o estado no
+              início de cada dia), `iterations` (passos de Newton), `residual` (de `x0`),
+              `converged` e `multipliers` (autovalores da matriz de monodromia; a órbita é
+              estável se todos tiverem módulo < 1). Se não convergir em max_iter passos,
+              emite um RuntimeWarning e retorna o último estado.
+    '''
+    if max_iter < 1:
+        raise ValueError('max_iter deve ser pelo menos 1.')
+
+    temp = np.asarray(temp, dtype = float)
+    period = len(temp)
+
+    pars = onto_params(temp, fixed)
+    cap = (10**D)*np.broadcast_to(np.asarray(cap, dtype = float), (period,))
+
+    args = (pars, cap, k, c_a, c_m)
+    kw = dict(method = method, rtol = rtol, atol = atol)
+
+    if x0 is None:
+        x0 = equilibrium_guess(pars, cap, k, c_a, c_m)
+
+        x0 = solve_ivp(mosquito_rhs, [0, period], x0, args = args, **kw).y[:, -1]
+
+    x = np.asarray(x0, dtype = float)
+    eye = np.eye(2)
+
+    # a última avaliação é feita no estado retornado, de forma que o resíduo e a matriz de
+    # monodromia correspondem sempre a x
+    for it in range(max_iter + 1):
+
+        sol = solve_ivp(mosquito_rhs, [0, period], np.concatenate([x, eye.ravel()]),
+                        args = args + (True,), **kw)
+
+        phi = sol.y[:2, -1]
+        monodromy = np.reshape(sol.y[2:, -1], (2, 2), order = 'F')
+
+        res = phi - x
+        residual = np.linalg.norm(res)/max(np.linalg.norm(x), 1.0)
+
+        if residual < tol or it == max_iter:
+            break
+
+        dx = np.linalg.solve(monodromy - eye, -res)
+
+        # passo amortecido para manter o estado positivo
+        step = 1.0
+        while np.any(x + step*dx <= 0) and step > 1e-3:
+            step /= 2
+
+        x = x + step*dx
+
+    converged = bool(residual < tol)
+
+    if not converged:
+        warnings.warn(f'periodic_orbit não convergiu em {max_iter} iterações (resíduo {residual:.2e}).',
+                      RuntimeWarning, stacklevel = 2)
+
+    sol = solve_ivp(mosquito_rhs, [0, period], x, args = args, t_eval = np.arange(period), **kw)
+
+    return {'x0': x, 'orbit': sol.y.T, 'iterations': it, 'residual': residual,
+            'converged': converged, 'multipliers': np.linalg.eigvals(monodromy)}
+
+
+def forcing(df_we, start_date, end_date, k = 7, **kwargs_cap):
+    '''
+    Retorna a temperatura e a capacidade suporte (fórmula do Yang) de cada dia entre
+    start_date e end_date (inclusive). Dias ausentes nos dados de clima recebem os valores
+    do dia anterior.
+
+    :params df_we: pd.DataFrame. Dados de clima, como retornado por `get_weather_data`.
+    :params start_date: string. Data no formato %Y-%m-%d.
+    :params end_date: string. Data no formato %Y-%m-%d.
+    :params k: int. Número de dias anteriores usados em `sup_cap_yang`.
+    :params kwargs_cap: demais parâmetros de `sup_cap_yang`.
+
+    :returns: tuple. (temperatura, capacidade suporte), arrays com um valor por dia.
+    '''
+    days = pd.date_range(pd.Timestamp(start_date) - pd.Timedelta(days = k), end_date)
+
+    df = df_we[~df_we.index.duplicated()].reindex(days).ffill().bfill()
+
+    cap = sup_cap_yang(df.reset_index(drop = True), k = k, **kwargs_cap).to_numpy()
+    temp = df['temp_mean-celsius'].to_numpy()[k:]
+
+    return temp, cap
+
+
+def climate_year(df_we, year, k = 7, **kwargs_cap):
+    '''
+    Retorna a temperatura e a capacidade suporte de cada dia de um ano (ver `forcing`).
+    '''
+    return forcing(df_we, f'{year}-01-01', f'{year}-12-31', k = k, **kwargs_cap)
+
+
+def seasonal_state(date, df_we, N, Hi0 = 0, D = D, fixed = False, yang_cap = True, cap = 1,
+                   **kwargs):
+    '''
+    Retorna as condições iniciais do modelo completo na data `date`, com os mosquitos na
+    órbita periódica do ano climático da data. As órbitas são guardadas em memória e
+    calculadas uma única vez por ano e conjunto de parâmetros.
+
+    :params date: string. Data no formato %Y-%m-%d.
+    :params df_we: pd.DataFrame. Dados de clima, como retornado por `get_weather_data`.
+    :params N: int. População humana.
+    :params Hi0: float. Número inicial de humanos infectados.
+    :params yang_cap: boolean. Se True, a capacidade suporte segue `sup_cap_yang`; caso
+                      contrário é constante e igual a cap.
+    :params kwargs: demais parâmetros de `periodic_orbit`.
+
+    :returns: list. [A, Ms, Me, Mi, Hs, He, Hi, Hr]
+    '''
+    date = pd.Timestamp(date)
+    key = (date.year, D, fixed, yang_cap, cap, tuple(sorted(kwargs.items())))
+
+    if key not in _ORBITS:
+        temp, cap_t = climate_year(df_we, date.year)
+        _ORBITS[key] = periodic_orbit(temp, cap_t if yang_cap else cap, D = D, fixed = fixed, **kwargs)
+
+    A, Ms = _ORBITS[key]['orbit'][date.dayofyear - 1]
+
+    return [float(A), float(Ms), 0, 0, N - Hi0, 0, Hi0, 0]
@@ -0,0 +1,419 @@
+'''
+Neste .py script está o executor de pipeline da análise que os notebooks repetem de ponta a
+ponta: clima → limpeza → capacidade suporte → parâmetros entomológicos diários → condições
+iniciais → fitting → previsão → gráfico.
+
+Cada etapa de STAGES declara a função que a executa, as etapas de que depende e as chaves
+da configuração que usa. A saída de cada etapa é salva em `cache_dir` com uma chave que é o
+hash do nome da etapa, dos valores dessas chaves e do conteúdo das saídas das etapas de que
+ela depende (as etapas `weather` e `dengue` usam o conteúdo dos arquivos de dados). Assim,
+mudar um valor da configuração só refaz as etapas que usam esse valor e as que dependem
+delas, e uma etapa refeita cuja saída não mudou não invalida as seguintes.
+
+A configuração pode ter uma lista `branches` de ramos (temporadas ou cenários); cada ramo é
+um dict que substitui valores da configuração (por exemplo start_date e end_date). As etapas
+de um mesmo nível do grafo rodam em paralelo entre os ramos, e etapas com a mesma chave em
+ramos diferentes (como a leitura do clima) rodam uma só vez.
+
+Uso:
+    results, log = run_pipeline({'branches': [{'start_date': '2010-01-08', 'end_date': '2010-06-30'},
+                                              {'start_date': '2011-01-01', 'end_date': '2011-06-30'}]},
+                                output = 'resultados/pipeline')
+    results['0']['fit']['params']
+'''
+import os
+import io
+import json
+import time
+import pickle
+import hashlib
+import numpy as np
+import pandas as pd
+from get_data import DATA_DIR, CACHE_DIR, get_weather_data, get_dengue_data
+from edo_model_yang import onto_params, sup_cap_yang, A0, solve_model
+from fitting import PARAM_FIXED, N_FOZ, fit_model
+from panel import SOURCES
+from parallel import map_jobs
+import instrumentation
+
+DEFAULTS = {'data_dir': DATA_DIR, 'start_date': '2010-01-08', 'end_date': '2010-06-30',
+            'horizon': 28, 'k': 7, 'cap_params': {}, 'cap': 'yang', 'fixed': False, 'N': N_FOZ,
+            'Hi0': 2, 'ratio': 2, 'state_method': None, 'backend': 'scipy', 'branches': [{}]}
+
+
+def _file_digest(path):
+
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+
+def load_weather(config):
+    '''
+    Lê os dados de clima locais (`get_weather_data`).
+    '''
+    return get_weather_data(os.path.join(config['data_dir'], SOURCES['weather']))
+
+
+def load_dengue(config):
+    '''
+    Lê os casos de dengue locais (`get_dengue_data`).
+    '''
+    return get_dengue_data(path = os.path.join(config['data_dir'], SOURCES['dengue']))
+
+
+def clean_weather(config, df_we):
+    '''
+    Recorta o clima entre start_date - k e end_date, um dia por linha. Dias repetidos são
+    descartados, dias ausentes recebem os valores do dia anterior (como em
+    `periodic.forcing`) e a temperatura média é arredondada para uma casa decimal, a
+    precisão das tabelas de parâmetros entomológicos.
+    '''
+    days = pd.date_range(pd.Timestamp(config['start_date']) - pd.Timedelta(days = config['k']),
+                         config['end_date'])
+
+    df = df_we[~df_we.index.duplicated()].reindex(days).ffill().bfill()
+    df['temp_mean-celsius'] = df['temp_mean-celsius'].round(1)
+
+    return df
+
+
+def capacity(config, df):
+    '''
+    Capacidade suporte diária do Yang (`sup_cap_yang`) se cap for 'yang'. Caso contrário
+    retorna cap, um número (constante) ou None (a constante `c` é fitada).
+    '''
+    if config['cap'] != 'yang':
+        return config['cap']
+
+    return sup_cap_yang(df.reset_index(drop = True), k = config['k'], **config['cap_params']).to_numpy()
+
+
+def schedule(config, df):
+    '''
+    Parâmetros entomológicos diários (`onto_params`) a partir de start_date.
+    '''
+    temp = df['temp_mean-celsius'].to_numpy()[config['k']:]
+    pars = onto_params(temp, config['fixed'])
+
+    return {name: np.broadcast_to(value, temp.shape).copy() for name, value in pars.items()}
+
+
+def initial(config, df_we, pars):
+    '''
+    Condições iniciais [A, Ms, Me, Mi, Hs, He, Hi, Hr]. Com state_method None, a fase
+    aquática é o equilíbrio livre de doença (`A0`) com os parâmetros entomológicos do
+    primeiro dia; caso contrário os mosquitos são aquecidos até start_date (ver
+    initial_state.py).
+    '''
+    N, Hi0 = config['N'], config['Hi0']
+
+    if config['state_method'] is not None:
+        from initial_state import initial_state
+
+        return initial_state(config['start_date'], df_we, N, Hi0 = Hi0, method = config['state_method'])
+
+    Ms_0 = config['ratio']*N
+    A_0 = A0(Ms_0, gamma_m = pars['gamma_m'][0], mu_m = pars['mu_m'][0], c_m = PARAM_FIXED[5])
+
+    return [float(A_0), Ms_0, 0, 0, N - Hi0, 0, Hi0, 0]
+
+
+def projection(config, df_we):
+    '''
+    Parâmetros entomológicos e capacidade suporte dos `horizon` dias seguintes a end_date,
+    calculados como nas etapas clean, schedule e capacity. Fica separada delas para que
+    mudar o horizonte não refaça o fitting.
+
+    :returns: tuple. (dict de `schedule`, saída de `capacity`)
+    '''
+    end = pd.Timestamp(config['end_date'])
+    config = dict(config, start_date = end + pd.Timedelta(days = 1),
+                  end_date = end + pd.Timedelta(days = config['horizon']))
+
+    df = clean_weather(config, df_we)
+
+    return schedule(config, df), capacity(config, df)
+
+
+def case_data(config, df_cases):
+    '''
+    Casos notificados acumulados entre start_date e end_date.
+    '''
+    dates = pd.date_range(config['start_date'], config['end_date'])
+
+    return np.cumsum(df_cases.notified.reindex(dates).fillna(0).to_numpy())
+
+
+def _window(value, n):
+    # primeiros n dias de uma forçante diária (ou a própria forçante, se constante)
+    if isinstance(value, dict):
+        return {name: v[:n] for name, v in value.items()}
+
+    return value if value is None or np.ndim(value) == 0 else value[:n]
+
+
+def fit(config, data, pars, cap, y0):
+    '''
+    Fita b, beta (e c, se cap for None) aos casos acumulados (`fit_model`).
+
+    :returns: dict com `params`, `chisqr`, `nfev` e `success`.
+    '''
+    n = len(data)
+
+    out = fit_model(np.arange(n), data, y0, temp = _window(pars, n), cap = _window(cap, n),
+                    fixed = config['fixed'], backend = config['backend'])
+
+    return {'params': out.params.valuesdict(), 'chisqr': out.chisqr, 'nfev': out.nfev,
+            'success': out.success}
+
+
+def forecast(config, res, pars, cap, proj, y0):
+    '''
+    Simula o modelo fitado de start_date até end_date + horizon.
+
+    :returns: pd.DataFrame com `date`, `cases` (acumulados), `incidence` e `fitted` (True
+              nos dias usados no fitting).
+    '''
+    dates = pd.date_range(config['start_date'],
+                          pd.Timestamp(config['end_date']) + pd.Timedelta(days = config['horizon']))
+    p = res['params']
+
+    pars = {name: np.concatenate([pars[name], proj[0][name]]) for name in pars}
+    if cap is None:
+        cap = p['c']
+    elif np.ndim(cap) > 0:
+        cap = np.concatenate([cap, proj[1]])
+
+    cases, incidence = solve_model(np.arange(len(dates)), y0, (p['b'], p['beta']), PARAM_FIXED, pars,
+                                   cap, config['fixed'],
+                                   outputs = ['cases', 'incidence'], backend = config['backend'])
+
+    return pd.DataFrame({'date': dates, 'cases': cases, 'incidence': incidence,
+                         'fitted': dates <= pd.Timestamp(config['end_date'])})
+
+
+def plot(config, data, df):
+    '''
+    Gráfico dos casos acumulados observados e do modelo fitado com a previsão.
+
+    :returns: bytes. Imagem PNG.
+    '''
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    ax.plot(df.date, df.cases, color = 'blue', label = 'Modelo')
+    ax.scatter(df.date[:len(data)], data, color = 'black', s = 5, label = 'Dados')
+    ax.axvline(pd.Timestamp(config['end_date']), color = 'gray', ls = '--')
+    ax.set_ylabel('Casos acumulados')
+    ax.grid()
+    ax.legend()
+    fig.autofmt_xdate()
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format = 'png', dpi = 100)
+    plt.close(fig)
+
+    return buf.getvalue()
+
+
+# etapas do pipeline, em ordem topológica: função, etapas de entrada e chaves da configuração
+STAGES = {
+    'weather': {'func': load_weather, 'inputs': [], 'keys': ['data_dir']},
+    'dengue': {'func': load_dengue, 'inputs': [], 'keys': ['data_dir']},
+    'clean': {'func': clean_weather, 'inputs': ['weather'], 'keys': ['start_date', 'end_date', 'k']},
+    'capacity': {'func': capacity, 'inputs': ['clean'], 'keys': ['cap', 'k', 'cap_params']},
+    'schedule': {'func': schedule, 'inputs': ['clean'], 'keys': ['k', 'fixed']},
+    'initial': {'func': initial, 'inputs': ['weather', 'schedule'],
+                'keys': ['start_date', 'N', 'Hi0', 'ratio', 'state_method']},
+    'data': {'func': case_data, 'inputs': ['dengue'], 'keys': ['start_date', 'end_date']},
+    'fit': {'func': fit, 'inputs': ['data', 'schedule', 'capacity', 'initial'], 'keys': ['fixed', 'backend']},
+    'projection': {'func': projection, 'inputs': ['weather'],
+                   'keys': ['end_date', 'horizon', 'k', 'cap', 'cap_params', 'fixed']},
+    'forecast': {'func': forecast, 'inputs': ['fit', 'schedule', 'capacity', 'projection', 'initial'],
+                 'keys': ['start_date', 'end_date', 'horizon', 'fixed', 'backend']},
+    'plot': {'func': plot, 'inputs': ['data', 'forecast'], 'keys': ['end_date']},
+}
+
+
+def _levels(stages):
+    # agrupa as etapas em níveis: cada etapa fica um nível depois da sua última entrada
+    level = {}
+    for name, stage in stages.items():
+        level[name] = 1 + max([level[i] for i in stage['inputs']], default = -1)
+
+    return [[name for name in stages if level[name] == lv] for lv in range(max(level.values()) + 1)]
+
+
+def _path(cache_dir, name, key):
+
+    return os.path.join(cache_dir, f'{name}-{key}.pkl')
+
+
+def stage_key(name, config, digests):
+    '''
+    Chave de cache de uma etapa.
+
+    :params name: string. Nome da etapa em STAGES.
+    :params config: dict. Configuração do ramo.
+    :params digests: list. Hash das saídas das etapas de entrada, na ordem de `inputs`.
+
+    :returns: string.
+    '''
+    stage = STAGES[name]
+    values = {key: config[key] for key in stage['keys']}
+
+    if not stage['inputs']:
+        values['files'] = [_file_digest(os.path.join(config['data_dir'], SOURCES[name]))]
+
+    h = hashlib.sha1(name.encode())
+    h.update(json.dumps(values, sort_keys = True, default = str).encode())
+    for d in digests:
+        h.update(d.encode())
+
+    return h.hexdigest()
+
+
+def _load(path):
+
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _digest(path):
+    # hash do conteúdo da saída salva, usado nas chaves das etapas seguintes
+    with open(path + '.sha1') as f:
+        return f.read()
+
+
+def _run_stage(job, cache_dir):
+
+    name, key, config, input_keys = job
+    stage = STAGES[name]
+    inputs = [_load(_path(cache_dir, i, k)) for i, k in zip(stage['inputs'], input_keys)]
+
+    t0 = time.perf_counter()
+
+    with instrumentation.stage(f'pipeline.{name}', key = key):
+        value = stage['func'](config, *inputs)
+
+    seconds = time.perf_counter() - t0
+
+    data = pickle.dumps(value, protocol = pickle.HIGHEST_PROTOCOL)
+    path = _path(cache_dir, name, key)
+
+    # escrita atômica: outro processo pode estar lendo ou escrevendo a mesma etapa
+    for file, content in [(path, data), (path + '.sha1', hashlib.sha1(data).hexdigest().encode())]:
+        tmp = f'{file}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(content)
+        os.replace(tmp, file)
+
+    return seconds
+
+
+def branch_configs(config):
+    '''
+    Retorna {nome do ramo: configuração completa do ramo}. O nome é a chave `name` do ramo
+    ou a sua posição em `branches`.
+    '''
+    unknown = sorted(set(config) - set(DEFAULTS))
+    if unknown:
+        raise ValueError(f'chaves desconhecidas: {unknown}')
+
+    base = {**DEFAULTS, **config}
+    branches = {}
+
+    for i, branch in enumerate(base.pop('branches')):
+        branch = dict(branch)
+        name = str(branch.pop('name', i))
+
+        unknown = sorted(set(branch) - set(base))
+        if unknown:
+            raise ValueError(f'chaves desconhecidas no ramo {name}: {unknown}')
+
+        branches[name] = {**base, **branch}
+
+    return branches
+
+
+def run_pipeline(config, workers = None, cache_dir = None, output = None, targets = ('fit', 'forecast', 'plot'),
+                 refresh = False):
+    '''
+    Executa o pipeline para todos os ramos da configuração, reaproveitando as etapas salvas.
+
+    :params config: dict. Valores que substituem DEFAULTS, incluindo a lista `branches`.
+    :params workers: int or None. Número de processos. Se 1, executa no processo atual.
+    :params cache_dir: string or None. Diretório das saídas das etapas. Se None, usa
+                       CACHE_DIR/pipeline.
+    :params output: string or None. Se fornecido, salva em output/<ramo>/ os parâmetros
+                    fitados (fit.json), a previsão (forecast.csv) e o gráfico (plot.png).
+    :params targets: list. Etapas cujas saídas são retornadas.
+    :params refresh: boolean. Se True, todas as etapas são refeitas.
+
+    :returns: tuple. ({ramo: {etapa: saída}} para as etapas de targets, pd.DataFrame com
+              `stage`, `branch`, `key`, `status` e `seconds`). status é 'run' no ramo que
+              executou a etapa (o único com seconds > 0), 'shared' nos outros ramos com a
+              mesma chave e 'cached' quando a saída já estava salva.
+    '''
+    cache_dir = os.path.join(CACHE_DIR, 'pipeline') if cache_dir is None else cache_dir
+    os.makedirs(cache_dir, exist_ok = True)
+
+    branches = branch_configs(config)
+    keys = {b: {} for b in branches}
+    log = []
+
+    for level in _levels(STAGES):
+        jobs = {}
+
+        for b, cfg in branches.items():
+            for name in level:
+                inputs = STAGES[name]['inputs']
+                digests = [_digest(_path(cache_dir, i, keys[b][i])) for i in inputs]
+                key = stage_key(name, cfg, digests)
+                keys[b][name] = key
+
+                # a etapa roda no primeiro ramo em que aparece; os demais ramos com a mesma
+                # chave usam a mesma saída
+                if not refresh and os.path.exists(_path(cache_dir, name, key) + '.sha1'):
+                    status = 'cached'
+                elif (name, key) in jobs:
+                    status = 'shared'
+                else:
+                    status = 'run'
+                    jobs[(name, key)] = (name, key, cfg, [keys[b][i] for i in inputs])
+
+                log.append({'stage': name, 'branch': b, 'key': key, 'status': status, 'seconds': 0.0})
+
+        seconds = dict(zip(jobs, map_jobs(_run_stage, list(jobs.values()), workers, cache_dir)))
+
+        for row in log:
+            if row['status'] == 'run':
+                row['seconds'] = seconds.get((row['stage'], row['key']), row['seconds'])
+
+    results = {b: {name: _load(_path(cache_dir, name, keys[b][name])) for name in targets} for b in branches}
+
+    if output is not None:
+        for b in branches:
+            _write_branch(os.path.join(output, b), {name: _load(_path(cache_dir, name, keys[b][name]))
+                                                    for name in ['fit', 'forecast', 'plot']})
+
+    return results, pd.DataFrame(log)
+
+
+def _write_branch(path, res):
+
+    os.makedirs(path, exist_ok = True)
+
+    with open(os.path.join(path, 'fit.json'), 'w') as f:
+        json.dump(res['fit'], f, indent = 2, default = float)
+
+    res['forecast'].to_csv(os.path.join(path, 'forecast.csv'), index = False)
+
+    with open(os.path.join(path, 'plot.png'), 'wb') as f:
+        f.write(res['plot'])
@@ -0,0 +1,365 @@
+'''
+Neste .py script está o armazenamento em disco dos resultados das simulações, para que as
+trajetórias de ensembles e varreduras não fiquem só na memória dos notebooks.
+
+Um store é um diretório com:
+
+    * store.json: nomes das variáveis (compartimentos ou saídas de `model_outputs`), número
+      de dias, data do primeiro dia, dtype, compressão e tamanho dos blocos;
+    * runs/<run>/: uma pasta por execução (run) adicionada com `ResultStore.append`, com
+      um arquivo por variável com as trajetórias de todos os membros da execução
+      (n_membros, n_dias), a tabela `members` com os parâmetros de cada membro e o meta.json
+      com os metadados da execução;
+    * summary.parquet: resumo por membro, escrito por `ResultStore.write_summary`.
+
+Sem compressão, cada variável de uma execução é um único .npy (n_membros, n_dias) lido com
+memory map, de modo que só as linhas pedidas saem do disco. Com compression = 'zlib', cada
+variável é dividida ao longo dos membros em blocos (chunks) de no máximo `chunk` membros
+(<variável>.<bloco>.npz), e cada leitura descomprime apenas os blocos que contêm os membros
+pedidos. Ler uma variável de todos os membros (`ResultStore.variable`) abre só os arquivos
+dessa variável, e ler todas as variáveis de um membro (`ResultStore.member`) descomprime só
+o bloco do membro em cada variável.
+
+Cada execução é escrita em uma pasta temporária e renomeada ao final, de forma que vários
+processos podem adicionar execuções ao mesmo store ao mesmo tempo, sem travas, e os leitores
+nunca veem uma execução incompleta. Os membros são numerados na ordem dos nomes das
+execuções (por padrão, o instante da criação).
+
+Uso:
+    store = ResultStore.create('resultados/ensemble', COMPARTMENTS, days = 175, start_date = '2010-01-08')
+    store.append(solve_ensemble(t, y0s, param_fits, ...), members = {'b': bs, 'beta': betas})
+    Hi = store.variable('Hi')        # (n_membros, 175)
+    x = store.member(10)             # (8, 175)
+'''
+import os
+import json
+import time
+import shutil
+import numpy as np
+import pandas as pd
+
+COMPRESSION = [None, 'zlib']
+
+# membros por bloco comprimido: ler um membro descomprime no máximo CHUNK × n_dias valores
+CHUNK = 64
+
+
+def _write_table(df, path):
+    # parquet quando houver pyarrow/fastparquet, senão csv
+    try:
+        df.to_parquet(path + '.parquet', index = False)
+    except ImportError:
+        df.to_csv(path + '.csv', index = False)
+
+
+def _read_table(path):
+
+    if os.path.exists(path + '.parquet'):
+        return pd.read_parquet(path + '.parquet')
+
+    return pd.read_csv(path + '.csv')
+
+
+class ResultStore:
+    '''
+    Store de trajetórias (membro × variável × dia) em disco.
+
+    :params path: string. Diretório criado por `ResultStore.create`.
+    '''
+
+    def __init__(self, path):
+
+        self.path = path
+
+        with open(os.path.join(path, 'store.json')) as f:
+            self.meta = json.load(f)
+
+        self.variables = self.meta['variables']
+        self.days = self.meta['days']
+        self._var = {name: i for i, name in enumerate(self.variables)}
+
+        self.refresh()
+
+    @classmethod
+    def create(cls, path, variables, days, start_date = None, dtype = 'float32', compression = 'zlib',
+               chunk = CHUNK, exist_ok = True):
+        '''
+        Cria um store vazio (ou abre o existente, se exist_ok for True e a configuração for
+        a mesma).
+
+        :params variables: list. Nomes das variáveis, por exemplo COMPARTMENTS ou saídas de
+                           `model_outputs`.
+        :params days: int. Número de dias de cada trajetória.
+        :params start_date: string or None. Data do primeiro dia.
+        :params dtype: string. Tipo dos valores salvos.
+        :params compression: None ou 'zlib'. Sem compressão as leituras usam memory map.
+        :params chunk: int. Número máximo de membros por bloco comprimido (ignorado sem
+                       compressão).
+        '''
+        if compression not in COMPRESSION:
+            raise ValueError(f'compression deve ser um de {COMPRESSION}.')
+
+        if compression is not None and int(chunk) < 1:
+            raise ValueError('chunk deve ser positivo.')
+
+        meta = {'variables': list(variables), 'days': int(days), 'start_date': start_date,
+                'dtype': str(np.dtype(dtype)), 'compression': compression,
+                'chunk': None if compression is None else int(chunk)}
+
+        file = os.path.join(path, 'store.json')
+
+        if os.path.exists(file):
+            with open(file) as f:
+                old = json.load(f)
+
+            if not exist_ok or old != meta:
+                raise ValueError(f'já existe um store diferente em {path}.')
+        else:
+            os.makedirs(os.path.join(path, 'runs'), exist_ok = True)
+
+            tmp = f'{file}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(meta, f, indent = 2)
+            os.replace(tmp, file)
+
+        return cls(path)
+
+    def refresh(self):
+        '''
+        Atualiza a lista de execuções (por exemplo depois de outros processos adicionarem
+        execuções).
+        '''
+        runs_dir = os.path.join(self.path, 'runs')
+        names = sorted(r for r in os.listdir(runs_dir) if not r.startswith('.'))
+
+        self._runs = []
+        for name in names:
+            with open(os.path.join(runs_dir, name, 'meta.json')) as f:
+                self._runs.append(json.load(f))
+
+        sizes = [r['n_members'] for r in self._runs]
+        self._offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(int)
+
+    def __len__(self):
+
+        return int(self._offsets[-1])
+
+    @property
+    def dates(self):
+
+        if self.meta['start_date'] is None:
+            return None
+
+        return pd.date_range(self.meta['start_date'], periods = self.days)
+
+    def append(self, values, members = None, meta = None, run = None):
+        '''
+        Adiciona uma execução ao store. Pode ser chamado por vários processos ao mesmo tempo.
+
+        :params values: array. Trajetórias (n_membros, n_variáveis, n_dias), como a saída de
+                        `solve_ensemble`, ou (n_variáveis, n_dias) para um único membro.
+        :params members: dict, pd.DataFrame or None. Parâmetros de cada membro (uma linha
+                         por membro, na ordem de values; o índice de um DataFrame é
+                         ignorado). Valores escalares de um dict valem para todos os membros.
+        :params meta: dict or None. Metadados da execução (precisam ser serializáveis em JSON).
+        :params run: string or None. Nome da execução. Se None, usa o instante atual e o pid.
+
+        :returns: string. Nome da execução.
+        '''
+        values = np.asarray(values)
+        if values.ndim == 2:
+            values = values[None]
+
+        n = values.shape[0]
+
+        if values.shape[1:] != (len(self.variables), self.days):
+            raise ValueError(f'values deve ter dimensão (n_membros, {len(self.variables)}, {self.days}).')
+
+        if isinstance(members, dict):
+            members = {k: np.full(n, v) if np.ndim(v) == 0 else np.asarray(v)
+                       for k, v in members.items()}
+
+        if members is None or len(members) == 0:
+            members = pd.DataFrame(index = range(n))
+        else:
+            members = pd.DataFrame(members).reset_index(drop = True)
+
+        if len(members) != n:
+            raise ValueError(f'members deve ter uma linha por membro ({n}), não {len(members)}.')
+
+        if run is None:
+            run = f'{time.time_ns():020d}-{os.getpid()}'
+
+        final = os.path.join(self.path, 'runs', run)
+        if os.path.exists(final):
+            raise ValueError(f'a execução {run} já existe.')
+
+        tmp = os.path.join(self.path, 'runs', f'.{run}.tmp')
+        os.makedirs(tmp)
+
+        dtype = np.dtype(self.meta['dtype'])
+
+        for k, name in enumerate(self.variables):
+            block = np.ascontiguousarray(values[:, k], dtype = dtype)
+
+            if self.meta['compression'] is None:
+                np.save(os.path.join(tmp, f'{name}.npy'), block)
+                continue
+
+            chunk = self.meta['chunk']
+            for c in range(0, max(n, 1), chunk):
+                np.savez_compressed(os.path.join(tmp, f'{name}.{c // chunk:05d}.npz'),
+                                    values = block[c:c + chunk])
+
+        _write_table(members, os.path.join(tmp, 'members'))
+
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({'run': run, 'n_members': n, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'pid': os.getpid(), **(meta or {})}, f, indent = 2, default = str)
+
+        os.rename(tmp, final)
+        self.refresh()
+
+        return run
+
+    def append_solutions(self, results, members = None, meta = None, run = None):
+        '''
+        Adiciona uma execução a partir de uma lista de saídas do `solve_model` com
+        outputs = None (OdeResult), uma por membro. As variáveis do store devem ser
+        compartimentos ou saídas de `model_outputs`.
+        '''
+        from edo_model_yang import model_outputs
+
+        values = np.stack([model_outputs(r.y, self.variables) for r in results])
+
+        return self.append(values, members = members, meta = meta, run = run)
+
+    def runs(self):
+        '''
+        Retorna os metadados das execuções, um por linha, com `first_member`.
+        '''
+        df = pd.DataFrame(self._runs)
+        df['first_member'] = self._offsets[:-1]
+
+        return df
+
+    def members(self):
+        '''
+        Retorna a tabela de parâmetros de todos os membros, com `member`, `run` e
+        `run_member` (posição do membro na execução).
+        '''
+        frames = []
+        for r, first in zip(self._runs, self._offsets):
+            df = _read_table(os.path.join(self.path, 'runs', r['run'], 'members'))
+            df.insert(0, 'run_member', np.arange(r['n_members']))
+            df.insert(0, 'run', r['run'])
+            df.insert(0, 'member', first + np.arange(r['n_members']))
+            frames.append(df)
+
+        return pd.concat(frames, ignore_index = True) if frames else pd.DataFrame()
+
+    def _read(self, run, name, pos, days):
+        # linhas pos de uma variável em uma execução, abrindo só os blocos que as contêm
+        path = os.path.join(self.path, 'runs', run, name)
+
+        if self.meta['compression'] is None:
+            return np.load(path + '.npy', mmap_mode = 'r')[pos][:, days]
+
+        chunk = self.meta['chunk']
+        out = np.empty((len(pos), len(np.arange(self.days)[days])), dtype = self.meta['dtype'])
+
+        for c in np.unique(pos // chunk):
+            sel = pos // chunk == c
+            with np.load(f'{path}.{c:05d}.npz') as f:
+                out[sel] = f['values'][pos[sel] - c * chunk][:, days]
+
+        return out
+
+    def _locate(self, members):
+        # execução e posição na execução de cada membro
+        members = np.asarray(members, dtype = int)
+
+        if np.any((members < 0) | (members >= len(self))):
+            raise IndexError('membro fora do store.')
+
+        run = np.searchsorted(self._offsets, members, side = 'right') - 1
+
+        return run, members - self._offsets[run]
+
+    def variable(self, name, members = None, days = slice(None)):
+        '''
+        Lê uma variável para vários membros.
+
+        :params name: string. Nome da variável.
+        :params members: list or None. Membros lidos. Se None, todos.
+        :params days: slice or array. Dias lidos.
+
+        :returns: array (n_membros, n_dias).
+        '''
+        if name not in self._var:
+            raise KeyError(f'{name} não está no store: {self.variables}')
+
+        members = np.arange(len(self)) if members is None else np.atleast_1d(members)
+        run, pos = self._locate(members)
+
+        out = np.empty((len(members), len(np.arange(self.days)[days])), dtype = self.meta['dtype'])
+
+        for r in np.unique(run):
+            sel = run == r
+            out[sel] = self._read(self._runs[r]['run'], name, pos[sel], days)
+
+        return out
+
+    def member(self, member, variables = None, days = slice(None)):
+        '''
+        Lê todas as variáveis (ou as de `variables`) de um membro.
+
+        :returns: array (n_variáveis, n_dias).
+        '''
+        variables = self.variables if variables is None else list(variables)
+        run, pos = self._locate([member])
+        name = self._runs[run[0]]['run']
+
+        return np.stack([self._read(name, v, pos, days)[0] for v in variables])
+
+    def summary(self):
+        '''
+        Resumo por membro: parâmetros (`members`) e, para cada variável, o valor final, o
+        maior valor e o dia do maior valor. As variáveis são lidas uma de cada vez.
+
+        :returns: pd.DataFrame.
+        '''
+        df = self.members()
+
+        for name in self.variables:
+            x = self.variable(name)
+            df[f'{name}_final'] = x[:, -1]
+            df[f'{name}_max'] = x.max(axis = 1)
+            df[f'{name}_peak_day'] = x.argmax(axis = 1)
+
+        return df
+
+    def write_summary(self):
+        '''
+        Salva `summary` em summary.parquet (ou summary.csv sem pyarrow) no diretório do store.
+
+        :returns: pd.DataFrame.
+        '''
+        df = self.summary()
+        _write_table(df, os.path.join(self.path, 'summary'))
+
+        return df
+
+    def remove(self, run):
+        '''
+        Remove uma execução do store.
+        '''
+        shutil.rmtree(os.path.join(self.path, 'runs', run))
+        self.refresh()
+
+
+def open_store(path):
+    '''
+    Abre um store criado por `ResultStore.create`.
+    '''
+    return ResultStore(path)
@@ -0,0 +1,137 @@
+'''
+Neste .py script estão as estimativas do número de reprodução da dengue:
+
+    * `estimate_rt`: número de reprodução efetivo (Rt) estimado a partir dos casos diários
+      com a equação de renovação (Cori et al., 2013). As somas em cada janela são calculadas
+      com somas acumuladas e os quantis da posterior gama são calculados para todas as
+      janelas de uma só vez.
+    * `r0_temperature`: R0(t) mecanístico do modelo do Yang, calculado a partir dos
+      parâmetros entomológicos de cada dia (ver `onto_params` e `R_m`).
+'''
+import numpy as np
+import pandas as pd
+from scipy import stats
+from edo_model_yang import onto_params, R_m, MU_H, K, C_A, C_M, THETA_H, ALPHA_H, D
+
+# intervalo serial da dengue: incubação intrínseca (~6 dias) + incubação extrínseca e
+# período infeccioso do mosquito, resultando em uma média de ~16 dias
+SI_MEAN = 16.0
+SI_SD = 5.0
+
+
+def serial_interval(mean = SI_MEAN, sd = SI_SD, max_days = 40):
+    '''
+    Discretiza um intervalo serial com distribuição gama.
+
+    :params mean: float. Média do intervalo serial em dias.
+    :params sd: float. Desvio padrão do intervalo serial em dias.
+    :params max_days: int. Maior intervalo considerado.
+
+    :returns: array w com w[s] = P(intervalo serial = s), s = 0, ..., max_days e w[0] = 0.
+    '''
+    shape = (mean/sd)**2
+    scale = sd**2/mean
+
+    cdf = stats.gamma.cdf(np.arange(0.5, max_days + 1.5), shape, scale = scale)
+
+    w = np.diff(cdf, prepend = 0.0)
+    w[0] = 0.0
+
+    return w/w.sum()
+
+
+def infection_pressure(cases, w):
+    '''
+    Calcula Lambda_t = sum_s w_s I_{t-s} para todos os dias.
+
+    :params cases: array. Casos diários.
+    :params w: array. Intervalo serial discretizado (ver `serial_interval`).
+
+    :returns: array com a dimensão de cases.
+    '''
+    cases = np.asarray(cases, dtype = float)
+
+    return np.convolve(cases, w)[:len(cases)]
+
+
+def estimate_rt(cases, window = 7, w = None, a = 1.0, b = 5.0, quantiles = (0.025, 0.5, 0.975)):
+    '''
+    Estima o Rt em janelas deslizantes de `window` dias terminando em cada dia.
+
+    A posterior de Rt na janela (t - window, t] é Gama(a + sum I, 1/(1/b + sum Lambda)).
+
+    :params cases: array or pd.Series. Casos diários (por exemplo `notified` ou `probable`
+                   de get_dengue_data(mean = False)).
+    :params window: int. Tamanho da janela em dias.
+    :params w: array or None. Intervalo serial. Se None, usa `serial_interval()`.
+    :params a: float. Parâmetro de forma da priori gama.
+    :params b: float. Parâmetro de escala da priori gama.
+    :params quantiles: tuple. Quantis da posterior que serão retornados.
+
+    :returns: pd.DataFrame com as colunas `mean`, `std` e um coluna por quantil. Os primeiros
+              window - 1 dias e os dias sem casos na janela do intervalo serial ficam com NaN.
+    '''
+    index = cases.index if isinstance(cases, pd.Series) else None
+    cases = np.nan_to_num(np.asarray(cases, dtype = float))
+
+    if w is None:
+        w = serial_interval()
+
+    lam = infection_pressure(cases, w)
+
+    # somas nas janelas a partir das somas acumuladas
+    def window_sum(x):
+        acum = np.concatenate([[0.0], np.cumsum(x)])
+        out = np.full(len(x), np.nan)
+        out[window - 1:] = acum[window:] - acum[:-window]
+        return out
+
+    shape = a + window_sum(cases)
+    rate = 1/b + window_sum(lam)
+    scale = 1/rate
+
+    shape[window_sum(lam) <= 0] = np.nan
+
+    res = {'mean': shape*scale, 'std': np.sqrt(shape)*scale}
+
+    for q in quantiles:
+        res[f'q{q:g}'] = stats.gamma.ppf(q, shape, scale = scale)
+
+    return pd.DataFrame(res, index = index)
+
+
+def r0_temperature(temp, b, beta, cap = 1, N = 256088, fixed = False, D = D, k = K,
+                   c_a = C_A, c_m = C_M, theta_h = THETA_H, alpha_h = ALPHA_H, mu_h = MU_H):
+    '''
+    R0(t) mecanístico do modelo do Yang para cada temperatura, supondo a população de
+    mosquitos no ponto de equilíbrio livre de doença do dia.
+
+    No equilíbrio, A = C*(1 - 1/R_m) e Ms = gamma_m*A/(mu_m + c_m), e
+
+        R0^2 = (b*beta)^2 * (Ms/H) * theta_m/(theta_m + mu_m) * 1/mu_m
+                          * theta_h/(theta_h + mu_h) * 1/(alpha_h + mu_h)
+
+    onde mu_m inclui o controle c_m. Dias com R_m <= 1 têm R0 = 0.
+
+    :params temp: array. Temperaturas médias diárias.
+    :params b: float. Taxa de picadas.
+    :params beta: float. Probabilidade de transmissão.
+    :params cap: float or array. Capacidade suporte em unidades de 10**D (como em `C`).
+    :params N: int. População humana.
+    :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos.
+
+    :returns: array com a dimensão de temp.
+    '''
+    p = onto_params(temp, fixed)
+
+    Rm = R_m(k, p['d'], p['gamma_m'], p['mu_m'], p['mu_a'], c_m = c_m, c_a = c_a)
+
+    mu_m = p['mu_m'] + c_m
+
+    A = (10**D)*np.asarray(cap)*np.clip(1 - 1/Rm, 0, None)
+    Ms = p['gamma_m']*A/mu_m
+
+    R0_sq = ((b*beta)**2*(Ms/N)*p['theta_m']/(p['theta_m'] + mu_m)/mu_m
+             *theta_h/(theta_h + mu_h)/(alpha_h + mu_h))
+
+    return np.sqrt(R0_sq)
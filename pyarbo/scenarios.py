@@ -0,0 +1,277 @@
+'''
+Neste .py script está o executor de cenários de clima. Cada cenário parte de um ano de clima
+e aplica:
+
+    * um aquecimento (°C) somado às temperaturas mínima e média;
+    * um fator multiplicando a chuva diária;
+    * o ano de clima pode ser um ano observado em `weather-2010_2022.csv` ou um ano sintético,
+      montado por bootstrap em blocos de dias consecutivos: cada bloco do ano sintético é
+      copiado da mesma posição do calendário de um ano observado sorteado.
+
+A forçante de todos os cenários é montada em arrays (n_cenários, n_dias), e os parâmetros
+entomológicos (`onto_params`) e a capacidade suporte do Yang (`sup_cap_yang_array`) são
+calculados de uma só vez. As simulações rodam em paralelo em lotes (chunks) de cenários; o
+resumo de cada cenário vai para `summary.csv` e as trajetórias de cada lote são salvas como
+uma execução de um store comprimido (ver results.py e `read_trajectories`).
+'''
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from get_data import DATA_DIR, get_weather_data
+from edo_model_yang import (onto_params, sup_cap_yang_array, solve_model, model_outputs,
+                            daily_value, ONTO_NAMES)
+from periodic import equilibrium_guess
+from suitability import offspring_number
+from rt import r0_temperature
+from fitting import PARAM_FIXED, N_FOZ
+from results import ResultStore
+
+# colunas de clima usadas na forçante
+FORCING_COLS = ['temp_min-celsius', 'temp_mean-celsius', 'daily_precipitation-mm']
+
+DAYS = 365
+
+
+def weather_calendar(df_we = None):
+    '''
+    Organiza os dados de clima em um array (n_anos, 365, 3) com as colunas de FORCING_COLS.
+    O dia 29/02 é removido e os dias ausentes recebem o valor do dia anterior. Apenas anos
+    completos são usados.
+
+    :params df_we: pd.DataFrame or None. Dados de clima. Se None, lê o arquivo local.
+
+    :returns: tuple. (anos, array)
+    '''
+    if df_we is None:
+        df_we = get_weather_data(os.path.join(DATA_DIR, 'weather-2010_2022.csv'))
+
+    df = df_we[~df_we.index.duplicated()]
+    years = [y for y in np.unique(df.index.year)
+             if df.index.min() <= pd.Timestamp(f'{y}-01-01') and df.index.max() >= pd.Timestamp(f'{y}-12-31')]
+
+    days = pd.date_range(f'{years[0]}-01-01', f'{years[-1]}-12-31')
+    df = df.reindex(days)[FORCING_COLS].ffill().bfill()
+    df = df[~((df.index.month == 2) & (df.index.day == 29))]
+
+    return np.array(years), df.to_numpy().reshape(len(years), DAYS, len(FORCING_COLS))
+
+
+def scenario_grid(warming = (0.0,), rain_scale = (1.0,), years = (), n_bootstrap = 0, seed = 0):
+    '''
+    Retorna a lista de cenários com todas as combinações de aquecimento, fator de chuva e
+    ano de clima (anos observados e n_bootstrap anos sintéticos).
+
+    :params warming: list. Aquecimentos em °C.
+    :params rain_scale: list. Fatores da chuva.
+    :params years: list. Anos observados.
+    :params n_bootstrap: int. Número de anos sintéticos.
+    :params seed: int. Semente do primeiro ano sintético (os demais usam seed + 1, ...).
+
+    :returns: list of dict com `scenario`, `warming`, `rain_scale`, `year` e `bootstrap`
+              (semente do ano sintético ou -1 para anos observados).
+    '''
+    climates = [(y, -1) for y in years] + [(-1, seed + i) for i in range(n_bootstrap)]
+
+    return [{'scenario': i, 'warming': float(dt), 'rain_scale': float(rs), 'year': int(y),
+             'bootstrap': int(b)}
+            for i, (dt, rs, (y, b)) in enumerate((dt, rs, c) for c in climates
+                                                 for dt in warming for rs in rain_scale)]
+
+
+def _source_index(scenario, years, k, block):
+    # índices (no calendário contínuo de anos) dos k dias anteriores e dos dias do ano
+
+    n_years = len(years)
+
+    if scenario['bootstrap'] < 0:
+        y = np.full(DAYS, np.searchsorted(years, scenario['year']))
+    else:
+        rng = np.random.default_rng(scenario['bootstrap'])
+        n_blocks = -(-DAYS//block)
+        y = np.repeat(rng.integers(0, n_years, n_blocks), block)[:DAYS]
+
+    idx = y*DAYS + np.arange(DAYS)
+
+    # os dias anteriores seguem o ano do primeiro bloco (o primeiro ano repete seus dias)
+    prelude = idx[0] - np.arange(k, 0, -1)
+    prelude[prelude < 0] = np.arange(k)[prelude < 0]
+
+    return np.concatenate([prelude, idx])
+
+
+def build_forcing(scenarios, df_we = None, k = 7, block = 30, fixed = False, **kwargs_cap):
+    '''
+    Calcula a forçante de todos os cenários.
+
+    :params scenarios: list of dict. Saída de `scenario_grid`.
+    :params df_we: pd.DataFrame or None. Dados de clima (ver `weather_calendar`).
+    :params k: int. Número de dias anteriores usados na capacidade suporte.
+    :params block: int. Tamanho dos blocos do bootstrap em dias.
+    :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos.
+    :params kwargs_cap: demais parâmetros de `sup_cap_yang_array`.
+
+    :returns: dict com `temp`, `rain` e `cap` (arrays (n_cenários, 365)) e `onto` (dict com
+              um array (n_cenários, 365) para cada nome de ONTO_NAMES).
+    '''
+    years, calendar = weather_calendar(df_we)
+    flat = calendar.reshape(-1, len(FORCING_COLS))
+
+    idx = np.stack([_source_index(s, years, k, block) for s in scenarios])
+    warming = np.array([s['warming'] for s in scenarios])[:, None]
+    rain_scale = np.array([s['rain_scale'] for s in scenarios])[:, None]
+
+    t_min = flat[idx, 0] + warming
+    t_mean = flat[idx, 1] + warming
+    rain = flat[idx, 2]*rain_scale
+
+    cap = sup_cap_yang_array(rain, t_min, t_mean, k = k, **kwargs_cap)
+    temp = np.round(t_mean[:, k:], 1)
+
+    return {'temp': temp, 'rain': rain[:, k:], 'cap': cap, 'onto': onto_params(temp, fixed)}
+
+
+def _daily_control(par, name):
+    # esforço de controle de cada dia do ano (C_A e C_M podem ser séries diárias, ver control.py)
+    if np.ndim(par) == 0:
+        return float(par)
+
+    par = np.asarray(par, dtype = float)
+    if par.ndim != 1 or len(par) < DAYS:
+        raise ValueError(f'{name} deve ser um número ou uma série com pelo menos {DAYS} valores diários.')
+
+    return par[:DAYS]
+
+
+def _run_chunk(chunk, forcing, param_fit, fixed, N, Hi0, outputs, param_fixed):
+
+    MU_H, THETA_H, ALPHA_H, K, C_A, C_M, D = param_fixed
+    t = np.arange(DAYS)
+
+    c_a = _daily_control(C_A, 'C_A')
+    c_m = _daily_control(C_M, 'C_M')
+
+    rows = []
+    traj = np.zeros((len(chunk), len(outputs), DAYS), dtype = np.float32)
+    b, beta = param_fit
+
+    for j, i in enumerate(chunk):
+        pars = {name: forcing['onto'][name][i] for name in ONTO_NAMES}
+        cap = forcing['cap'][i]
+
+        # mosquitos no equilíbrio livre de doença do clima do cenário, com o controle do dia 0
+        A, Ms = equilibrium_guess(pars, (10**D)*cap, K, daily_value(0, c_a), daily_value(0, c_m))
+        y0 = [A, Ms, 0, 0, N - Hi0, 0, Hi0, 0]
+
+        r = solve_model(t, y0, param_fit, param_fixed, pars, cap, fixed)
+
+        model_outputs(r.y, outputs, out = traj[j])
+        y = model_outputs(r.y, ['cases', 'incidence'])
+
+        temp = forcing['temp'][i]
+        Rm = offspring_number(temp, K, c_m, c_a, fixed)
+        R0 = r0_temperature(temp, b, beta, cap = cap, N = N, fixed = fixed, D = D)
+
+        rows.append({'scenario': int(i), 'final_cases': float(y[0, -1]),
+                     'attack_rate': float(y[0, -1]/N), 'peak_day': int(np.argmax(y[1])),
+                     'peak_incidence': float(y[1].max()), 'mean_temp': float(temp.mean()),
+                     'total_rain': float(forcing['rain'][i].sum()), 'mean_cap': float(cap.mean()),
+                     'suitable_days': int(np.sum(Rm > 1)), 'mean_R0': float(R0.mean()),
+                     'days_R0_above_1': int(np.sum(R0 > 1))})
+
+    return chunk, rows, traj
+
+
+def run_scenarios(scenarios, param_fit, df_we = None, path = None, fixed = False, N = N_FOZ,
+                  Hi0 = 2, outputs = ('cases', 'incidence', 'mosquitoes'), chunk = 32,
+                  workers = None, k = 7, block = 30, param_fixed = PARAM_FIXED, **kwargs_cap):
+    '''
+    Simula um ano para cada cenário de clima.
+
+    :params scenarios: list of dict. Saída de `scenario_grid`.
+    :params param_fit: tuple. (b, beta).
+    :params df_we: pd.DataFrame or None. Dados de clima (ver `weather_calendar`).
+    :params path: string or None. Diretório onde os resultados serão salvos.
+    :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos.
+    :params N: int. População humana.
+    :params Hi0: float. Número inicial de humanos infectados.
+    :params outputs: list. Saídas guardadas nas trajetórias (ver `model_outputs`).
+    :params chunk: int. Número de cenários por lote (e por arquivo de trajetórias).
+    :params workers: int or None. Número de processos. Se 1, executa no processo atual.
+    :params k, block, kwargs_cap: ver `build_forcing`.
+    :params param_fixed: tuple. Parâmetros fixos do modelo. C_A e C_M podem ser séries
+                         diárias com pelo menos 365 valores; o equilíbrio inicial dos
+                         mosquitos usa o controle do dia 0.
+
+    :returns: pd.DataFrame com o resumo de cada cenário.
+    '''
+    forcing = build_forcing(scenarios, df_we, k = k, block = block, fixed = fixed, **kwargs_cap)
+
+    chunks = [np.arange(i, min(i + chunk, len(scenarios))) for i in range(0, len(scenarios), chunk)]
+    args = (forcing, param_fit, fixed, N, Hi0, list(outputs), param_fixed)
+
+    if path is not None:
+        # as trajetórias de uma execução anterior no mesmo diretório são substituídas
+        shutil.rmtree(os.path.join(path, 'trajectories'), ignore_errors = True)
+        traj_store = ResultStore.create(os.path.join(path, 'trajectories'), outputs, DAYS)
+
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'outputs': list(outputs), 'chunk': chunk, 'n_scenarios': len(scenarios),
+                       'days': DAYS, 'param_fit': list(param_fit), 'fixed': fixed, 'N': N}, f)
+
+    def store(c, rows, traj):
+        if path is not None:
+            traj_store.append(traj, members = {'scenario': c}, run = f'chunk_{c[0]//chunk:05d}')
+        return rows
+
+    if workers is None:
+        workers = os.cpu_count()
+
+    if workers == 1:
+        rows = [row for c in chunks for row in store(*_run_chunk(c, *args))]
+    else:
+        rows = []
+        with ProcessPoolExecutor(max_workers = workers) as ex:
+            futures = [ex.submit(_run_chunk, c, *args) for c in chunks]
+            for f in as_completed(futures):
+                rows += store(*f.result())
+
+    df = pd.DataFrame(scenarios).merge(pd.DataFrame(rows), on = 'scenario').sort_values('scenario')
+
+    if path is not None:
+        df.to_csv(os.path.join(path, 'summary.csv'), index = False, float_format = '%.6g')
+
+    return df.reset_index(drop = True)
+
+
+def read_trajectories(path, scenarios = None):
+    '''
+    Lê as trajetórias salvas por `run_scenarios`, abrindo apenas os lotes necessários
+    (os lotes são as execuções do store em path/trajectories, ver results.py).
+
+    :params path: string. Diretório dos resultados.
+    :params scenarios: list or None. Cenários desejados (coluna `scenario` do resumo). Se
+                       None, lê todos, em ordem.
+
+    :returns: tuple. (lista de saídas, array (n_cenários, n_saídas, 365))
+    '''
+    store = ResultStore(os.path.join(path, 'trajectories'))
+
+    # membro do store de cada cenário, pela coluna `scenario` gravada com as trajetórias
+    members = store.members()
+    index = pd.Series(members['member'].to_numpy(), index = members['scenario'].to_numpy())
+
+    if scenarios is None:
+        scenarios = np.sort(index.index.to_numpy())
+
+    missing = [s for s in np.atleast_1d(scenarios) if s not in index.index]
+    if missing:
+        raise KeyError(f'cenários sem trajetórias salvas: {missing}')
+
+    members = index.loc[np.atleast_1d(scenarios)].to_numpy()
+
+    out = np.stack([store.variable(name, members) for name in store.variables], axis = 1)
+
+    return store.variables, out
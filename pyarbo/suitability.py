@@ -0,0 +1,142 @@
+'''
+Neste .py script estão os índices de adequação climática (suitability) para a transmissão
+da dengue, calculados sem integrar o sistema de EDOs:
+
+    * R_m: número básico de descendentes (basic offspring number) do mosquito. A população
+      de mosquitos se mantém apenas quando R_m > 1;
+    * R0: número básico de reprodução humano-vetor (ver `rt.r0_temperature`).
+
+Os dois índices são calculados para arrays de temperaturas de qualquer tamanho e com
+broadcasting sobre grades de parâmetros. As superfícies temperatura x parâmetros podem ser
+pré-calculadas e salvas (`build_surface`/`save_surface`) e depois consultadas para qualquer
+série de temperaturas (`lookup`), por exemplo para várias cidades ou cenários de clima.
+'''
+import numpy as np
+import pandas as pd
+from edo_model_yang import onto_params, R_m, K, C_A, C_M
+from rt import r0_temperature
+
+# temperaturas da tabela de parâmetros entomológicos (ver parameters.py)
+TEMPS = np.round(np.arange(-1.8, 41.75, 0.1), 1)
+
+
+def offspring_number(temp, k = K, c_m = C_M, c_a = C_A, fixed = False):
+    '''
+    Calcula R_m para cada temperatura.
+
+    :params temp: float or array. Temperaturas em °C.
+    :params k: float or array. Fraction of female mosquitoes hatched from all egs
+    :params c_m: float or array. Control effort rate on terretrial phase
+    :params c_a: float or array. Control effort rate on aquatic phase
+    :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos.
+
+    :returns: array com a dimensão resultante do broadcasting dos parâmetros.
+    '''
+    p = onto_params(temp, fixed)
+
+    return R_m(k, p['d'], p['gamma_m'], p['mu_m'], p['mu_a'], c_m = c_m, c_a = c_a)
+
+
+def daily_suitability(temp, b = 0.5, beta = 0.5, cap = 1, N = 256088, fixed = False, index = None):
+    '''
+    Retorna a série diária dos índices de adequação.
+
+    :params temp: array or pd.Series. Temperaturas médias diárias.
+    :params b: float. Taxa de picadas.
+    :params beta: float. Probabilidade de transmissão.
+    :params cap: float or array. Capacidade suporte em unidades de 10**D.
+    :params N: int. População humana.
+    :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos.
+    :params index: pd.Index or None. Índice do resultado. Se temp for uma pd.Series, o
+                   índice dela é usado.
+
+    :returns: pd.DataFrame com as colunas `R_m`, `R0` e `suitable` (R_m > 1 e R0 > 1).
+    '''
+    if isinstance(temp, pd.Series) and index is None:
+        index = temp.index
+
+    temp = np.asarray(temp, dtype = float)
+
+    Rm = offspring_number(temp, fixed = fixed)
+    R0 = r0_temperature(temp, b, beta, cap = cap, N = N, fixed = fixed)
+
+    return pd.DataFrame({'R_m': Rm, 'R0': R0, 'suitable': (Rm > 1) & (R0 > 1)}, index = index)
+
+
+def build_surface(temps = TEMPS, quantity = 'R0', fixed = False, **grid):
+    '''
+    Calcula uma superfície temperatura x parâmetros.
+
+    :params temps: array. Temperaturas do eixo 0. Devem ter espaçamento uniforme.
+    :params quantity: string. 'R0' ou 'R_m'.
+    :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos.
+    :params grid: arrays com os valores de cada parâmetro. Para 'R0' são aceitos os parâmetros
+                  de `rt.r0_temperature` (b e beta são obrigatórios) e para 'R_m' os de
+                  `offspring_number`. Cada parâmetro vira um eixo, na ordem fornecida.
+
+    :returns: dict com `temps`, `names` (nomes dos eixos dos parâmetros), `axes` (valores de
+              cada eixo) e `values` (array com dimensão (len(temps), len(grid[0]), ...)).
+    '''
+    temps = np.asarray(temps, dtype = float)
+    names = list(grid)
+    n_axes = len(names) + 1
+
+    def along(values, axis):
+        shape = [1]*n_axes
+        shape[axis] = -1
+        return np.reshape(values, shape)
+
+    axes = {name: np.atleast_1d(np.asarray(values, dtype = float)) for name, values in grid.items()}
+    kwargs = {name: along(axes[name], i + 1) for i, name in enumerate(names)}
+
+    T = along(temps, 0)
+
+    if quantity == 'R0':
+        values = r0_temperature(T, fixed = fixed, **kwargs)
+    elif quantity == 'R_m':
+        values = offspring_number(T, fixed = fixed, **kwargs)
+    else:
+        raise ValueError("quantity deve ser 'R0' ou 'R_m'.")
+
+    shape = (len(temps),) + tuple(len(axes[name]) for name in names)
+
+    return {'quantity': quantity, 'temps': temps, 'names': names, 'axes': axes,
+            'values': np.broadcast_to(values, shape).copy()}
+
+
+def lookup(surface, temp):
+    '''
+    Consulta a superfície para uma série de temperaturas (temperatura mais próxima do eixo).
+
+    :params surface: dict. Saída de `build_surface` ou `load_surface`.
+    :params temp: array. Temperaturas.
+
+    :returns: array com dimensão temp.shape + dimensões dos parâmetros.
+    '''
+    temps = surface['temps']
+    step = temps[1] - temps[0] if len(temps) > 1 else 1.0
+
+    idx = np.rint((np.asarray(temp, dtype = float) - temps[0])/step).astype(int)
+
+    return surface['values'][np.clip(idx, 0, len(temps) - 1)]
+
+
+def save_surface(surface, path):
+    '''
+    Salva a superfície em um arquivo .npz.
+    '''
+    arrays = {f'axis_{name}': values for name, values in surface['axes'].items()}
+
+    np.savez(path, quantity = surface['quantity'], temps = surface['temps'],
+             names = np.array(surface['names'], dtype = str), values = surface['values'], **arrays)
+
+
+def load_surface(path):
+    '''
+    Lê a superfície salva por `save_surface`.
+    '''
+    with np.load(path) as f:
+        names = f['names'].tolist()
+
+        return {'quantity': str(f['quantity']), 'temps': f['temps'], 'names': names,
+                'axes': {name: f[f'axis_{name}'] for name in names}, 'values': f['values']}
@@ -0,0 +1,11 @@
+'''
+Configuração dos testes: os módulos do pyarbo são importados diretamente da pasta pyarbo
+(como nos notebooks) e o cache é redirecionado para uma pasta temporária.
+'''
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('PYARBO_CACHE', os.path.join(tempfile.gettempdir(), 'pyarbo-tests-cache'))
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+import instrumentation
+from edo_model_yang import solve_model
+from fitting import PARAM_FIXED, initial_conditions
+from compiled import HAS_NUMBA
+
+T = np.arange(175)
+TEMP = np.round(24 + 5*np.sin(2*np.pi*T/365), 1)
+CAP = 1.0 + 0.5*np.cos(2*np.pi*T/60)
+Y0 = initial_conditions(N = 256088, Hi0 = 20)
+
+numba_only = pytest.mark.skipif(not HAS_NUMBA, reason = 'numba não instalado')
+
+
+def _scipy(fixed, cap):
+
+    return solve_model(T, Y0, (0.5, 0.5), PARAM_FIXED, TEMP, cap, fixed, outputs = ['cases', 'mosquitoes'],
+                       forcing = 'segments')
+
+
+@numba_only
+@pytest.mark.parametrize('fixed', [True, False])
+@pytest.mark.parametrize('cap', [1.0, CAP])
+def test_numba_matches_scipy(fixed, cap):
+
+    ref = _scipy(fixed, cap)
+    out = solve_model(T, Y0, (0.5, 0.5), PARAM_FIXED, TEMP, cap, fixed, outputs = ['cases', 'mosquitoes'],
+                      backend = 'numba')
+
+    assert np.allclose(out, ref, rtol = 5e-3, atol = 1.0)
+
+
+@numba_only
+@pytest.mark.parametrize('forcing', ['step', 'linear'])
+def test_numba_rejects_other_forcing(forcing):
+
+    with pytest.raises(ValueError, match = 'segments'):
+        solve_model(T, Y0, (0.5, 0.5), PARAM_FIXED, TEMP, 1.0, True, forcing = forcing, backend = 'numba')
+
+
+@numba_only
+def test_numba_solves_are_instrumented():
+
+    with instrumentation.instrumented():
+        solve_model(T, Y0, (0.5, 0.5), PARAM_FIXED, TEMP, CAP, True, backend = 'numba')
+
+    solves = [r for r in instrumentation.records() if r['type'] == 'solver']
+
+    assert len(solves) == 1
+    assert solves[0]['method'] == 'numba-rosenbrock'
+    assert solves[0]['forcing'] == 'segments'
+    assert solves[0]['nfev'] > 0 and solves[0]['steps'] > 0
+
+    assert instrumentation.summary().loc['solve_ivp', 'calls'] == 1
+
+
+jax_model = pytest.importorskip('jax_model')
+jax_only = pytest.mark.skipif(not jax_model.HAS_JAX, reason = 'jax não instalado')
+
+
+def _weather(k = 7):
+
+    n = len(T) + k
+    days = np.arange(-k, len(T))
+    rng = np.random.default_rng(2)
+
+    return {'W': rng.gamma(0.5, 10, n), 'T_min': np.round(19 + 5*np.sin(2*np.pi*days/365), 1),
+            'T_mean': np.round(24 + 5*np.sin(2*np.pi*days/365), 1)}
+
+
+@jax_only
+def test_jax_does_not_change_global_precision():
+
+    import jax
+
+    weather = _weather()
+    cases = jax_model.simulate({'bb': 0.25}, weather, Y0, fixed = True)
+
+    assert cases.dtype == np.float64
+    assert not jax.config.jax_enable_x64
+
+
+@jax_only
+@pytest.mark.parametrize('fixed', [True, False])
+def test_jax_matches_scipy(fixed):
+
+    from edo_model_yang import sup_cap_yang_array
+
+    weather = _weather()
+    cap = sup_cap_yang_array(weather['W'], weather['T_min'], weather['T_mean'])
+    temp = weather['T_mean'][7:]
+
+    ref = solve_model(T, Y0, (0.25, 1.0), PARAM_FIXED, temp, cap, fixed, outputs = ['cases'],
+                      forcing = 'segments')[0]
+    cases = np.asarray(jax_model.simulate({'bb': 0.25}, weather, Y0, fixed = fixed))
+
+    assert np.allclose(cases, ref, rtol = 1e-2, atol = 1.0)
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+import backtest
+from backtest import SCORES, summarize, prepare_series, forecast_samples
+from fitting import initial_conditions
+
+
+def test_summarize_drops_failed_origins():
+
+    df = pd.DataFrame({'mae': [1.0, 3.0, np.nan], 'crps': [1.0, 1.0, np.nan],
+                       'coverage': [0.5, 1.0, np.nan], 'peak_error': [-2, 4, np.nan],
+                       'error': [None, None, "ValueError('x')"]})
+
+    res = summarize(df)
+
+    assert res['mae'] == 2.0 and res['peak_error'] == 3.0
+    assert res['n_origins'] == 2 and res['n_failed'] == 1
+
+
+def test_summarize_all_failed():
+
+    res = summarize(pd.DataFrame({'error': ['a', 'b'], 'origin': [1, 2]}))
+
+    assert res[SCORES].isna().all()
+    assert res['n_failed'] == 2 and res['n_origins'] == 0
+
+
+def test_range_without_valid_origins(monkeypatch):
+
+    def run(*args, **kwargs):
+        raise AssertionError('nenhum fitting deveria ser executado')
+
+    monkeypatch.setattr(backtest, '_run_block', run)
+
+    with pytest.raises(ValueError, match = 'nenhuma origem'):
+        backtest.backtest('2010-01-01', '2010-01-20', workers = 1)
+
+
+def test_unexpected_errors_are_not_swallowed(monkeypatch):
+
+    def broken(*args, **kwargs):
+        raise KeyError('bug')
+
+    monkeypatch.setattr(backtest, 'forecast_origin', broken)
+
+    with pytest.raises(KeyError):
+        backtest._run_block([200], None, None, 175, 28, True, None, 10, False)
+
+
+def test_point_forecast_inside_quantiles():
+
+    dates, cases, temp = prepare_series()
+    i = dates.get_loc(pd.Timestamp('2016-03-01'))
+
+    point, samples, out = forecast_samples(i, cases, temp, 175, 28, True, initial_conditions(), n_samples = 50)
+    lo, hi = np.quantile(samples, [0.05, 0.95], axis = 0)
+
+    assert samples.shape == (50, 28)
+    assert np.all((lo <= point) & (point <= hi))
+    assert np.all(hi > 0)
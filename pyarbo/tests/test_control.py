@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from control import (STRATEGY, campaign_schedule, control_param_fixed, strategy_cost, apply_budget,
+                     evaluate_strategy, evaluate_strategies, optimize_control)
+from fitting import PARAM_FIXED, initial_conditions
+
+T = np.arange(120)
+Y0 = initial_conditions(N = 256088, Hi0 = 20)
+PLAN = {'start_a': 10, 'duration_a': 30, 'intensity_a': 0.2, 'start_m': 100, 'duration_m': 40,
+        'intensity_m': 0.1}
+
+
+def test_schedule_daily_arrays():
+
+    np.testing.assert_array_equal(campaign_schedule(10, 2.4, 3.6, 0.5), [0, 0, 0.5, 0.5, 0.5, 0.5, 0, 0, 0, 0])
+
+    par = control_param_fixed(PLAN, len(T))
+    c_a, c_m = par[4], par[5]
+
+    assert c_a.shape == c_m.shape == (len(T),)
+    assert par[:4] == PARAM_FIXED[:4] and par[6:] == PARAM_FIXED[6:]
+    np.testing.assert_allclose(c_a[10:40], PARAM_FIXED[4] + 0.2)
+    np.testing.assert_allclose(np.delete(c_a, np.s_[10:40]), PARAM_FIXED[4])
+    # a campanha de fumacê é cortada no fim da simulação
+    np.testing.assert_allclose(c_m[100:], PARAM_FIXED[5] + 0.1)
+    np.testing.assert_allclose(c_m[:100], PARAM_FIXED[5])
+
+
+def test_over_budget_plan_is_scaled_down():
+
+    assert strategy_cost(PLAN) == pytest.approx(0.2*30 + 0.1*40)
+
+    s = apply_budget(PLAN, budget = 5.0)
+
+    assert strategy_cost(s) == pytest.approx(5.0)
+    assert s['intensity_a']/s['intensity_m'] == pytest.approx(2.0)
+    assert apply_budget(PLAN, budget = 20.0) == PLAN
+
+    res = evaluate_strategy(PLAN, T, Y0, (0.5, 0.5), budget = 5.0)
+    assert res['cost'] == pytest.approx(5.0)
+
+    df = evaluate_strategies([PLAN, [0, 0, 0, 0, 0, 0]], T, Y0, (0.5, 0.5), budget = 5.0, workers = 1)
+    assert df.final_cases[0] < df.final_cases[1]
+    assert df.final_cases[0] == pytest.approx(res['final_cases'])
+
+
+def test_optimizer_respects_budget():
+
+    res = optimize_control(T, Y0, (0.5, 0.5), budget = 4.0, max_duration = 60, workers = 1,
+                           maxiter = 3, popsize = 3)
+
+    assert set(res['strategy']) == set(STRATEGY)
+    assert res['cost'] <= 4.0 + 1e-9
+    assert strategy_cost(res['strategy']) == pytest.approx(res['cost'])
+    assert res['final_cases'] < res['baseline_cases']
+    assert len(res['history']) == res['nit']
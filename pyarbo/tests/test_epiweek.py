@@ -0,0 +1,68 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from epiweek import to_epiweek, from_epiweek, weeks_in_year, epiweek_code, aggregate_epiweek
+
+
+def _reference(date):
+    # SE por força bruta: a SE 1 começa no domingo da semana que contém o dia 4 de janeiro
+    def first_sunday(year):
+        jan4 = datetime.date(year, 1, 4)
+        return jan4 - datetime.timedelta(days = (jan4.weekday() + 1) % 7)
+
+    year = date.year + 1
+    while first_sunday(year) > date:
+        year -= 1
+
+    return year, (date - first_sunday(year)).days//7 + 1
+
+
+@pytest.mark.parametrize('date, expected', [
+    ('2010-01-02', (2009, 52)),
+    ('2010-01-03', (2010, 1)),
+    ('2015-01-03', (2014, 53)),
+    ('2015-12-31', (2015, 52)),
+    ('2019-12-29', (2020, 1)),
+    ('2021-01-02', (2020, 53)),
+    ('2022-01-01', (2021, 52)),
+    ('2022-01-02', (2022, 1)),
+])
+def test_year_boundaries(date, expected):
+
+    year, week = to_epiweek(np.array([date]))
+
+    assert (year[0], week[0]) == expected
+    assert from_epiweek(*expected) <= np.datetime64(date) < from_epiweek(*expected) + 7
+
+
+def test_matches_reference():
+
+    dates = pd.date_range('1999-12-01', '2031-02-01')
+    year, week = to_epiweek(dates.values)
+    ref = np.array([_reference(d.date()) for d in dates])
+
+    np.testing.assert_array_equal(year, ref[:, 0])
+    np.testing.assert_array_equal(week, ref[:, 1])
+
+    # o número de semanas de cada ano é a maior SE observada
+    years = np.arange(2000, 2030)
+    last = [week[year == y].max() for y in years]
+    np.testing.assert_array_equal(weeks_in_year(years), last)
+
+    assert epiweek_code(np.array(['2010-01-02']))[0] == 200952
+
+
+def test_aggregate_matches_groupby():
+
+    rng = np.random.default_rng(0)
+    dates = pd.date_range('2019-12-20', '2020-03-10')
+    values = rng.integers(0, 10, (len(dates), 2)).astype(float)
+
+    start, out, n_days = aggregate_epiweek(values, dates.values)
+
+    ref = pd.DataFrame(values, index = dates).groupby(from_epiweek(*to_epiweek(dates.values))).agg(['sum', 'size'])
+
+    np.testing.assert_array_equal(start, ref.index.values.astype('datetime64[D]'))
+    np.testing.assert_array_equal(out, ref.xs('sum', axis = 1, level = 1).to_numpy())
+    np.testing.assert_array_equal(n_days, ref[(0, 'size')].to_numpy())
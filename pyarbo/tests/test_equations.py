@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from edo_model_yang import model_rhs, model_jacobian, RATE_ROWS
+from fitting import PARAM_FIXED, initial_conditions
+from transmission import knot_basis, solve_sensitivities
+import fast_model
+
+MU_H, THETA_H, ALPHA_H, K = PARAM_FIXED[:4]
+CONSTS = np.array([MU_H, THETA_H, ALPHA_H, K])
+
+rng = np.random.default_rng(1)
+STATES = rng.uniform(10, 1e4, (4, 8))
+P = np.array([0.6, 0.4, 0.01, 0.02, 5e3, 5.6, 0.11, 0.095, 0.24, 0.055])
+
+
+def _rhs(x):
+
+    return model_rhs(x, P, CONSTS, np.empty(8))
+
+
+@pytest.mark.parametrize('x', STATES)
+def test_jacobian_matches_finite_differences(x):
+
+    J = model_jacobian(x, P, CONSTS, np.empty((8, 8)))
+
+    eps = 1e-4*x
+    fd = np.stack([(_rhs(x + e) - _rhs(x - e))/(2*e[k]) for k, e in enumerate(np.diag(eps))], axis = 1)
+
+    assert np.allclose(J, fd, rtol = 1e-6, atol = 1e-9)
+
+
+def test_fast_model_rates_match_model_rhs():
+
+    X = STATES.T.copy()
+    Pr, L = np.empty_like(X), np.empty_like(X)
+    pars = dict(zip(RATE_ROWS, P))
+
+    fixed = PARAM_FIXED[:4] + (pars['c_a'], pars['c_m']) + PARAM_FIXED[6:]
+    fast_model._rates(X, pars['b']*pars['beta'], [pars[name] for name in RATE_ROWS[5:]],
+                      pars['cap'], fixed, Pr, L)
+
+    assert np.allclose((Pr - L*X).T, [_rhs(x) for x in STATES], rtol = 1e-12)
+
+
+def test_sensitivities_match_finite_differences():
+
+    t = np.arange(60)
+    basis = knot_basis(60, 4)
+    values = np.array([0.3, 0.4, 0.35, 0.3])
+    y0 = initial_conditions(N = 100_000, Hi0 = 20)
+    kw = dict(method = 'LSODA', rtol = 1e-10, atol = 1e-8)
+
+    cases, dcases = solve_sensitivities(t, y0, values, basis, None, 1.0, True, **kw)
+
+    for k in range(len(values)):
+        step = 1e-5*np.eye(len(values))[k]
+        up, _ = solve_sensitivities(t, y0, values + step, basis, None, 1.0, True, **kw)
+        down, _ = solve_sensitivities(t, y0, values - step, basis, None, 1.0, True, **kw)
+
+        assert np.allclose(dcases[:, k], (up - down)/2e-5, rtol = 1e-4, atol = 1e-3*np.abs(dcases).max())
@@ -0,0 +1,39 @@
+import numpy as np
+
+from fitting import PARAM_FIXED, initial_conditions
+from events import solve_summary
+
+T = np.arange(60)
+TEMP = np.full(60, 26.0)
+
+
+def _summary(y0, **kwargs):
+
+    return solve_summary(T, y0, (0.5, 0.5), PARAM_FIXED, TEMP, 1.0, True, method = 'LSODA',
+                         **kwargs)
+
+
+def test_threshold_exceeded_at_start_is_reported_at_t0():
+
+    y0 = initial_conditions(N = 100_000, Hi0 = 50)
+    cases0 = y0[6] + y0[7]
+
+    final = _summary(y0)['final_cases']
+    assert final > cases0
+
+    mid = (cases0 + final)/2
+    res = _summary(y0, thresholds = [cases0/2, mid, 1e9])
+
+    assert res[f'cases_{cases0/2:g}'] == T[0]
+    assert T[0] < res[f'cases_{mid:g}'] < T[-1]
+    assert np.isnan(res['cases_1e+09'])
+
+
+def test_mosquito_level_exceeded_at_start_is_reported_at_t0():
+
+    y0 = initial_conditions(N = 100_000, Hi0 = 50)
+    total0 = sum(y0[:4])
+
+    res = _summary(y0, mosquito_levels = [total0/2])
+
+    assert res[f'mosquitoes_{total0/2:g}'] == T[0]
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from edo_model_yang import solve_model
+from fast_model import solve_fast
+from fitting import PARAM_FIXED, initial_conditions
+
+T = np.arange(175)
+TEMP = np.round(24 + 5*np.sin(2*np.pi*T/365), 1)
+CAP = 1.0 + 0.5*np.cos(2*np.pi*T/60)
+Y0 = initial_conditions(N = 256088, Hi0 = 20)
+
+
+@pytest.mark.parametrize('fixed', [True, False])
+def test_fast_model_matches_scipy(fixed):
+
+    ref = solve_model(T, Y0, (0.5, 0.5), PARAM_FIXED, TEMP, CAP, fixed, outputs = ['cases', 'mosquitoes'])
+    scale = np.abs(ref).max(axis = 1)
+
+    def error(scheme, substeps):
+        out = solve_fast(T, Y0, [(0.5, 0.5)], PARAM_FIXED, TEMP, CAP, fixed, outputs = ['cases', 'mosquitoes'],
+                         scheme = scheme, substeps = substeps)
+        return (np.abs(out[0] - ref).max(axis = 1)/scale).max()
+
+    assert error('expmid', 2) < 5e-3
+    # o erro do esquema de primeira ordem cai com o número de passos por dia
+    assert error('expeuler', 8) < error('expeuler', 2)/2
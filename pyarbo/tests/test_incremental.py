@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+import incremental
+from incremental import init_dengue_store, append_dengue, load_store, load_state
+
+
+def _history(days = 20):
+
+    dates = pd.date_range('2020-01-01', periods = days, name = 'date')
+    rng = np.random.default_rng(0)
+    notified = rng.integers(0, 10, days).astype(float)
+
+    return pd.DataFrame({'notified': notified, 'probable': notified/2, 'lab_confirmed': notified/4},
+                        index = dates)
+
+
+def test_append_matches_full_history(tmp_path):
+
+    data = _history()
+    init_dengue_store(tmp_path, data.iloc[:15])
+
+    for day, row in data.iloc[15:].iterrows():
+        # formato do csv original: as categorias são exclusivas
+        append_dengue(tmp_path, str(day.date()), row.notified - row.probable, row.probable - row.lab_confirmed,
+                      row.lab_confirmed)
+
+    full = data.rolling(window = incremental.WINDOW).mean().dropna()
+    stored = load_store(tmp_path, 'dengue')
+
+    np.testing.assert_allclose(stored[incremental.DENGUE_COLS].to_numpy(), full.to_numpy())
+    np.testing.assert_allclose(stored.acum_notified.to_numpy(), full.notified.cumsum().to_numpy())
+
+
+def test_interrupted_append_is_not_duplicated(tmp_path, monkeypatch):
+
+    init_dengue_store(tmp_path, _history())
+    before = load_store(tmp_path, 'dengue')
+
+    def crash(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as m:
+        m.setattr(incremental, '_save_state', crash)
+        with pytest.raises(KeyboardInterrupt):
+            append_dengue(tmp_path, '2020-01-21', 5, 3, 1)
+
+    # as linhas do append interrompido não aparecem na leitura
+    pd.testing.assert_frame_equal(load_store(tmp_path, 'dengue'), before)
+    assert load_state(tmp_path, 'dengue')['last_date'] == '2020-01-20'
+
+    append_dengue(tmp_path, '2020-01-21', 5, 3, 1)
+    stored = load_store(tmp_path, 'dengue')
+
+    assert len(stored) == len(before) + 1
+    assert not stored.index.duplicated().any()
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+from ingest import CATEGORIES, ingest_dengue_cases, daily_frame
+from misc import return_dengue_cases
+
+
+def _line_list(n = 500, seed = 0):
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({'dt_sin_pri': (pd.Timestamp('2020-01-01')
+                                      + pd.to_timedelta(rng.integers(-3, 40, n), unit = 'D')),
+                       'classi_fin': rng.choice([5, 10, 11, 12, np.nan], n),
+                       'criterio': rng.choice([1, 2, 3, np.nan], n),
+                       'id_mn_resi': rng.choice([410830, 410840, 999999], n)})
+
+    # linhas sem data são descartadas pelos dois caminhos
+    df.loc[::50, 'dt_sin_pri'] = pd.NaT
+
+    return df
+
+
+def test_ingest_matches_return_dengue_cases(tmp_path):
+
+    df = _line_list()
+    path = tmp_path / 'sinan.csv'
+    df.to_csv(path, index = False)
+
+    counts = ingest_dengue_cases(str(path), '2020-01-01', '2020-01-31', chunksize = 64)
+    got = daily_frame(counts, '2020-01-01')
+
+    ref = return_dengue_cases(df.dropna(subset = ['dt_sin_pri']))
+    ref = (ref.groupby(['dt_sin_pri', 'tipo']).size().unstack(fill_value = 0)
+              .reindex(index = got.index, columns = CATEGORIES, fill_value = 0))
+
+    np.testing.assert_array_equal(got.to_numpy(), ref.to_numpy())
+
+    in_range = df.dt_sin_pri.between('2020-01-01', '2020-01-31')
+    assert got.to_numpy().sum() == in_range.sum()
+
+
+def test_ingest_keeps_unclassified_rows(tmp_path):
+
+    df = pd.DataFrame({'dt_sin_pri': ['2020-01-02']*3, 'classi_fin': [np.nan, 5, np.nan],
+                       'criterio': [1, 1, 2]})
+    path = tmp_path / 'sinan.csv'
+    df.to_csv(path, index = False)
+
+    counts = ingest_dengue_cases(str(path), '2020-01-01', '2020-01-03')
+
+    assert counts[1, 0].tolist() == [1, 1, 1]
+
+
+def test_ingest_non_numeric_criterio(tmp_path):
+
+    df = pd.DataFrame({'dt_sin_pri': ['2020-01-02']*4, 'classi_fin': [10, 10, 10, 5],
+                       'criterio': ['1', 'ignorado', ' ', '1']})
+    path = tmp_path / 'sinan.csv'
+    df.to_csv(path, index = False)
+
+    counts = ingest_dengue_cases(str(path), '2020-01-01', '2020-01-03')
+
+    assert counts[1, 0].tolist() == [1, 2, 1]
+
+
+def test_ingest_municipalities(tmp_path):
+
+    df = _line_list(seed = 1)
+    path = tmp_path / 'sinan.parquet'
+    df.to_parquet(path, index = False)
+
+    codes = [410840, 410830]
+    counts = ingest_dengue_cases(str(path), '2020-01-01', '2020-01-31', municipalities = codes,
+                                 chunksize = 100)
+
+    for m, code in enumerate(codes):
+        sub = df[(df.id_mn_resi == code) & df.dt_sin_pri.between('2020-01-01', '2020-01-31')]
+        assert counts[:, m].sum() == len(sub)
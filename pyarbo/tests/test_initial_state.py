@@ -0,0 +1,54 @@
+import os
+import numpy as np
+import pytest
+
+import initial_state
+from get_data import DATA_DIR, get_weather_data
+
+DF_WE = get_weather_data(os.path.join(DATA_DIR, 'weather-2010_2022.csv'))
+
+
+@pytest.fixture
+def solves(monkeypatch):
+    # conta as integrações do aquecimento
+    calls = []
+    solve_ivp = initial_state.solve_ivp
+
+    def counted(*args, **kwargs):
+        calls.append(1)
+        return solve_ivp(*args, **kwargs)
+
+    monkeypatch.setattr(initial_state, 'solve_ivp', counted)
+
+    return calls
+
+
+def test_cache_hit_on_same_config(tmp_path, solves):
+
+    first = initial_state.mosquito_state('2015-01-01', DF_WE, cache_dir = str(tmp_path))
+    again = initial_state.mosquito_state('2015-01-01', DF_WE, cache_dir = str(tmp_path))
+
+    assert again == first
+    assert len(solves) == 1
+    assert len(os.listdir(tmp_path / 'initial_states')) == 1
+
+
+def test_cache_miss_when_arrays_change(tmp_path, solves):
+
+    first = initial_state.mosquito_state('2015-01-01', DF_WE, cache_dir = str(tmp_path))
+
+    # temperaturas diferentes na janela de aquecimento mudam o hash dos arrays
+    df_we = DF_WE.copy()
+    window = (df_we.index >= '2014-11-01') & (df_we.index < '2015-01-01')
+    df_we.loc[window, 'temp_mean-celsius'] += 2.0
+
+    warmer = initial_state.mosquito_state('2015-01-01', df_we, cache_dir = str(tmp_path))
+
+    assert len(solves) == 2
+    assert len(os.listdir(tmp_path / 'initial_states')) == 2
+    assert not np.allclose(warmer, first)
+
+    # a configuração também faz parte da chave
+    initial_state.mosquito_state('2015-01-01', DF_WE, warmup_days = 60, cache_dir = str(tmp_path))
+
+    assert len(solves) == 3
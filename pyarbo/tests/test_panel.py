@@ -0,0 +1,51 @@
+import os
+import numpy as np
+import pandas as pd
+
+import panel
+from get_data import DATA_DIR
+
+
+def test_sources_are_aligned():
+
+    p = panel.build_panel()
+    frames = panel._read_sources(DATA_DIR)
+
+    assert p.dates.equals(pd.date_range(p.dates[0], p.dates[-1]))
+
+    for name, df in frames.items():
+        got = p.to_frame(name).loc[df.index]
+        np.testing.assert_array_equal(got.to_numpy(), df.to_numpy(dtype = float))
+
+        present = df.index[df.notna().any(axis = 1)]
+        np.testing.assert_array_equal(p.mask(name), p.dates.isin(present))
+
+    # as armadilhas só começam em 2017
+    assert not p.mask('trap')[p.window('2010-01-01', '2016-12-31')].any()
+
+
+def test_memmap_round_trip(tmp_path):
+
+    p = panel.build_panel()
+    panel.save_panel(p, str(tmp_path))
+
+    q = panel.read_panel(str(tmp_path))
+
+    assert isinstance(q.values, np.memmap)
+    assert q.columns == p.columns and q.sources == p.sources
+    assert q.dates.equals(p.dates)
+    np.testing.assert_array_equal(q.values, p.values)
+    np.testing.assert_array_equal(q.valid, p.valid)
+    np.testing.assert_array_equal(q['temp_mean-celsius'], p['temp_mean-celsius'])
+
+
+def test_load_panel_uses_cache(tmp_path):
+
+    p = panel.load_panel(cache_dir = str(tmp_path))
+    meta = os.path.join(str(tmp_path), 'panel', 'meta.json')
+    mtime = os.stat(meta).st_mtime_ns
+
+    q = panel.load_panel(cache_dir = str(tmp_path))
+
+    assert os.stat(meta).st_mtime_ns == mtime
+    np.testing.assert_array_equal(q.values, p.values)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from scipy.integrate import solve_ivp
+
+from edo_model_yang import onto_params
+from periodic import periodic_orbit, mosquito_rhs
+
+TEMP = 25 + 4*np.sin(2*np.pi*np.arange(365)/365)
+CAP = 1.0 + 0.5*np.cos(2*np.pi*np.arange(365)/365)
+
+
+def _flow(x0, fixed = True):
+    # um período do fluxo, integrado sem passar por periodic_orbit
+    args = (onto_params(TEMP, fixed), 10**4*CAP)
+    sol = solve_ivp(mosquito_rhs, [0, len(TEMP)], x0, args = args, method = 'LSODA',
+                    rtol = 1e-8, atol = 1e-6)
+
+    return sol.y[:, -1]
+
+
+def _residual(x):
+
+    return np.linalg.norm(_flow(x) - x)/max(np.linalg.norm(x), 1.0)
+
+
+def test_orbit_converges_from_far_guess():
+
+    orbit = periodic_orbit(TEMP, CAP, D = 4, fixed = True, x0 = [10.0, 10.0])
+
+    assert orbit['converged']
+    assert orbit['residual'] < 1e-6
+    assert _residual(orbit['x0']) < 1e-5
+    assert np.allclose(orbit['orbit'][0], orbit['x0'])
+    assert np.all(np.abs(orbit['multipliers']) < 1)
+
+
+def test_non_convergence_warns_with_residual_of_returned_state():
+
+    x0 = np.array([1.0, 1.0])
+
+    with pytest.warns(RuntimeWarning, match = 'não convergiu'):
+        orbit = periodic_orbit(TEMP, CAP, D = 4, fixed = True, x0 = x0, tol = 1e-14, max_iter = 1)
+
+    assert not orbit['converged']
+    assert orbit['iterations'] == 1
+
+    # o resíduo é o do estado retornado, não o do chute inicial
+    assert orbit['residual'] < 1e-3*_residual(x0)
+    assert orbit['residual'] == pytest.approx(_residual(orbit['x0']), abs = 1e-7)
+
+
+def test_max_iter_must_be_positive():
+
+    with pytest.raises(ValueError):
+        periodic_orbit(TEMP, CAP, D = 4, fixed = True, max_iter = 0)
@@ -0,0 +1,79 @@
+import pytest
+
+from compiled import HAS_NUMBA
+from pipeline import run_pipeline
+
+CONFIG = {'fixed': True, 'backend': 'numba' if HAS_NUMBA else 'scipy',
+          'branches': [{'start_date': '2010-01-08', 'end_date': '2010-03-31'},
+                       {'start_date': '2011-01-08', 'end_date': '2011-03-31'}]}
+
+
+def _status(log):
+
+    return {(row.stage, row.branch): row.status for row in log.itertuples()}
+
+
+@pytest.fixture(scope = 'module')
+def cache(tmp_path_factory):
+
+    path = str(tmp_path_factory.mktemp('pipeline'))
+    _, log = run_pipeline(CONFIG, workers = 1, cache_dir = path, targets = ())
+
+    return path, log
+
+
+def test_shared_stages_run_once(cache):
+
+    _, log = cache
+    status = _status(log)
+
+    for name in ['weather', 'dengue']:
+        assert status[(name, '0')] == 'run'
+        assert status[(name, '1')] == 'shared'
+
+    assert (log[log.status == 'shared'].seconds == 0).all()
+    assert (log[log.status == 'run'].seconds > 0).all()
+    assert (log[log.stage == 'fit'].status == 'run').all()
+
+
+def test_unchanged_config_is_cached(cache):
+
+    path, _ = cache
+    _, log = run_pipeline(CONFIG, workers = 1, cache_dir = path, targets = ())
+
+    assert (log.status == 'cached').all()
+
+
+def test_changed_key_only_reruns_dependent_stages(cache):
+
+    path, _ = cache
+    _, log = run_pipeline(dict(CONFIG, horizon = 14), workers = 1, cache_dir = path, targets = ())
+
+    rerun = set(log[log.status == 'run'].stage)
+
+    assert rerun == {'projection', 'forecast', 'plot'}
+
+
+def test_rerun_with_same_output_does_not_invalidate(cache):
+
+    path, _ = cache
+
+    # cap_params explícitos com os valores padrão mudam a chave da etapa capacity, mas não a
+    # sua saída
+    config = dict(CONFIG, cap_params = {'w1': 0.5})
+    _, log = run_pipeline(config, workers = 1, cache_dir = path, targets = ())
+    status = _status(log)
+
+    assert status[('capacity', '0')] == 'run'
+    assert status[('fit', '0')] == 'cached'
+    assert status[('forecast', '0')] == 'cached'
+
+
+def test_refresh_reruns_everything(cache):
+
+    path, _ = cache
+    res, log = run_pipeline(CONFIG, workers = 1, cache_dir = path, refresh = True, targets = ('fit',))
+
+    assert set(log.status) == {'run', 'shared'}
+    assert set(log[log.status == 'shared'].stage) == {'weather', 'dengue'}
+    assert res['0']['fit']['success']
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from results import ResultStore
+
+VARIABLES = ['Hi', 'Ms']
+DAYS = 10
+
+
+def _values(n, seed):
+
+    return np.random.default_rng(seed).random((n, len(VARIABLES), DAYS))
+
+
+@pytest.mark.parametrize('compression', [None, 'zlib'])
+def test_round_trip(tmp_path, compression):
+
+    store = ResultStore.create(str(tmp_path), VARIABLES, DAYS, compression = compression, chunk = 3)
+
+    a, b = _values(7, 0), _values(4, 1)
+    # o índice do DataFrame não deve ser usado para alinhar os membros
+    store.append(a, members = pd.DataFrame({'b': np.arange(7.)}, index = np.arange(7) + 100), run = 'r0')
+    store.append(b, members = {'b': np.arange(7., 11.), 'fixed': True}, run = 'r1')
+
+    values = np.concatenate([a, b]).astype('float32')
+
+    assert len(store) == 11
+    np.testing.assert_array_equal(store.variable('Ms'), values[:, 1])
+    np.testing.assert_array_equal(store.variable('Hi', [9, 2, 5], days = slice(2, 6)), values[[9, 2, 5], 0, 2:6])
+    np.testing.assert_array_equal(store.member(8), values[8])
+
+    members = store.members()
+    np.testing.assert_array_equal(members['b'], np.arange(11.))
+    assert members['run_member'].tolist() == list(range(7)) + list(range(4))
+
+    reopened = ResultStore(str(tmp_path))
+    np.testing.assert_array_equal(reopened.member(4, ['Ms']), values[4, [1]])
+
+
+def test_members_must_match_values(tmp_path):
+
+    store = ResultStore.create(str(tmp_path), VARIABLES, DAYS)
+
+    with pytest.raises(ValueError, match = 'members'):
+        store.append(_values(3, 0), members = pd.DataFrame({'b': [1.0, 2.0]}))
+
+    assert len(store) == 0
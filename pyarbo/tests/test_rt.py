@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rt import serial_interval, estimate_rt
+
+
+def _renewal(R, days = 150, seed_cases = 1e5):
+    # casos que seguem exatamente a equação de renovação com R constante, em número grande
+    # o bastante para a priori não pesar na posterior
+    w = serial_interval()
+    cases = np.zeros(days)
+    cases[0] = seed_cases
+    for t in range(1, days):
+        s = np.arange(1, min(t, len(w) - 1) + 1)
+        cases[t] = R*np.sum(w[s]*cases[t - s])
+
+    return cases
+
+
+@pytest.mark.parametrize('R', [0.8, 1.5])
+def test_posterior_mean_recovers_constant_R(R):
+
+    cases = pd.Series(_renewal(R), index = pd.date_range('2020-01-01', periods = 150))
+
+    est = estimate_rt(cases, window = 7)
+
+    assert est.index.equals(cases.index)
+    assert est['mean'].iloc[:6].isna().all()
+
+    late = est.iloc[60:]
+    assert np.allclose(late['mean'], R, rtol = 1e-3)
+    assert (late['q0.025'] < late['mean']).all() and (late['mean'] < late['q0.975']).all()
+
+
+def test_days_without_infection_pressure_are_nan():
+
+    cases = np.r_[np.zeros(20), _renewal(1.2, days = 60)]
+
+    est = estimate_rt(cases, window = 7)
+
+    assert est['mean'].iloc[:21].isna().all()
+    assert np.isfinite(est['mean'].iloc[30:]).all()
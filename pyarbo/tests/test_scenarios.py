@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from fitting import PARAM_FIXED
+from results import ResultStore
+from scenarios import scenario_grid, run_scenarios, read_trajectories
+
+SCENARIOS = scenario_grid(warming = (0.0,), years = (2015,))
+
+
+def _control(c_a, c_m = 0.0):
+
+    return PARAM_FIXED[:4] + (c_a, c_m) + PARAM_FIXED[6:]
+
+
+def test_daily_control_series():
+
+    c_a = np.r_[np.full(100, 0.05), np.zeros(265)]
+
+    df = run_scenarios(SCENARIOS, (0.5, 0.5), fixed = True, workers = 1, param_fixed = _control(c_a))
+    base = run_scenarios(SCENARIOS, (0.5, 0.5), fixed = True, workers = 1)
+
+    assert np.isfinite(df.final_cases).all()
+    assert (df.final_cases < base.final_cases).all()
+
+
+def test_short_control_series_is_rejected():
+
+    with pytest.raises(ValueError, match = 'C_M'):
+        run_scenarios(SCENARIOS, (0.5, 0.5), fixed = True, workers = 1,
+                      param_fixed = _control(0.0, np.full(30, 0.1)))
+
+
+def test_read_trajectories_by_scenario(tmp_path):
+
+    scenarios = scenario_grid(warming = (0.0, 1.0), years = (2015,))
+    df = run_scenarios(scenarios, (0.5, 0.5), path = str(tmp_path), fixed = True, chunk = 1, workers = 1)
+
+    names, out = read_trajectories(str(tmp_path), [1, 0])
+
+    assert out.shape == (2, len(names), 365)
+    np.testing.assert_allclose(out[:, names.index('cases'), -1], df.final_cases[[1, 0]], rtol = 1e-6)
+
+    # sem o primeiro lote o cenário 1 passa a ser o membro 0 do store
+    ResultStore(str(tmp_path / 'trajectories')).remove('chunk_00000')
+
+    np.testing.assert_array_equal(read_trajectories(str(tmp_path), [1])[1], out[:1])
+
+    with pytest.raises(KeyError):
+        read_trajectories(str(tmp_path), [0])
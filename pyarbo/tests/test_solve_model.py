@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import instrumentation
+
+from edo_model_yang import solve_model, solve_ensemble
+from fitting import PARAM_FIXED, initial_conditions
+
+T = np.arange(120)
+TEMP = np.round(24 + 5*np.sin(2*np.pi*T/365), 1)
+Y0 = initial_conditions(N = 256088, Hi0 = 20)
+CAP = 1.0 + 0.5*np.cos(2*np.pi*T/60)
+OUTPUTS = ['cases', 'Hi', 'mosquitoes']
+
+
+def _solve(**kwargs):
+
+    return solve_model(T, Y0, (0.5, 0.5), PARAM_FIXED, TEMP, 1.0, False, **kwargs)
+
+
+def test_outputs_and_every():
+
+    full = _solve(outputs = OUTPUTS)
+    r = _solve()
+
+    assert full.shape == (3, len(T)) and full.dtype == np.float64
+    np.testing.assert_array_equal(full[1], r.y[6])
+
+    np.testing.assert_array_equal(_solve(outputs = OUTPUTS, every = 7), full[:, ::7])
+
+
+def test_out_is_filled_in_place_with_its_dtype():
+
+    out = np.full((3, len(T[::5])), -1.0, dtype = np.float32)
+
+    res = _solve(outputs = OUTPUTS, every = 5, out = out)
+
+    assert res is out
+    np.testing.assert_allclose(out, _solve(outputs = OUTPUTS)[:, ::5], rtol = 1e-6)
+
+    res = _solve(outputs = OUTPUTS, dtype = np.float32)
+    assert res.dtype == np.float32
+
+
+def test_ensemble_matches_loop():
+
+    param_fits = np.array([[0.5, 0.5], [0.4, 0.6], [0.7, 0.3]])
+    y0s = np.array([Y0, Y0, initial_conditions(N = 256088, Hi0 = 5)])
+
+    ens = solve_ensemble(T, y0s, param_fits, PARAM_FIXED, TEMP, 1.0, False, outputs = OUTPUTS, every = 2,
+                         dtype = np.float64)
+
+    loop = np.stack([solve_model(T, y0, tuple(p), PARAM_FIXED, TEMP, 1.0, False, outputs = OUTPUTS, every = 2)
+                     for y0, p in zip(y0s, param_fits)])
+
+    assert ens.shape == (3, 3, len(T[::2]))
+    np.testing.assert_array_equal(ens, loop)
+    assert solve_ensemble(T, Y0, param_fits, PARAM_FIXED, TEMP, 1.0, False).dtype == np.float32
+
+
+def _counted(forcing, fixed, cap):
+
+    with instrumentation.instrumented():
+        cases = solve_model(T, Y0, (0.5, 0.5), PARAM_FIXED, TEMP, cap, fixed, outputs = ['cases'],
+                            forcing = forcing)[0]
+
+    return cases, [r for r in instrumentation.records() if r['type'] == 'solver'][0]
+
+
+@pytest.mark.parametrize('fixed', [True, False])
+def test_segments_step_count(fixed):
+
+    step, rec_step = _counted('step', fixed, CAP)
+    seg, rec_seg = _counted('segments', fixed, CAP)
+
+    np.testing.assert_allclose(seg, step, rtol = 1e-3)
+    # o passo do RK45 é limitado pela rigidez: os trechos não reduzem o nfev (ver solve_model)
+    assert abs(rec_seg['nfev']/rec_step['nfev'] - 1) < 0.1
+    assert rec_seg['rejected'] < rec_step['rejected']
+
+
+def test_segments_without_breaks_equals_step():
+
+    step, rec_step = _counted('step', True, 1.0)
+    seg, rec_seg = _counted('segments', True, 1.0)
+
+    np.testing.assert_array_equal(seg, step)
+    assert rec_seg['nfev'] == rec_step['nfev']
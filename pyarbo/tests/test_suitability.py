@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from rt import r0_temperature
+from suitability import offspring_number, daily_suitability, build_surface, lookup, save_surface, load_surface
+
+TEMP = np.round(np.linspace(12, 36, 50), 1)
+
+
+def test_vectorized_matches_scalar_loop():
+
+    Rm = offspring_number(TEMP)
+    R0 = r0_temperature(TEMP, 0.5, 0.5)
+
+    np.testing.assert_allclose(Rm, [offspring_number(float(t)) for t in TEMP], rtol = 1e-12)
+    np.testing.assert_allclose(R0, [r0_temperature(float(t), 0.5, 0.5) for t in TEMP], rtol = 1e-12)
+
+    df = daily_suitability(pd.Series(TEMP, index = pd.date_range('2020-01-01', periods = len(TEMP))))
+
+    np.testing.assert_allclose(df.R0, R0)
+    assert (df.suitable == ((Rm > 1) & (R0 > 1))).all()
+
+
+def test_surface_matches_scalar_loop(tmp_path):
+
+    b, c_m = np.array([0.3, 0.5]), np.array([0.0, 0.05, 0.1])
+    surface = build_surface(quantity = 'R0', b = b, beta = 0.5, c_m = c_m)
+
+    assert surface['values'].shape == (len(surface['temps']), 2, 1, 3)
+
+    got = lookup(surface, TEMP)
+    ref = np.array([[[r0_temperature(float(t), bi, 0.5, c_m = ci) for ci in c_m] for bi in b] for t in TEMP])
+
+    np.testing.assert_allclose(got[:, :, 0], ref, rtol = 1e-12)
+
+    save_surface(surface, str(tmp_path / 'surface.npz'))
+    loaded = load_surface(str(tmp_path / 'surface.npz'))
+
+    assert loaded['names'] == ['b', 'beta', 'c_m']
+    np.testing.assert_array_equal(lookup(loaded, TEMP), got)
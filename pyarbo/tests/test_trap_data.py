@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+from trap_data import FREQS, load_trap_data, build_rollups, update_rollups
+
+
+def test_missing_positivity_is_unknown():
+
+    df = load_trap_data()
+    rollups = build_rollups(df)
+
+    missing = df['n_traps_pos'].isna()
+    assert missing.any()
+
+    # semanas sem nenhum dia com positividade registrada
+    week = rollups['week']
+    no_data = week.n_traps_pos.isna()
+    assert no_data.any() and no_data.iloc[0]
+    assert week.loc[no_data, 'positivity'].isna().all()
+    assert (week.loc[no_data, 'n_traps_with_pos'] == 0).all()
+    assert week.loc[~no_data & (week.n_traps_with_pos > 0), 'positivity'].notna().all()
+
+
+@pytest.mark.parametrize('split', [20, 300])
+def test_update_matches_build(split):
+
+    df = load_trap_data()
+    full = build_rollups(df)
+    updated = update_rollups(build_rollups(df.iloc[:split]), df.iloc[split:])
+
+    for freq in FREQS:
+        pd.testing.assert_frame_equal(updated[freq], full[freq], check_freq = False)
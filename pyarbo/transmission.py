@@ -0,0 +1,231 @@
+'''
+Neste .py script está o fitting do modelo do Yang com a taxa de transmissão b*beta variando
+no tempo, para representar mudanças de comportamento e campanhas de controle ao longo da
+temporada.
+
+A taxa diária é escrita como uma combinação de funções base definidas por nós (knots),
+b*beta(t) = sum_k B[t, k]*theta_k, com B pré-calculada (ver `knot_basis`):
+    * 'constant': constante por partes, theta_k vale do nó k até o nó k + 1;
+    * 'linear': spline linear, interpolando os valores dos nós.
+
+A série diária é passada para `system_odes` como param_fit = (1, schedule) (ver
+`daily_value` em edo_model_yang.py). No fitting, as derivadas dos casos acumulados em
+relação a cada theta_k são obtidas integrando as equações de sensibilidade junto com o
+modelo, de forma que cada iteração do lm.minimize custa uma única integração, qualquer que
+seja o número de nós. Uma penalidade de suavidade (diferenças entre nós vizinhos) pode ser
+incluída no resíduo.
+'''
+import numpy as np
+from scipy.integrate import solve_ivp
+from edo_model_yang import onto_params, daily_value, model_rhs, model_jacobian, C, ONTO_NAMES
+from fitting import PARAM_FIXED
+
+KINDS = ['constant', 'linear']
+
+
+def knot_basis(n_days, n_knots = 20, knots = None, kind = 'constant'):
+    '''
+    Retorna a matriz base B (n_days, n_knots) da taxa de transmissão.
+
+    :params n_days: int. Número de dias da janela de fitting.
+    :params n_knots: int. Número de nós, usado se knots for None.
+    :params knots: array or None. Dias dos nós, em ordem crescente. Se None, os nós são
+                   igualmente espaçados (para 'constant', o início de cada trecho; para
+                   'linear', do primeiro ao último dia).
+    :params kind: string. 'constant' ou 'linear'.
+
+    :returns: array.
+    '''
+    days = np.arange(n_days)
+
+    if kind not in KINDS:
+        raise ValueError("kind deve ser 'constant' ou 'linear'.")
+
+    if knots is None:
+        if kind == 'constant':
+            knots = np.floor(np.linspace(0, n_days, n_knots, endpoint = False))
+        else:
+            knots = np.linspace(0, n_days - 1, n_knots)
+
+    knots = np.asarray(knots, dtype = float)
+
+    if kind == 'constant':
+        idx = np.searchsorted(knots, days, side = 'right') - 1
+        basis = np.zeros((n_days, len(knots)))
+        basis[days, np.clip(idx, 0, len(knots) - 1)] = 1.0
+    else:
+        eye = np.eye(len(knots))
+        basis = np.stack([np.interp(days, knots, eye[k]) for k in range(len(knots))], axis = 1)
+
+    return basis
+
+
+def schedule(values, basis):
+    '''
+    Retorna a série diária de b*beta a partir dos valores dos nós.
+    '''
+    return basis @ np.asarray(values, dtype = float)
+
+
+def difference_matrix(n_knots, order = 1):
+    '''
+    Matriz das diferenças de ordem `order` entre nós vizinhos, usada na penalidade de
+    suavidade.
+    '''
+    return np.diff(np.eye(n_knots), n = order, axis = 0)
+
+
+def sensitivity_odes(t, z, rate, basis, pars, cap, param_fixed):
+    '''
+    Sistema de equações do modelo junto com as equações de sensibilidade S = dx/dtheta.
+
+    :params z: array. Estado do modelo (8 valores) seguido de S (8 x n_knots), linha a linha.
+    :params rate: array. Série diária de b*beta.
+    :params basis: array. Matriz base (n_days, n_knots).
+    :params pars: dict. Parâmetros entomológicos diários, saída de `onto_params`.
+    :params cap: float or array. Capacidade suporte (como em `system_odes`).
+    :params param_fixed: tuple. Parâmetros fixos do modelo.
+    '''
+    MU_H, THETA_H, ALPHA_H, K, C_A, C_M, D = param_fixed
+
+    i = int(t)
+
+    # mesmas equações e jacobiano de `system_odes`, com b*beta = rate[i]
+    p = np.array([rate[i], 1.0, daily_value(t, C_A), daily_value(t, C_M), C(t, D, cap)] +
+                 [pars[name][i] for name in ONTO_NAMES])
+    consts = np.array([MU_H, THETA_H, ALPHA_H, K])
+
+    x = z[:8]
+    S = z[8:].reshape(8, -1)
+
+    dx = model_rhs(x, p, consts, np.empty(8))
+    J = model_jacobian(x, p, consts, np.empty((8, 8)))
+
+    A, Ms, Me, Mi, Hs, He, Hi, Hr = x
+    H = Hs + He + Hi + Hr
+
+    inf_m = Ms*Hi/H
+    inf_h = Hs*Mi/H
+
+    dS = J @ S
+
+    # termo forçante: df/dlambda * dlambda/dtheta
+    row = basis[i]
+    dS[1] -= inf_m*row
+    dS[2] += inf_m*row
+    dS[4] -= inf_h*row
+    dS[5] += inf_h*row
+
+    return np.concatenate([dx, dS.ravel()])
+
+
+def solve_sensitivities(t, y0, values, basis, temp, cap, fixed, param_fixed = PARAM_FIXED,
+                        **kwargs):
+    '''
+    Integra o modelo e as sensibilidades para os valores dos nós em `values`.
+
+    :params t: array. Intervalo de tempo, [0, 1, 2, ..., n - 1], com n = basis.shape[0].
+    :params kwargs: repassados ao solve_ivp.
+
+    :returns: tuple. (casos acumulados Hi + Hr em cada t, derivadas (len(t), n_knots))
+    '''
+    n_knots = basis.shape[1]
+    rate = schedule(values, basis)
+    pars = onto_params(np.zeros(len(t)) if fixed else temp, fixed)
+
+    z0 = np.concatenate([np.asarray(y0, dtype = float), np.zeros(8*n_knots)])
+
+    r = solve_ivp(sensitivity_odes, t_span = [t[0], t[-1]], y0 = z0, t_eval = t,
+                  args = (rate, basis, pars, cap, param_fixed), **kwargs)
+
+    S = r.y[8:].reshape(8, n_knots, -1)
+
+    return r.y[6] + r.y[7], (S[6] + S[7]).T
+
+
+def knot_params(n_knots, value = 0.25, min = 0.001, max = 1):
+    '''
+    Retorna os parâmetros do lmfit, um por nó, com nomes `bb_0`, `bb_1`, ...
+    '''
+    import lmfit as lm
+
+    params = lm.Parameters()
+
+    for k in range(n_knots):
+        params.add(f'bb_{k}', value = value, min = min, max = max, vary = True)
+
+    return params
+
+
+def knot_values(params):
+    '''
+    Retorna o array com os valores dos nós de um lm.Parameters criado por `knot_params`.
+    '''
+    pars = params.valuesdict()
+
+    return np.array([pars[f'bb_{k}'] for k in range(len(pars))])
+
+
+def fit_schedule(t, data, y0, n_knots = 20, knots = None, kind = 'constant', temp = None, cap = 1,
+                 fixed = True, smooth = 0.0, order = 1, params = None, method = 'leastsq',
+                 param_fixed = PARAM_FIXED, **kwargs):
+    '''
+    Fita os valores de b*beta nos nós aos casos acumulados, usando as sensibilidades exatas
+    do modelo como jacobiano.
+
+    :params t: array. Intervalo de tempo, [0, 1, 2, ..., n - 1].
+    :params data: array. Casos acumulados.
+    :params y0: list. Condições iniciais.
+    :params n_knots, knots, kind: ver `knot_basis`.
+    :params temp: array or None. Temperaturas usadas se fixed for False.
+    :params cap: float or array. Capacidade suporte.
+    :params fixed: boolean. Se True serão usados os parâmetros ontomológicos fixos.
+    :params smooth: float. Peso da penalidade de suavidade, smooth*||Delta^order theta||^2,
+                    somada ao resíduo. Como o resíduo está em número de casos, o peso deve
+                    ter a escala dos casos.
+    :params order: int. Ordem das diferenças da penalidade.
+    :params params: lm.Parameters or None. Valores iniciais. Se None, usa `knot_params`.
+    :params method: string. 'leastsq' ou 'least_squares'.
+    :params kwargs: repassados ao solve_ivp.
+
+    :returns: tuple. (lmfit.MinimizerResult, matriz base). A série diária ajustada é
+              `schedule(knot_values(result.params), basis)`.
+    '''
+    basis = knot_basis(len(t), n_knots, knots, kind)
+    n_knots = basis.shape[1]
+
+    if params is None:
+        params = knot_params(n_knots)
+
+    names = [f'bb_{k}' for k in range(n_knots)]
+    diff = np.sqrt(smooth)*difference_matrix(n_knots, order)
+    data = np.asarray(data, dtype = float)
+
+    # resíduo e jacobiano saem da mesma integração
+    last = {}
+
+    def evaluate(params):
+        values = knot_values(params)
+        key = values.tobytes()
+
+        if last.get('key') != key:
+            cases, dcases = solve_sensitivities(t, y0, values, basis, temp, cap, fixed,
+                                                param_fixed, **kwargs)
+            last.update(key = key, values = values, cases = cases, dcases = dcases)
+
+        return last
+
+    def residual(params):
+        ev = evaluate(params)
+        return np.concatenate([ev['cases'] - data, diff @ ev['values']])
+
+    def jacobian(params):
+        ev = evaluate(params)
+        cols = [k for k, name in enumerate(names) if params[name].vary]
+        return np.vstack([ev['dcases'], diff])[:, cols]
+
+    import lmfit as lm
+
+    result = lm.minimize(residual, params, method = method, Dfun = jacobian)
+
+    return result, basis
@@ -0,0 +1,223 @@
+'''
+Neste .py script estão as agregações dos dados diários das armadilhas de Aedes aegypti
+(`mosq_aaeg_trap_pos-2017_2022.csv`) em semanas, semanas epidemiológicas, meses e bimestres.
+
+Todas as resoluções são calculadas a partir de uma única soma acumulada dos dados diários:
+a soma de um período é a diferença da soma acumulada entre o fim e o início do período.
+Como as agregações são somas, novos dias podem ser acrescentados somando apenas os
+períodos afetados (ver `update_rollups`).
+
+Os índices calculados para cada período são:
+    * density: fêmeas capturadas (vivas e mortas) por armadilha;
+    * positivity: proporção de armadilhas positivas, n_traps_pos dividido pelo número de
+      armadilhas nos dias em que a positividade foi registrada (`n_traps_with_pos`).
+Períodos sem armadilhas instaladas ficam com NaN nos índices. As colunas _pos não existem
+para alguns dias (por exemplo no início de 2017): elas ficam NaN, a soma de um período só
+usa os dias com dados e é NaN se não houver nenhum, e nesse caso a positividade também é NaN
+(desconhecida, e não 0%).
+'''
+import os
+import numpy as np
+import pandas as pd
+from get_data import DATA_DIR, CACHE_DIR
+from epiweek import week_start
+
+TRAP_FILE = 'mosq_aaeg_trap_pos-2017_2022.csv'
+
+FREQS = ['week', 'epiweek', 'month', 'bimonth']
+
+
+def load_trap_data(path=os.path.join(DATA_DIR, TRAP_FILE)):
+    '''
+    Carrega os dados diários das armadilhas ordenados pela data. Os valores ausentes (das
+    colunas _pos) ficam como NaN.
+
+    :params path: string. Caminho do arquivo csv.
+
+    :returns: pd.DataFrame.
+    '''
+    df = pd.read_csv(path, index_col='date', parse_dates=True)
+
+    df.sort_index(inplace=True)
+
+    return df.astype(float)
+
+
+def period_start(dates, freq):
+    '''
+    Retorna a data de início do período de cada dia.
+
+    :params dates: array. Datas (datetime64).
+    :params freq: string. Uma das resoluções de `FREQS`. As semanas começam na
+                  segunda-feira e as semanas epidemiológicas no domingo.
+
+    :returns: array de datetime64[D].
+    '''
+    days = np.asarray(dates, dtype='datetime64[D]')
+    n = days.astype(np.int64)
+
+    # 1970-01-01 foi uma quinta-feira
+    if freq == 'week':
+        return days - (n + 3) % 7
+
+    if freq == 'epiweek':
+        return week_start(days)
+
+    months = days.astype('datetime64[M]')
+
+    if freq == 'month':
+        return months.astype('datetime64[D]')
+
+    if freq == 'bimonth':
+        m = months.astype(np.int64)
+        return (months - m % 2).astype('datetime64[D]')
+
+    raise ValueError(f'freq deve ser uma das opções {FREQS}.')
+
+
+def add_indices(df):
+    '''
+    Acrescenta as colunas `density` e `positivity` a um dataframe com as colunas do arquivo
+    das armadilhas.
+    '''
+    n_traps = df['n_traps'].to_numpy(dtype=float)
+    has_traps = n_traps > 0
+
+    females = (df['m_aaeg_f_m'] + df['m_aaeg_f_v']).to_numpy(dtype=float)
+
+    density = np.full(len(df), np.nan)
+    density[has_traps] = females[has_traps]/n_traps[has_traps]
+
+    # sem a coluna n_traps_with_pos (dados diários), todas as armadilhas do dia contam
+    checked = df.get('n_traps_with_pos', df['n_traps']).to_numpy(dtype=float)
+    n_pos = df['n_traps_pos'].to_numpy(dtype=float)
+    has_pos = (checked > 0) & ~np.isnan(n_pos)
+
+    positivity = np.full(len(df), np.nan)
+    positivity[has_pos] = n_pos[has_pos]/checked[has_pos]
+
+    return df.assign(density=density, positivity=positivity)
+
+
+def build_rollups(df, freqs=FREQS):
+    '''
+    Agrega os dados diários nas resoluções de `freqs`.
+
+    :params df: pd.DataFrame. Dados diários, como retornado por `load_trap_data`.
+    :params freqs: list. Resoluções que serão calculadas.
+
+    :returns: dict. Para cada resolução, um pd.DataFrame indexado pelo início do período, com
+              a soma de todas as colunas (NaN se a coluna não tiver dados no período), o
+              número de armadilhas nos dias com positividade registrada (`n_traps_with_pos`),
+              o número de dias com dados (`n_days`) e os índices.
+    '''
+    df = df.assign(n_traps_with_pos=df['n_traps'].where(df['n_traps_pos'].notna(), 0))
+    values = df.to_numpy(dtype=float)
+    known = ~np.isnan(values)
+
+    # somas acumuladas sem os NaN e número acumulado de dias com dados em cada coluna
+    acum = np.zeros((values.shape[0] + 1, values.shape[1]))
+    np.cumsum(np.where(known, values, 0), axis=0, out=acum[1:])
+
+    n_known = np.zeros(acum.shape, dtype=np.int64)
+    np.cumsum(known, axis=0, out=n_known[1:])
+
+    rollups = {}
+    for freq in freqs:
+
+        starts = period_start(df.index.values, freq)
+
+        first = np.flatnonzero(np.r_[True, starts[1:] != starts[:-1]])
+        last = np.r_[first[1:], len(starts)]
+
+        sums = acum[last] - acum[first]
+        sums[(n_known[last] - n_known[first]) == 0] = np.nan
+
+        out = pd.DataFrame(sums, columns=df.columns, index=pd.DatetimeIndex(starts[first], name='date'))
+        out['n_days'] = last - first
+
+        rollups[freq] = add_indices(out)
+
+    return rollups
+
+
+def update_rollups(rollups, df_new):
+    '''
+    Acrescenta novos dias às agregações. Apenas os períodos que contêm os novos dias são
+    recalculados. Os dias de `df_new` não podem estar presentes nas agregações.
+
+    :params rollups: dict. Saída de `build_rollups`.
+    :params df_new: pd.DataFrame. Novos dias, com as mesmas colunas dos dados diários.
+
+    :returns: dict. As agregações atualizadas.
+    '''
+    new = build_rollups(df_new.sort_index(), freqs=list(rollups))
+
+    updated = {}
+    for freq, old in rollups.items():
+
+        cols = [col for col in old.columns if col not in ('density', 'positivity')]
+
+        part = new[freq][cols]
+        touched = old.index.intersection(part.index)
+
+        out = pd.concat([old, part.loc[part.index.difference(old.index)]])
+        # NaN só se o período não tiver dados nem antes nem nos novos dias
+        out.loc[touched, cols] = old.loc[touched, cols].add(part.loc[touched], fill_value=0)
+
+        changed = part.index
+        out.loc[changed] = add_indices(out.loc[changed, cols])
+
+        updated[freq] = out.sort_index()
+
+    return updated
+
+
+def save_rollups(rollups, path):
+    '''
+    Salva as agregações em um arquivo .npz.
+    '''
+    arrays = {}
+    for freq, df in rollups.items():
+        arrays[f'{freq}_index'] = df.index.values.astype('datetime64[D]')
+        arrays[f'{freq}_values'] = df.to_numpy(dtype=float)
+        arrays[f'{freq}_columns'] = np.array(df.columns, dtype=str)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez(path, **arrays)
+
+
+def read_rollups(path):
+    '''
+    Lê as agregações salvas por `save_rollups`.
+    '''
+    rollups = {}
+    with np.load(path) as f:
+        for freq in FREQS:
+            if f'{freq}_index' in f:
+                rollups[freq] = pd.DataFrame(f[f'{freq}_values'], columns=f[f'{freq}_columns'].tolist(),
+                                             index=pd.DatetimeIndex(f[f'{freq}_index'], name='date'))
+
+    return rollups
+
+
+def get_rollups(path=os.path.join(DATA_DIR, TRAP_FILE), cache_dir=CACHE_DIR, rebuild=False):
+    '''
+    Retorna as agregações dos dados das armadilhas, usando o cache se o arquivo de origem
+    não for mais recente que ele.
+
+    :params path: string. Caminho do arquivo csv com os dados diários.
+    :params cache_dir: string. Diretório do cache.
+    :params rebuild: boolean. Se True, as agregações são recalculadas.
+
+    :returns: dict.
+    '''
+    cache = os.path.join(cache_dir, 'trap_rollups.npz')
+
+    if not rebuild and os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(path):
+        return read_rollups(cache)
+
+    rollups = build_rollups(load_trap_data(path))
+    save_rollups(rollups, cache)
+
+    return rollups